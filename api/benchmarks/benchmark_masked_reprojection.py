@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark flood-exposure masking on mismatched population and hazard grids.
+
+Compares, on synthetic rasters of increasing size (see synthetic.py, the mask
+being on a coarser, shifted grid):
+
+* ``reproject+mask``: the previous path, writing a reprojected copy of the
+  population raster with ``reproj_match`` and then masking it;
+* ``fused``: ``MaskedRaster`` warping the population raster onto the mask grid
+  block by block and masking on the fly.
+
+Both paths read the masked result block by block, as the zonal stats engine
+does. GDAL computes ``sum`` resampling weights per warp chunk, so totals can
+differ slightly (well under 1%) between the two paths; the difference is
+reported. From ``api/``::
+
+    poetry run python benchmarks/benchmark_masked_reprojection.py
+    poetry run python benchmarks/benchmark_masked_reprojection.py --sizes 1024 4096
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _api_root_on_path() -> Path:
+    root = Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    return root
+
+
+def _read_blocks(raster) -> float:
+    """Read every block of a masked raster and return the total."""
+    from rasterio.windows import Window
+
+    block_height, block_width = raster.block_shapes[0]
+    total = 0.0
+    for row in range(0, raster.height, block_height):
+        for col in range(0, raster.width, block_width):
+            window = Window(
+                col,
+                row,
+                min(block_width, raster.width - col),
+                min(block_height, raster.height - row),
+            )
+            total += float(raster.read(1, window=window).sum())
+    return total
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[512, 1024, 2048, 4096],
+        help="Population raster widths (and heights) in pixels",
+    )
+    args = p.parse_args(argv)
+
+    _api_root_on_path()
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from prism_app.raster_utils import MaskedRaster, reproj_match
+    from synthetic import write_mask, write_raster
+
+    print(
+        f"{'size':>6} {'reproject+mask ms':>18} {'fused ms':>9} {'speedup':>8}"
+        f" {'total diff':>11}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            population_path = os.path.join(directory, f"population_{size}.tif")
+            mask_path = os.path.join(directory, f"flood_{size}.tif")
+            write_raster(population_path, size, seed=size)
+            write_mask(mask_path, size, seed=size)
+
+            start = time.perf_counter()
+            reprojected_path = os.path.join(directory, f"reprojected_{size}.tif")
+            reproj_match(population_path, mask_path, reprojected_path)
+            with MaskedRaster(reprojected_path, mask_path, resampling=None) as masked:
+                old_total = _read_blocks(masked)
+            old_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            with MaskedRaster(population_path, mask_path) as masked:
+                new_total = _read_blocks(masked)
+            new_ms = (time.perf_counter() - start) * 1000
+
+            difference = abs(old_total - new_total) / max(abs(old_total), 1)
+            print(
+                f"{size:>6} {old_ms:>18.0f} {new_ms:>9.0f} {old_ms / new_ms:>7.1f}x"
+                f" {difference:>11.3%}"
+            )
+            if difference > 0.01:
+                print(f"size {size}: totals differ {old_total} != {new_total}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
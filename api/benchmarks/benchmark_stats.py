@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Benchmark calculate_stats over synthetic inputs, for each /stats option.
+
+Scenarios:
+
+* ``plain``: default stats over every zone;
+* ``group_by``: zones dissolved by their ``group`` property first;
+* ``intersect``: with an intersect_comparison (pixels above a threshold);
+* ``mask``: flood exposure, with a mask raster on another grid;
+* ``filter_by``: one region of the zones;
+* ``wfs``: zones intersected with WFS hazard polygons;
+* ``parquet``: GeoParquet zones (needs the DuckDB spatial extension).
+
+Each scenario runs in a fresh process with an empty CACHE_DIRECTORY, so that
+its first call is cold (no grouped zones, intersections or zone labels cached)
+and its peak memory is its own. Reported per scenario: first (cold) call,
+median and p95 of the following calls, peak RSS, and throughput in zones and
+raster megapixels per second of the median call (zones being the features
+returned: groups, or zone and hazard intersections, for some scenarios).
+
+With ``--json``, results are written for a later ``--baseline`` run, which
+exits with status 1 when a median got slower by more than ``--tolerance``.
+From ``api/``::
+
+    poetry run python benchmarks/benchmark_stats.py
+    poetry run python benchmarks/benchmark_stats.py --size 4096 --grid 60 \\
+        --scenarios plain mask --json results.json
+    poetry run python benchmarks/benchmark_stats.py --baseline results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+SCENARIOS = ("plain", "group_by", "intersect", "mask", "filter_by", "wfs", "parquet")
+
+
+def _api_root_on_path() -> Path:
+    root = Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    return root
+
+
+@dataclass
+class Result:
+    scenario: str
+    zones: int
+    first_ms: float
+    median_ms: float
+    p95_ms: float
+    peak_rss_mb: float
+    zones_per_s: float
+    megapixels_per_s: float
+    error: Optional[str] = None
+
+
+def _scenario_call(scenario: str, fixtures: Any) -> tuple[str, dict[str, Any]]:
+    """Zones and calculate_stats keyword arguments of a scenario."""
+    import operator
+
+    if scenario == "plain":
+        return fixtures.zones, {}
+    if scenario == "group_by":
+        return fixtures.zones, {"group_by": "group"}
+    if scenario == "intersect":
+        return fixtures.zones, {"intersect_comparison": (operator.gt, 50.0)}
+    if scenario == "mask":
+        return fixtures.zones, {"mask_geotiff": fixtures.mask}
+    if scenario == "filter_by":
+        return fixtures.zones, {"filter_by": ("region", "R0")}
+    if scenario == "wfs":
+        return fixtures.zones, {
+            "wfs_response": {"filter_property_key": "label", "path": fixtures.wfs}
+        }
+    if scenario == "parquet":
+        return fixtures.parquet, {}
+    raise ValueError(f"Unknown scenario {scenario!r}.")
+
+
+def _run_scenario(
+    scenario: str, fixtures: Any, cache_directory: str, repeats: int
+) -> tuple[list[float], float, int]:
+    """Time calls in this (fresh) process; returns timings, peak RSS, zones."""
+    _api_root_on_path()
+    import prism_app.caching as caching
+
+    caching.CACHE_DIRECTORY = f"{cache_directory}{os.sep}"
+    from prism_app.zonal_stats import calculate_stats
+
+    zones, kwargs = _scenario_call(scenario, fixtures)
+    timings = []
+    result: list = []
+    for _ in range(repeats + 1):
+        start = time.perf_counter()
+        result = calculate_stats(zones, fixtures.raster, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    # ru_maxrss is in kilobytes on Linux.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return timings, peak_rss_mb, len(result)
+
+
+def run(scenario: str, fixtures: Any, repeats: int) -> Result:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as cache_directory:
+        with context.Pool(1) as pool:
+            try:
+                timings, peak_rss_mb, zones = pool.apply(
+                    _run_scenario, (scenario, fixtures, cache_directory, repeats)
+                )
+            except Exception as error:
+                return Result(scenario, 0, 0, 0, 0, 0, 0, 0, error=str(error))
+
+    first, warm = timings[0], timings[1:] or timings
+    median = statistics.median(warm)
+    p95 = statistics.quantiles(warm, n=20)[-1] if len(warm) > 1 else warm[0]
+    return Result(
+        scenario=scenario,
+        zones=zones,
+        first_ms=round(first, 1),
+        median_ms=round(median, 1),
+        p95_ms=round(p95, 1),
+        peak_rss_mb=round(peak_rss_mb, 1),
+        zones_per_s=round(zones / median * 1000, 1),
+        megapixels_per_s=round(fixtures.pixels / 1e6 / median * 1000, 1),
+    )
+
+
+def _print(results: list[Result]) -> None:
+    columns = (
+        ("scenario", 10),
+        ("zones", 6),
+        ("first_ms", 9),
+        ("median_ms", 10),
+        ("p95_ms", 8),
+        ("peak_rss_mb", 12),
+        ("zones_per_s", 12),
+        ("megapixels_per_s", 17),
+    )
+    print(" ".join(f"{name:>{width}}" for name, width in columns))
+    for result in results:
+        if result.error is not None:
+            print(f"{result.scenario:>10} failed: {result.error}")
+            continue
+        values = asdict(result)
+        print(" ".join(f"{values[name]:>{width}}" for name, width in columns))
+
+
+def _regressions(
+    results: list[Result], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Scenarios whose median got slower than in the baseline, beyond tolerance."""
+    previous = {r["scenario"]: r for r in baseline["results"] if not r.get("error")}
+    messages = []
+    for result in results:
+        before = previous.get(result.scenario)
+        if result.error is not None or before is None:
+            continue
+        if result.median_ms > before["median_ms"] * (1 + tolerance):
+            messages.append(
+                f"{result.scenario}: median {result.median_ms} ms,"
+                f" was {before['median_ms']} ms"
+            )
+    return messages
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    p.add_argument("--size", type=int, default=2048, help="Raster pixels per side")
+    p.add_argument("--grid", type=int, default=30, help="Zones per side")
+    p.add_argument(
+        "--vertices", type=int, default=8, help="Vertices per side of each zone"
+    )
+    p.add_argument("--hazards", type=int, default=200, help="WFS hazard polygons")
+    p.add_argument("--repeats", type=int, default=5, help="Calls after the first")
+    p.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    p.add_argument("--json", help="Write the results to this file")
+    p.add_argument("--baseline", help="Results of a previous --json run")
+    p.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed median slowdown against the baseline (0.2 is 20%%)",
+    )
+    args = p.parse_args(argv)
+
+    _api_root_on_path()
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from synthetic import write_fixtures
+
+    parameters = {
+        "size": args.size,
+        "grid": args.grid,
+        "vertices": args.vertices,
+        "hazards": args.hazards,
+        "repeats": args.repeats,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        fixtures = write_fixtures(
+            directory, args.size, args.grid, args.vertices, args.hazards
+        )
+        results = [run(scenario, fixtures, args.repeats) for scenario in args.scenarios]
+
+    print(
+        f"{args.size}x{args.size} px raster, {args.grid * args.grid} zones,"
+        f" {args.repeats} calls after the first"
+    )
+    _print(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"parameters": parameters, "results": [asdict(r) for r in results]},
+                f,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != parameters:
+            print("Warning: the baseline ran with other parameters.", file=sys.stderr)
+        regressions = _regressions(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
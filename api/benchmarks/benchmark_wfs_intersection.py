@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark zone / WFS polygon intersection on synthetic data.
+
+Intersects the synthetic grid of square zones (as admin boundaries) with
+circular hazard polygons (as GDACS buffers), see synthetic.py, comparing:
+
+* ``nested``: every zone tested against every polygon in Python loops, as
+  ``_get_intersected_polygons`` did before;
+* ``strtree``: the current ``_get_intersected_polygons``, with an STRtree
+  query and vectorized ``shapely.intersection``.
+
+Both must produce the same features. From ``api/``::
+
+    poetry run python benchmarks/benchmark_wfs_intersection.py
+    poetry run python benchmarks/benchmark_wfs_intersection.py --grids 50 200 --buffers 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+
+def _api_root_on_path() -> Path:
+    root = Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    return root
+
+
+def _nested_loop_intersections(
+    zones_geojson: dict, wfs_geojson: dict, key: str
+) -> list[dict]:
+    from shapely.geometry import mapping, shape
+
+    wfs_shapes = [
+        (f["properties"][key], shape(f["geometry"])) for f in wfs_geojson["features"]
+    ]
+    results = []
+    for zone in zones_geojson["features"]:
+        geom = shape(zone["geometry"])
+        for k, s in wfs_shapes:
+            if geom.intersects(s):
+                intersection = geom.intersection(s)
+                properties = {**zone["properties"], key: k}
+                results.append(
+                    {
+                        "geom": intersection,
+                        "feature": {
+                            "type": "Feature",
+                            "geometry": mapping(intersection),
+                            "properties": properties,
+                        },
+                    }
+                )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument(
+        "--grids",
+        type=int,
+        nargs="+",
+        default=[20, 50, 100],
+        help="Zones per side of the zone grid",
+    )
+    p.add_argument("--buffers", type=int, default=200, help="Hazard polygons")
+    args = p.parse_args(argv)
+
+    _api_root_on_path()
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from prism_app.zonal_stats import _get_intersected_polygons
+    from synthetic import wfs_features, zone_features
+
+    print(
+        f"{'zones':>7} {'buffers':>8} {'pairs':>7} {'nested ms':>10}"
+        f" {'strtree ms':>11} {'speedup':>8}"
+    )
+    for grid in args.grids:
+        zones = {
+            "type": "FeatureCollection",
+            "features": zone_features(grid, vertices=1),
+        }
+        hazards = {
+            "type": "FeatureCollection",
+            "features": wfs_features(args.buffers, seed=grid),
+        }
+
+        start = time.perf_counter()
+        expected = _nested_loop_intersections(zones, hazards, "label")
+        nested_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        actual = _get_intersected_polygons(zones, hazards, "label")
+        strtree_ms = (time.perf_counter() - start) * 1000
+
+        if [r["feature"]["properties"] for r in actual] != [
+            r["feature"]["properties"] for r in expected
+        ] or not all(a["geom"].equals(e["geom"]) for a, e in zip(actual, expected)):
+            print(f"grid {grid}: intersections differ")
+            return 1
+        print(
+            f"{grid * grid:>7} {args.buffers:>8} {len(actual):>7} {nested_ms:>10.0f}"
+            f" {strtree_ms:>11.0f} {nested_ms / strtree_ms:>7.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark GeoParquet zones reads with fresh and pooled DuckDB connections.
+
+Writes the synthetic GeoParquet zones (see synthetic.py) and compares the
+latency of ``_query_parquet_zones`` when:
+
+* ``fresh``: every read sets up a new connection (install/load spatial and
+  httpfs, create the S3 secret), as before the pool;
+* ``pooled``: reads share the process-wide ``duckdb_pool``.
+
+Needs the DuckDB spatial and httpfs extensions (downloaded on first use). From
+``api/``::
+
+    poetry run python benchmarks/benchmark_zones_read.py
+    poetry run python benchmarks/benchmark_zones_read.py --reads 50 --grid 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+
+def _api_root_on_path() -> Path:
+    root = Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    return root
+
+
+def _time_reads(path: str, reads: int) -> list[float]:
+    from prism_app.zonal_stats import _query_parquet_zones
+
+    timings = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        _query_parquet_zones(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--reads", type=int, default=20, help="Reads per mode")
+    p.add_argument("--grid", type=int, default=16, help="Zones per side")
+    p.add_argument(
+        "--vertices", type=int, default=8, help="Vertices per side of each zone"
+    )
+    args = p.parse_args(argv)
+
+    _api_root_on_path()
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from synthetic import write_parquet, zone_features
+
+    # The S3 secret is created even though the fixture is local.
+    for name in ("ACCESS_KEY_ID", "SECRET_ACCESS_KEY", "DEFAULT_REGION"):
+        os.environ.setdefault(f"VECTOR_STORE_{name}", "benchmark")
+    from prism_app.duckdb_utils import DuckDBPool, duckdb_pool
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "zones.parquet")
+        write_parquet(path, zone_features(args.grid, args.vertices))
+
+        # A new pool per read is a new connection per read.
+        fresh = []
+        for _ in range(args.reads):
+            pool = DuckDBPool()
+            with patch("prism_app.zonal_stats.duckdb_pool", pool):
+                fresh += _time_reads(path, 1)
+            pool.close()
+        duckdb_pool.warm_up()
+        pooled = _time_reads(path, args.reads)
+
+    print(f"{'mode':>7} {'median ms':>10} {'p95 ms':>8}")
+    for mode, timings in (("fresh", fresh), ("pooled", pooled)):
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else 0
+        print(f"{mode:>7} {statistics.median(timings):>10.1f} {p95:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,203 @@
+"""Synthetic /stats inputs of configurable size, written to a local directory.
+
+All layers cover the same [0, 10]² extent in EPSG:4326:
+
+* ``raster``: float32 values on a size x size grid, tiled, with some nodata;
+* ``mask``: a 0/1 flood mask on a coarser, shifted grid, as hazard layers are
+  rarely aligned with population rasters;
+* ``zones``: a grid x grid set of square boundaries, densified to vertices
+  points per side, with ``zone_id``, ``group`` (rows of zones, for group_by)
+  and ``region`` (quarters, for filter_by) properties;
+* ``wfs``: circular hazard polygons with a ``label`` property, as a WFS
+  response;
+* ``parquet``: the zones as GeoParquet, as remote admin boundaries are stored.
+
+write_fixtures writes them all for benchmark_stats; the other benchmarks use
+the writers of the layers they need.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+
+EXTENT = 10.0
+NODATA = -9999.0
+
+
+@dataclass
+class Fixtures:
+    raster: str
+    mask: str
+    zones: str
+    wfs: str
+    parquet: str
+    pixels: int
+    zone_count: int
+
+
+def write_raster(path: str, size: int, seed: int) -> None:
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_bounds
+
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(2.0, 20.0, (size, size)).astype("float32")
+    values[rng.random((size, size)) < 0.02] = NODATA
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        dtype="float32",
+        count=1,
+        width=size,
+        height=size,
+        crs="EPSG:4326",
+        transform=from_bounds(0, 0, EXTENT, EXTENT, size, size),
+        nodata=NODATA,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+    ) as dst:
+        dst.write(values, 1)
+
+
+def write_mask(path: str, size: int, seed: int) -> None:
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_bounds
+
+    coarse = max(size * 2 // 3, 16)
+    rng = np.random.default_rng(seed + 1)
+    flooded = (rng.random((coarse, coarse)) < 0.3).astype("uint8")
+    shift = EXTENT / coarse / 3
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        dtype="uint8",
+        count=1,
+        width=coarse,
+        height=coarse,
+        crs="EPSG:4326",
+        transform=from_bounds(
+            shift, shift, EXTENT + shift, EXTENT + shift, coarse, coarse
+        ),
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+    ) as dst:
+        dst.write(flooded, 1)
+
+
+def zone_features(grid: int, vertices: int) -> list[dict]:
+    import shapely
+    from shapely.geometry import box, mapping
+
+    step = EXTENT / grid
+    features = []
+    for row in range(grid):
+        for col in range(grid):
+            geometry = shapely.segmentize(
+                box(col * step, row * step, (col + 1) * step, (row + 1) * step),
+                step / max(vertices, 1),
+            )
+            features.append(
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "zone_id": f"Z{row:04d}{col:04d}",
+                        "group": f"G{row:04d}",
+                        "region": f"R{2 * (row * 2 // grid) + col * 2 // grid}",
+                    },
+                    "geometry": mapping(geometry),
+                }
+            )
+    return features
+
+
+def wfs_features(count: int, seed: int) -> list[dict]:
+    import numpy as np
+    from shapely.geometry import Point, mapping
+
+    rng = np.random.default_rng(seed + 2)
+    return [
+        {
+            "type": "Feature",
+            "properties": {"label": f"hazard-{i % 5}"},
+            "geometry": mapping(Point(x, y).buffer(radius, quad_segs=8)),
+        }
+        for i, (x, y, radius) in enumerate(
+            zip(
+                rng.uniform(0, EXTENT, count),
+                rng.uniform(0, EXTENT, count),
+                rng.uniform(0.05, 0.5, count),
+            )
+        )
+    ]
+
+
+def write_geojson(path: str, features: list[dict]) -> None:
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def write_parquet(path: str, features: list[dict]) -> None:
+    """Zones as GeoParquet with WKB geometries, without the spatial extension."""
+    import duckdb
+    import shapely
+    from shapely.geometry import shape
+
+    geo_metadata = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Polygon"]}},
+    }
+    rows = [
+        (
+            *(feature["properties"][name] for name in ("zone_id", "group", "region")),
+            shapely.to_wkb(shape(feature["geometry"])),
+        )
+        for feature in features
+    ]
+    with duckdb.connect() as connection:
+        connection.execute(
+            "CREATE TABLE zones"
+            ' (zone_id VARCHAR, "group" VARCHAR, region VARCHAR, geometry BLOB)'
+        )
+        connection.executemany("INSERT INTO zones VALUES (?, ?, ?, ?)", rows)
+        metadata = json.dumps(geo_metadata).replace("'", "''")
+        connection.execute(
+            f"COPY zones TO '{path}'"
+            f" (FORMAT PARQUET, KV_METADATA {{geo: '{metadata}'}})"
+        )
+
+
+def write_fixtures(
+    directory: str,
+    size: int = 2048,
+    grid: int = 30,
+    vertices: int = 8,
+    hazards: int = 200,
+    seed: int = 0,
+) -> Fixtures:
+    """Write every synthetic input to directory, named after their sizes."""
+    name = f"{size}px_{grid}x{grid}zones_{vertices}v"
+    fixtures = Fixtures(
+        raster=os.path.join(directory, f"raster_{size}px.tif"),
+        mask=os.path.join(directory, f"mask_{size}px.tif"),
+        zones=os.path.join(directory, f"zones_{name}.json"),
+        wfs=os.path.join(directory, f"wfs_{hazards}.json"),
+        parquet=os.path.join(directory, f"zones_{name}.parquet"),
+        pixels=size * size,
+        zone_count=grid * grid,
+    )
+    write_raster(fixtures.raster, size, seed)
+    write_mask(fixtures.mask, size, seed)
+    zones = zone_features(grid, vertices)
+    write_geojson(fixtures.zones, zones)
+    write_geojson(fixtures.wfs, wfs_features(hazards, seed))
+    write_parquet(fixtures.parquet, zones)
+    return fixtures
@@ -1,4 +1,7 @@
-"""Starlette Admin: read-only alerts; full CRUD for dashboards."""
+"""Starlette Admin: read-only alerts; full CRUD for dashboards; profiles."""
+
+import os
+from datetime import datetime
 
 from prism_app.auth.admin_request import (
     request_can_manage_dashboards,
@@ -11,8 +14,11 @@ from prism_app.database.dashboard_model import DashboardModel
 from prism_app.database.kobo_user_model import KoboUser
 from prism_app.database.permission_model import Permission, UserPermission
 from prism_app.database.user_model import User
+from prism_app.profiling import list_profiles, profile_path
 from starlette.requests import Request
-from starlette_admin import HasOne
+from starlette.responses import FileResponse, Response
+from starlette.templating import Jinja2Templates
+from starlette_admin import CustomView, HasOne
 from starlette_admin.contrib.sqla import Admin, ModelView
 from starlette_admin.exceptions import FormValidationError
 
@@ -149,6 +155,45 @@ class UserPermissionView(PrismGatedModelView):
         await super().validate(request, data)
 
 
+class ProfilesView(CustomView):
+    """Slowest recent cProfile profiles, with their .prof files to download."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            label="Profiles",
+            icon="fa fa-stopwatch",
+            path="/profiles",
+            template_path="profiles.html",
+            name="profiles",
+        )
+
+    def is_accessible(self, request: Request) -> bool:
+        return request_has_prism_admin_access(request)
+
+    async def render(self, request: Request, templates: Jinja2Templates) -> Response:
+        download = request.query_params.get("download")
+        if download is not None:
+            path = profile_path(download)
+            if path is None:
+                return Response("Profile not found.", status_code=404)
+            return FileResponse(path, filename=os.path.basename(path))
+
+        profiles = [
+            {
+                **profile,
+                "recorded": datetime.fromtimestamp(profile["created_at"]).isoformat(
+                    sep=" ", timespec="seconds"
+                ),
+            }
+            for profile in list_profiles()
+        ]
+        return templates.TemplateResponse(
+            request=request,
+            name=self.template_path,
+            context={"title": self.title(request), "profiles": profiles},
+        )
+
+
 def register_alerts_admin_views(admin: Admin) -> None:
     admin.add_view(AlertView(AlertModel))
     admin.add_view(KoboUserView(KoboUser))
@@ -157,3 +202,4 @@ def register_alerts_admin_views(admin: Admin) -> None:
     admin.add_view(UserEditView(User))
     admin.add_view(PermissionView(Permission))
     admin.add_view(UserPermissionView(UserPermission))
+    admin.add_view(ProfilesView())
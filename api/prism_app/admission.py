@@ -0,0 +1,324 @@
+"""Cost-aware admission control for expensive analysis endpoints.
+
+Expensive routes (/stats, /raster_geotiff, /report, /google-floods/inundations,
+and each chunk of rasters of /stats/batch) take an admission slot before doing
+their work, so that they cannot starve lightweight routes of the API process:
+
+* each request gets an estimated cost (about one unit per million raster
+  pixels read, see estimate_stats_cost) and the running requests of all
+  endpoints share ADMISSION_COST_BUDGET;
+* each endpoint runs at most its ADMISSION_LIMITS requests at once;
+* waiting requests are admitted in weighted fair queuing order (by virtual
+  finish time, cost / ADMISSION_WEIGHTS), so one endpoint flooding the queue
+  does not delay the others;
+* requests are rejected with a 503 when their endpoint already has
+  ADMISSION_QUEUE_LIMIT requests waiting, or after waiting
+  ADMISSION_QUEUE_TIMEOUT_SECONDS.
+
+State is per API process and lives on its event loop.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Callable, Final, Optional
+
+import prism_app.metrics as metrics
+from fastapi import HTTPException, Request
+from prism_app.models import FilePath
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_mapping(name: str, value: str) -> dict[str, float]:
+    """Parse ``endpoint=number`` pairs separated by commas."""
+    mapping: dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, number = item.partition("=")
+        try:
+            mapping[endpoint.strip()] = float(number)
+        except ValueError:
+            raise ValueError(
+                f"Invalid {name} entry {item!r}, expected endpoint=number."
+            ) from None
+    return mapping
+
+
+# Requests of each endpoint running at once.
+ADMISSION_LIMITS: Final[dict[str, float]] = _parse_mapping(
+    "ADMISSION_LIMITS",
+    os.getenv(
+        "ADMISSION_LIMITS",
+        "stats=4,stats_batch=2,raster_geotiff=2,report=2,google_floods_inundations=2",
+    ),
+)
+# Share of the cost budget of each endpoint when requests wait, 1 by default.
+ADMISSION_WEIGHTS: Final[dict[str, float]] = _parse_mapping(
+    "ADMISSION_WEIGHTS", os.getenv("ADMISSION_WEIGHTS", "")
+)
+# Total estimated cost of the requests running at once.
+ADMISSION_COST_BUDGET: Final[float] = float(os.getenv("ADMISSION_COST_BUDGET", 2000))
+ADMISSION_QUEUE_LIMIT: Final[int] = int(os.getenv("ADMISSION_QUEUE_LIMIT", 32))
+ADMISSION_QUEUE_TIMEOUT_SECONDS: Final[float] = float(
+    os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 60)
+)
+# Sent with 503 responses of rejected requests.
+ADMISSION_RETRY_AFTER_SECONDS: Final[int] = 10
+
+# Cost of zones files that cannot be measured locally (e.g. remote GeoParquet).
+REMOTE_ZONES_COST: Final[float] = 10.0
+# Fixed costs of endpoints that cannot be estimated from their inputs.
+RASTER_GEOTIFF_COST: Final[float] = 50.0
+REPORT_COST: Final[float] = 100.0
+INUNDATIONS_REGION_COST: Final[float] = 10.0
+
+
+def _raster_pixels(filepath: Optional[FilePath]) -> int:
+    """Pixels of a cached raster, read from its header only."""
+    if not filepath:
+        return 0
+
+    import rasterio  # type: ignore
+
+    try:
+        with rasterio.open(filepath) as src:
+            return src.width * src.height
+    except rasterio.errors.RasterioError:
+        return 0
+
+
+def estimate_stats_cost(
+    geotiff: FilePath,
+    zones: FilePath,
+    mask_geotiff: Optional[FilePath] = None,
+) -> float:
+    """Estimated cost of a /stats request, at least 1.
+
+    About one unit per million pixels of the raster and of the mask, which is
+    reprojected onto it, plus one per megabyte of zones: parsing and
+    rasterizing zones grows with their number and detail.
+    """
+    cost = (_raster_pixels(geotiff) + _raster_pixels(mask_geotiff)) / 1e6
+    if zones and os.path.isfile(zones):
+        cost += os.path.getsize(zones) / 1e6
+    else:
+        cost += REMOTE_ZONES_COST
+    return max(cost, 1.0)
+
+
+@dataclass
+class EndpointStats:
+    running: int = 0
+    running_cost: float = 0.0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class _Waiter:
+    endpoint: str
+    cost: float
+    start_tag: float
+    finish_tag: float
+    future: asyncio.Future = field(repr=False)
+
+
+class AdmissionController:
+    """Per-endpoint limits and a shared cost budget, with a fair queue."""
+
+    def __init__(
+        self,
+        limits: Optional[dict[str, float]] = None,
+        weights: Optional[dict[str, float]] = None,
+        budget: float = ADMISSION_COST_BUDGET,
+        queue_limit: int = ADMISSION_QUEUE_LIMIT,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.limits = ADMISSION_LIMITS if limits is None else limits
+        self.weights = ADMISSION_WEIGHTS if weights is None else weights
+        self.budget = budget
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self._endpoints: dict[str, EndpointStats] = {}
+        self._waiters: list[_Waiter] = []
+        self._running_cost = 0.0
+        self._virtual_time = 0.0
+        self._last_finish: dict[str, float] = {}
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        return self._endpoints.setdefault(endpoint, EndpointStats())
+
+    def _can_start(self, endpoint: str, cost: float) -> bool:
+        limit = self.limits.get(endpoint)
+        if limit is not None and self._stats(endpoint).running >= limit:
+            return False
+        # A request costing more than the budget runs alone.
+        return self._running_cost == 0 or self._running_cost + cost <= self.budget
+
+    def _start(self, endpoint: str, cost: float) -> None:
+        stats = self._stats(endpoint)
+        stats.running += 1
+        stats.running_cost += cost
+        stats.admitted += 1
+        self._running_cost += cost
+
+    def _finish(self, endpoint: str, cost: float) -> None:
+        stats = self._stats(endpoint)
+        stats.running -= 1
+        stats.running_cost -= cost
+        self._running_cost -= cost
+        if not any(stats.running for stats in self._endpoints.values()):
+            # Drop the rounding errors of float sums.
+            self._running_cost = 0.0
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiting requests, lowest virtual finish time first.
+
+        When the first one in line only waits for cost budget, later ones wait
+        too, so that expensive requests are not starved by cheap ones.
+        """
+        while self._waiters:
+            candidates = [
+                waiter
+                for waiter in self._waiters
+                if self._stats(waiter.endpoint).running
+                < self.limits.get(waiter.endpoint, float("inf"))
+            ]
+            if not candidates:
+                return
+            waiter = min(candidates, key=lambda w: w.finish_tag)
+            if not self._can_start(waiter.endpoint, waiter.cost):
+                return
+            self._waiters.remove(waiter)
+            self._stats(waiter.endpoint).queued -= 1
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            self._start(waiter.endpoint, waiter.cost)
+            waiter.future.set_result(None)
+
+    def _enqueue(self, endpoint: str, cost: float) -> _Waiter:
+        stats = self._stats(endpoint)
+        if stats.queued >= self.queue_limit:
+            stats.rejected += 1
+            logger.warning("Rejected %s request: %d queued.", endpoint, stats.queued)
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy, retry later.",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+        start_tag = max(self._virtual_time, self._last_finish.get(endpoint, 0.0))
+        finish_tag = start_tag + cost / self.weights.get(endpoint, 1.0)
+        self._last_finish[endpoint] = finish_tag
+        waiter = _Waiter(
+            endpoint,
+            cost,
+            start_tag,
+            finish_tag,
+            asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        stats.queued += 1
+        return waiter
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str, cost: float = 1.0) -> AsyncIterator[None]:
+        """Wait for an admission slot of endpoint and hold it in the block.
+
+        Raises
+        ------
+        HTTPException
+            503 when the endpoint queue is full or the wait times out.
+        """
+        waiter = self._enqueue(endpoint, cost)
+        self._dispatch()
+        stats = self._stats(endpoint)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.future.done():
+                # Admitted just as the wait ended: give the slot back.
+                self._finish(endpoint, cost)
+            else:
+                waiter.future.cancel()
+                self._waiters.remove(waiter)
+                stats.queued -= 1
+                self._dispatch()
+            if isinstance(error, asyncio.CancelledError):
+                raise
+            stats.timed_out += 1
+            logger.warning(
+                "Rejected %s request after %d s.", endpoint, self.queue_timeout
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy, retry later.",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            ) from None
+
+        wait = time.monotonic() - queued_at
+        stats.wait_seconds += wait
+        if wait >= 1:
+            logger.info("%s request waited %.1f s for admission.", endpoint, wait)
+        try:
+            yield
+        finally:
+            self._finish(endpoint, cost)
+
+    def stats(self) -> dict[str, Any]:
+        """Budget use, and queue and admission counters per endpoint."""
+        return {
+            "budget": self.budget,
+            "running_cost": self._running_cost,
+            "queued": len(self._waiters),
+            "endpoints": {
+                endpoint: asdict(stats) for endpoint, stats in self._endpoints.items()
+            },
+        }
+
+
+admission_controller = AdmissionController()
+
+
+def _admission_metrics(*fields: str):
+    def callback():
+        return [
+            ({"endpoint": endpoint, "field": name}, getattr(stats, name))
+            for endpoint, stats in admission_controller._endpoints.items()
+            for name in fields
+        ]
+
+    return callback
+
+
+metrics.register_callback(
+    "prism_admission_requests",
+    "Requests of expensive endpoints running or queued for admission.",
+    _admission_metrics("running", "queued"),
+)
+metrics.register_callback(
+    "prism_admission_decisions_total",
+    "Requests of expensive endpoints admitted, rejected or timed out.",
+    _admission_metrics("admitted", "rejected", "timed_out"),
+    type_name="counter",
+)
+
+
+def admitted(endpoint: str, cost: float | Callable[[Request], float] = 1.0):
+    """FastAPI dependency holding an admission slot while the route runs.
+
+    cost is a number, or a function estimating it from the request.
+    """
+
+    async def dependency(request: Request) -> AsyncIterator[None]:
+        request_cost = cost(request) if callable(cost) else cost
+        async with admission_controller.admit(endpoint, request_cost):
+            yield
+
+    return dependency
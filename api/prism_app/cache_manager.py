@@ -0,0 +1,439 @@
+"""Size budget and least recently used eviction for CACHE_DIRECTORY.
+
+Every cached file is assigned a category from its filename prefix (see
+``_get_cached_filepath``). A sweep deletes the least recently used files of
+each category over its quota, then of the whole cache over CACHE_MAX_BYTES.
+
+Last access times are kept in a small SQLite index next to the cache, written
+by ``record_access`` (called from ``is_file_valid``), because file timestamps
+cannot be used: atime is usually disabled and ctime/mtime drive expiry of
+cached responses and the result cache keys. Files never recorded fall back to
+their mtime. Only regular files at the top of CACHE_DIRECTORY are managed;
+partial downloads, temporary files and the SQLite databases are left alone,
+manifests are evicted with the file they describe, and download lock files are
+deleted once stale and their file is gone.
+"""
+
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Final, Iterator, Optional
+
+import prism_app.caching as caching
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_quotas(value: str) -> dict[str, int]:
+    """Parse ``category=bytes`` pairs separated by commas."""
+    quotas: dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        category, separator, size = item.partition("=")
+        if not separator or not size.strip().isdigit():
+            raise ValueError(
+                f"Invalid CACHE_CATEGORY_QUOTAS entry {item!r}, "
+                "expected category=bytes."
+            )
+        quotas[category.strip()] = int(size)
+    return quotas
+
+
+# Total size of CACHE_DIRECTORY (bytes) enforced by sweeps, 0 for no limit.
+CACHE_MAX_BYTES: Final[int] = int(os.getenv("CACHE_MAX_BYTES", 20 * 1024**3))
+# Per-category budgets, e.g. "raster=10737418240,zones=1073741824".
+CACHE_CATEGORY_QUOTAS: Final[dict[str, int]] = _parse_quotas(
+    os.getenv("CACHE_CATEGORY_QUOTAS", "")
+)
+# Seconds between background sweeps in each API process, 0 to disable.
+CACHE_SWEEP_INTERVAL_SECONDS: Final[int] = int(
+    os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", 300)
+)
+# Files used more recently than this are never evicted, so that a file is not
+# deleted between is_file_valid and the read that follows.
+CACHE_EVICTION_GRACE_SECONDS: Final[int] = int(
+    os.getenv("CACHE_EVICTION_GRACE_SECONDS", 600)
+)
+
+CACHE_INDEX_FILENAME: Final[str] = "cache_index.sqlite"
+# Accesses of the same file are written to the index at most this often.
+ACCESS_RECORD_INTERVAL_SECONDS: Final[int] = 60
+
+# Longest prefixes first, so that "raster_masked" wins over "raster".
+CACHE_CATEGORIES: Final[tuple[str, ...]] = (
+    "wfs_intersection",
+    "zones_simplified",
+    "raster_masked",
+    "zones_geojson",
+    "google_floods",
+    "zone_labels",
+    "inundations",
+    "raster",
+    "zones",
+    "stats",
+    "wfs",
+)
+
+_UNMANAGED_SUFFIXES: Final[tuple[str, ...]] = (
+    ".lock",
+    ".manifest",
+    ".part",
+    ".part.validator",
+    ".tmp",
+    "-wal",
+    "-shm",
+    "-journal",
+)
+_SWEEP_LOCK_FILENAME: Final[str] = "cache_sweep.lock"
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS access (
+        name TEXT PRIMARY KEY,
+        accessed_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""",
+)
+
+_last_recorded: dict[str, float] = {}
+_sweeper: Optional[threading.Thread] = None
+_sweeper_stop = threading.Event()
+
+
+@dataclass
+class CacheEntry:
+    name: str
+    path: str
+    category: str
+    size: int
+    last_access: float
+
+
+def cache_category(filename: str) -> str:
+    """Category of a cached file, from the prefix of its name."""
+    for category in CACHE_CATEGORIES:
+        if filename.startswith(f"{category}_"):
+            return category
+    stem, _, extension = filename.partition(".")
+    # Kobo forms are cached as the hex encoded form id (see get_kobo_path).
+    if extension == "json" and stem and all(c in "0123456789abcdef" for c in stem):
+        return "kobo"
+    return "other"
+
+
+def _is_managed(filename: str) -> bool:
+    return not (
+        filename.endswith(_UNMANAGED_SUFFIXES)
+        or filename.startswith((CACHE_INDEX_FILENAME, "results_cache.sqlite"))
+        or filename == _SWEEP_LOCK_FILENAME
+    )
+
+
+def _cache_directory() -> str:
+    return caching.CACHE_DIRECTORY.rstrip(os.sep) or os.sep
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    path = os.path.join(_cache_directory(), CACHE_INDEX_FILENAME)
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        yield connection
+    finally:
+        connection.close()
+
+
+def record_access(filepath: str) -> None:
+    """Mark a cached file as used now. Failures are logged, never raised."""
+    directory, name = os.path.split(os.path.abspath(filepath))
+    if directory != os.path.abspath(_cache_directory()) or not _is_managed(name):
+        return
+    now = time.time()
+    if now - _last_recorded.get(name, 0) < ACCESS_RECORD_INTERVAL_SECONDS:
+        return
+    _last_recorded[name] = now
+    try:
+        with _connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO access VALUES (?, ?)", (name, now)
+            )
+    except sqlite3.Error as error:
+        logger.warning("Could not record cache access to %s: %s", name, error)
+
+
+def scan_cache() -> list[CacheEntry]:
+    """Managed files of the cache, least recently used first."""
+    directory = _cache_directory()
+    if not os.path.isdir(directory):
+        return []
+    try:
+        with _connect() as connection:
+            accessed = dict(
+                connection.execute("SELECT name, accessed_at FROM access").fetchall()
+            )
+    except sqlite3.Error as error:
+        logger.warning("Could not read the cache access index: %s", error)
+        accessed = {}
+
+    entries = []
+    with os.scandir(directory) as it:
+        for dir_entry in it:
+            if not _is_managed(dir_entry.name):
+                continue
+            try:
+                if not dir_entry.is_file(follow_symlinks=False):
+                    continue
+                stat = dir_entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            entries.append(
+                CacheEntry(
+                    name=dir_entry.name,
+                    path=dir_entry.path,
+                    category=cache_category(dir_entry.name),
+                    size=stat.st_size,
+                    last_access=max(accessed.get(dir_entry.name, 0.0), stat.st_mtime),
+                )
+            )
+    entries.sort(key=lambda entry: entry.last_access)
+    return entries
+
+
+def _select_evictions(
+    entries: list[CacheEntry],
+    max_bytes: int,
+    quotas: dict[str, int],
+    protected_after: float,
+) -> list[CacheEntry]:
+    """LRU entries to delete to fit every category quota and the total budget."""
+    category_bytes: dict[str, int] = defaultdict(int)
+    for entry in entries:
+        category_bytes[entry.category] += entry.size
+    total = sum(category_bytes.values())
+    evictable = [entry for entry in entries if entry.last_access < protected_after]
+    selected: dict[str, CacheEntry] = {}
+
+    def evict(entry: CacheEntry) -> None:
+        nonlocal total
+        selected[entry.name] = entry
+        category_bytes[entry.category] -= entry.size
+        total -= entry.size
+
+    for category, quota in quotas.items():
+        for entry in evictable:
+            if category_bytes[category] <= quota:
+                break
+            if entry.category == category:
+                evict(entry)
+
+    if max_bytes > 0:
+        for entry in evictable:
+            if total <= max_bytes:
+                break
+            if entry.name not in selected:
+                evict(entry)
+
+    return list(selected.values())
+
+
+def _increment(connection: sqlite3.Connection, name: str, amount: int) -> None:
+    connection.execute(
+        "INSERT INTO counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount),
+    )
+
+
+@contextmanager
+def _sweep_lock() -> Iterator[bool]:
+    """Non-blocking lock so that one process sweeps at a time."""
+    path = os.path.join(_cache_directory(), _SWEEP_LOCK_FILENAME)
+    with open(path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _remove_orphan_locks(protected_after: float) -> int:
+    """Delete download lock files of missing files, unused since protected_after.
+
+    A lock file is only deleted while flocked, and cache_file takes the lock
+    again if its lock file was deleted under it (see caching._flock).
+    """
+    directory = _cache_directory()
+    removed = 0
+    for name in os.listdir(directory):
+        if not name.endswith(caching.LOCK_SUFFIX) or name == _SWEEP_LOCK_FILENAME:
+            continue
+        path = os.path.join(directory, name)
+        if os.path.exists(path[: -len(caching.LOCK_SUFFIX)]):
+            continue
+        try:
+            if os.stat(path).st_mtime >= protected_after:
+                continue
+            with open(path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def sweep(
+    max_bytes: int = CACHE_MAX_BYTES,
+    quotas: Optional[dict[str, int]] = None,
+    grace_seconds: int = CACHE_EVICTION_GRACE_SECONDS,
+) -> Optional[dict[str, int]]:
+    """Evict least recently used files over the category quotas and budget.
+
+    Returns a summary of the sweep, or None if another process is sweeping
+    or the cache directory does not exist.
+    """
+    quotas = CACHE_CATEGORY_QUOTAS if quotas is None else quotas
+    if not os.path.isdir(_cache_directory()):
+        logger.debug("Cache directory does not exist, nothing to sweep.")
+        return None
+    with _sweep_lock() as acquired:
+        if not acquired:
+            logger.debug("Cache sweep already running in another process.")
+            return None
+
+        start = time.time()
+        entries = scan_cache()
+        evicted = []
+        for entry in _select_evictions(
+            entries, max_bytes, quotas, protected_after=start - grace_seconds
+        ):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            except OSError as error:
+                logger.warning("Could not evict %s: %s", entry.path, error)
+                continue
+            evicted.append(entry)
+            try:
+                os.remove(f"{entry.path}{caching.MANIFEST_SUFFIX}")
+            except FileNotFoundError:
+                pass
+            _last_recorded.pop(entry.name, None)
+        _remove_orphan_locks(protected_after=start - grace_seconds)
+
+        existing = {entry.name for entry in entries} - {e.name for e in evicted}
+        try:
+            with _connect() as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                for (name,) in connection.execute("SELECT name FROM access").fetchall():
+                    if name not in existing:
+                        connection.execute("DELETE FROM access WHERE name = ?", (name,))
+                for entry in evicted:
+                    _increment(connection, f"evicted_files:{entry.category}", 1)
+                    _increment(
+                        connection, f"evicted_bytes:{entry.category}", entry.size
+                    )
+                _increment(connection, "sweeps", 1)
+                connection.execute("COMMIT")
+        except sqlite3.Error as error:
+            logger.warning("Could not update the cache access index: %s", error)
+
+    summary = {
+        "files": len(entries) - len(evicted),
+        "bytes": sum(entry.size for entry in entries)
+        - sum(entry.size for entry in evicted),
+        "evicted_files": len(evicted),
+        "evicted_bytes": sum(entry.size for entry in evicted),
+    }
+    logger.info(
+        "Cache sweep took %d ms: %s",
+        (time.time() - start) * 1000,
+        ", ".join(f"{key}={value}" for key, value in summary.items()),
+    )
+    return summary
+
+
+def get_cache_stats() -> dict:
+    """Occupancy per category and eviction counters across all processes."""
+    categories: dict[str, dict[str, int]] = defaultdict(
+        lambda: {"files": 0, "bytes": 0, "evicted_files": 0, "evicted_bytes": 0}
+    )
+    for entry in scan_cache():
+        categories[entry.category]["files"] += 1
+        categories[entry.category]["bytes"] += entry.size
+
+    sweeps = 0
+    try:
+        with _connect() as connection:
+            for name, value in connection.execute(
+                "SELECT name, value FROM counters"
+            ).fetchall():
+                if name == "sweeps":
+                    sweeps = value
+                    continue
+                counter, _, category = name.partition(":")
+                categories[category][counter] = value
+    except sqlite3.Error as error:
+        logger.warning("Could not read cache eviction counters: %s", error)
+
+    for category, quota in CACHE_CATEGORY_QUOTAS.items():
+        categories[category]["quota"] = quota
+    return {
+        "max_bytes": CACHE_MAX_BYTES,
+        "files": sum(c["files"] for c in categories.values()),
+        "bytes": sum(c["bytes"] for c in categories.values()),
+        "sweeps": sweeps,
+        "categories": dict(sorted(categories.items())),
+    }
+
+
+def _sweep_forever(interval: float) -> None:
+    while not _sweeper_stop.wait(interval):
+        try:
+            sweep()
+        except Exception:
+            logger.exception("Cache sweep failed.")
+
+
+def start_sweeper(
+    interval: float = CACHE_SWEEP_INTERVAL_SECONDS,
+) -> Optional[threading.Thread]:
+    """Sweep the cache every interval seconds in a daemon thread.
+
+    Does nothing when the interval is 0 or a sweeper is already running.
+    """
+    global _sweeper
+    if interval <= 0 or (_sweeper is not None and _sweeper.is_alive()):
+        return None
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(
+        target=_sweep_forever, args=(interval,), name="cache-sweeper", daemon=True
+    )
+    _sweeper.start()
+    return _sweeper
+
+
+def stop_sweeper() -> None:
+    global _sweeper
+    _sweeper_stop.set()
+    if _sweeper is not None:
+        _sweeper.join()
+        _sweeper = None
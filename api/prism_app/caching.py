@@ -1,17 +1,23 @@
 """Methods to cache remote files."""
 
+import fcntl
 import hashlib
 import json
 import logging
 import os
 import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Final, Iterator, Optional
 
-import rasterio  # type: ignore
+import prism_app.cache_manager as cache_manager
 import requests
 from fastapi import HTTPException
-from prism_app.timer import timed
+from prism_app.download import DownloadError, download_file
+from prism_app.metrics import CACHE_REQUESTS
+from prism_app.timer import increment, timed
 
 from .models import FilePath, GeoJSON
 
@@ -20,6 +26,20 @@ logger = logging.getLogger(__name__)
 CACHE_DIRECTORY = os.getenv("CACHE_DIRECTORY", "/cache/")
 MAX_TIME_DIFF = int(os.getenv("MAX_TIME_DIFF", 30))  # minutes
 
+# Sidecar written once a cached GeoTIFF is complete, see write_manifest.
+MANIFEST_SUFFIX: Final[str] = ".manifest"
+_MANIFEST_HEADER_BYTES: Final[int] = 4096
+
+# Suffix of the file flocked by the process downloading a cached file.
+LOCK_SUFFIX: Final[str] = ".lock"
+
+# Per-file locks coalescing concurrent cache_file downloads in this process,
+# with the number of threads holding or waiting on each: an entry is dropped
+# when that number goes back to 0.
+_download_locks: dict[str, tuple[threading.Lock, int]] = {}
+_download_locks_guard = threading.Lock()
+_download_counters: Counter = Counter()
+
 
 def get_kobo_path(form_id: str) -> str:
     """Creates kobo path and file name. Form id is encoded to avoid traversal directory attacks."""
@@ -78,24 +98,96 @@ def cache_file(url: str, prefix: str, extension: str = "cache") -> FilePath:
     )
     # If the file exists, return path.
     if is_file_valid(cache_filepath):
+        CACHE_REQUESTS.inc(prefix=prefix, result="hit")
         return cache_filepath
 
-    # If the file does not exist, download and return path.
-    response = requests.get(url, verify=False)
+    # Single flight: one caller downloads, concurrent ones wait for its file.
+    with _download_lock(cache_filepath):
+        if is_file_valid(cache_filepath):
+            _count_download("coalesced")
+            CACHE_REQUESTS.inc(prefix=prefix, result="coalesced")
+            logger.info("Reusing concurrent download for {}.".format(url))
+            return cache_filepath
+
+        # If the file does not exist, download and return path.
+        try:
+            download_file(url, cache_filepath)
+        except (requests.HTTPError, DownloadError) as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=500,
+                detail=f"The file you requested is not available - {url}",
+            )
+        if ".tif" in cache_filepath:
+            write_manifest(cache_filepath)
+        _count_download("fresh")
+        CACHE_REQUESTS.inc(prefix=prefix, result="miss")
+
+    logger.info("Caching file for {}.".format(url))
+    return cache_filepath
+
+
+def _count_download(kind: str) -> None:
+    with _download_locks_guard:
+        _download_counters[kind] += 1
+    increment(f"{kind}_downloads")
+
 
+def get_download_stats() -> dict[str, int]:
+    """Fresh and coalesced cache_file downloads since this process started."""
+    with _download_locks_guard:
+        return {kind: _download_counters[kind] for kind in ("fresh", "coalesced")}
+
+
+@contextmanager
+def _download_lock(cache_filepath: FilePath) -> Iterator[None]:
+    """Serialize downloads of one file across threads and processes.
+
+    Threads of this process queue on an in-process lock, and one thread per
+    process takes an exclusive flock on a sidecar lock file. The lock file is
+    touched when taken, so that the cache sweeper only deletes stale ones
+    (see cache_manager.sweep).
+    """
+    with _download_locks_guard:
+        thread_lock, users = _download_locks.get(cache_filepath, (threading.Lock(), 0))
+        _download_locks[cache_filepath] = (thread_lock, users + 1)
     try:
-        response.raise_for_status()
-    except requests.HTTPError as e:
-        logger.error(e)
-        raise HTTPException(
-            status_code=500, detail=f"The file you requested is not available - {url}"
-        )
+        with thread_lock, _flock(f"{cache_filepath}{LOCK_SUFFIX}"):
+            yield
+    finally:
+        with _download_locks_guard:
+            thread_lock, users = _download_locks[cache_filepath]
+            if users == 1:
+                del _download_locks[cache_filepath]
+            else:
+                _download_locks[cache_filepath] = (thread_lock, users - 1)
+
+
+@contextmanager
+def _flock(lock_path: str) -> Iterator[None]:
+    """Exclusive flock on lock_path, created if needed.
+
+    The lock file may be deleted by the sweeper between open and flock: the
+    lock is then taken again on the file now at lock_path.
+    """
+    while True:
+        with open(lock_path, "a") as lock_file:
+            os.utime(lock_file.fileno())
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if _is_open_file(lock_file.fileno(), lock_path):
+                    yield
+                    return
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-    with open(cache_filepath, "wb") as f:
-        f.write(response.content)
 
-    logger.info("Caching file for {}.".format(url))
-    return cache_filepath
+def _is_open_file(fd: int, path: str) -> bool:
+    """Whether path still refers to the open file fd."""
+    try:
+        return os.path.samestat(os.fstat(fd), os.stat(path))
+    except FileNotFoundError:
+        return False
 
 
 @timed
@@ -218,19 +310,65 @@ def _hash_value(value: str) -> str:
 
 
 def is_file_valid(filepath) -> bool:
-    """Test if a file exists and is valid. For .tif, also try to read it."""
-    if os.path.isfile(filepath):
-        # if the file is a geotiff, confirm that we can open it.
-        is_tif = ".tif" in filepath
-        if is_tif:
-            try:
-                rasterio.open(filepath)
-                return True
-            except rasterio.errors.RasterioError:
-                return False
-        return True
+    """Test if a file exists and is valid.
+
+    A .tif is valid if its manifest matches, otherwise it is opened with
+    rasterio once and a manifest is written for later lookups. Valid files are
+    recorded as used for the cache manager's LRU eviction.
+    """
+    if not os.path.isfile(filepath):
+        return False
+
+    if ".tif" in filepath and not _manifest_matches(filepath):
+        import rasterio  # type: ignore
+
+        increment("raster_full_validations")
+        try:
+            with rasterio.open(filepath):
+                pass
+        except rasterio.errors.RasterioError:
+            return False
+        write_manifest(filepath)
+
+    cache_manager.record_access(filepath)
+    return True
+
+
+def _header_checksum(filepath: str) -> str:
+    with open(filepath, "rb") as f:
+        return hashlib.sha256(f.read(_MANIFEST_HEADER_BYTES)).hexdigest()
 
-    return False
+
+def write_manifest(filepath: str) -> None:
+    """Record that a file is complete and readable, in a sidecar manifest.
+
+    Written once a download or derived raster is in place, so that later
+    validity checks only compare the size and header checksum instead of
+    opening the file with GDAL.
+    """
+    manifest = {
+        "size": os.path.getsize(filepath),
+        "header_sha256": _header_checksum(filepath),
+        "complete": True,
+    }
+    tmp_filepath = f"{filepath}{MANIFEST_SUFFIX}.{os.getpid()}.tmp"
+    with open(tmp_filepath, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_filepath, f"{filepath}{MANIFEST_SUFFIX}")
+
+
+def _manifest_matches(filepath: str) -> bool:
+    """Whether the manifest of a file exists and still describes it."""
+    try:
+        with open(f"{filepath}{MANIFEST_SUFFIX}") as f:
+            manifest = json.load(f)
+        return (
+            manifest.get("complete") is True
+            and manifest.get("size") == os.path.getsize(filepath)
+            and manifest.get("header_sha256") == _header_checksum(filepath)
+        )
+    except (OSError, ValueError):
+        return False
 
 
 def get_cache_age(filepath: FilePath) -> float:
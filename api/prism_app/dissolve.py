@@ -0,0 +1,136 @@
+"""Dissolve polygons by group with shapely 2 array operations.
+
+Kept free of heavy imports: worker processes are spawned fresh and only
+import this module.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Final, Hashable, Optional, Sequence
+
+import numpy as np
+import shapely  # type: ignore
+from shapely.errors import GEOSException  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Worker processes dissolving groups in parallel, 1 to dissolve in-process.
+DISSOLVE_WORKERS: Final[int] = int(
+    os.getenv("DISSOLVE_WORKERS", min(4, os.cpu_count() or 1))
+)
+# Below this many geometries, spawning workers costs more than it saves.
+DISSOLVE_PARALLEL_MIN_GEOMETRIES: Final[int] = int(
+    os.getenv("DISSOLVE_PARALLEL_MIN_GEOMETRIES", 5000)
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _is_coverage(geometries: np.ndarray) -> bool:
+    # Needs shapely >= 2.1 built against GEOS >= 3.12.
+    coverage_is_valid = getattr(shapely, "coverage_is_valid", None)
+    if coverage_is_valid is None:
+        return False
+    try:
+        return bool(coverage_is_valid(geometries))
+    except (GEOSException, shapely.errors.UnsupportedGEOSVersionError):
+        return False
+
+
+def dissolve(geometries: np.ndarray) -> Optional[shapely.Geometry]:
+    """Union of geometries, or None if GEOS fails.
+
+    Non-overlapping polygons with shared edges, as administrative boundaries
+    usually are, go through the much faster coverage union.
+    """
+    try:
+        if len(geometries) > 1 and _is_coverage(geometries):
+            return shapely.coverage_union_all(geometries)
+        return shapely.union_all(geometries)
+    except (ValueError, GEOSException) as error:
+        logger.error("Could not dissolve %d geometries: %s", len(geometries), error)
+        return None
+
+
+def _dissolve_wkb(wkbs: list[bytes]) -> Optional[bytes]:
+    geometry = dissolve(shapely.from_wkb(wkbs))
+    return None if geometry is None else shapely.to_wkb(geometry)
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Pool shared by dissolve_groups calls, of workers processes on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: API processes run threads.
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+
+def shutdown_pool() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def dissolve_groups(
+    keys: Sequence[Hashable],
+    geometries: np.ndarray,
+    workers: int = DISSOLVE_WORKERS,
+) -> dict[Hashable, Optional[shapely.Geometry]]:
+    """Dissolve the geometries sharing a key, in order of first appearance.
+
+    Large inputs are dissolved across the processes of a shared pool, one
+    group per task, with geometries passed as WKB. In a child process, such
+    as a stats pool worker, groups are dissolved serially: its siblings
+    already use the other cores, and nesting pools would spawn processes and
+    import modules again in each worker. The API therefore groups zones
+    before sending stats to its pool.
+    """
+    groups: dict[Hashable, list[int]] = defaultdict(list)
+    for index, key in enumerate(keys):
+        groups[key].append(index)
+
+    parallel = (
+        workers > 1
+        and len(groups) > 1
+        and len(geometries) >= DISSOLVE_PARALLEL_MIN_GEOMETRIES
+        and multiprocessing.parent_process() is None
+    )
+    if parallel:
+        executor = _get_executor(workers)
+        try:
+            results = executor.map(
+                _dissolve_wkb,
+                [
+                    shapely.to_wkb(geometries[indices]).tolist()
+                    for indices in groups.values()
+                ],
+            )
+            return {
+                key: None if wkb is None else shapely.from_wkb(wkb)
+                for key, wkb in zip(groups, results)
+            }
+        except BrokenProcessPool as error:
+            # A worker died (e.g. out of memory): start a new pool next time.
+            logger.error("Dissolve worker died, dissolving serially: %s", error)
+            _discard_executor(executor)
+
+    return {key: dissolve(geometries[indices]) for key, indices in groups.items()}
@@ -0,0 +1,165 @@
+"""Streaming, resumable file downloads over pooled HTTP connections."""
+
+import logging
+import os
+import threading
+import time
+from typing import Final, Optional
+
+import requests
+from prism_app.timer import increment, record
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CONNECT_TIMEOUT: Final[float] = float(
+    os.getenv("DOWNLOAD_CONNECT_TIMEOUT", 10)
+)
+# Maximum wait for the next bytes of a response, not for the whole download.
+DOWNLOAD_READ_TIMEOUT: Final[float] = float(os.getenv("DOWNLOAD_READ_TIMEOUT", 60))
+DOWNLOAD_RETRIES: Final[int] = int(os.getenv("DOWNLOAD_RETRIES", 3))
+DOWNLOAD_POOL_SIZE: Final[int] = int(os.getenv("DOWNLOAD_POOL_SIZE", 10))
+DOWNLOAD_CHUNK_SIZE: Final[int] = 64 * 1024
+
+# Partial downloads and the ETag/Last-Modified they were started with.
+PARTIAL_SUFFIX: Final[str] = ".part"
+_VALIDATOR_SUFFIX: Final[str] = ".part.validator"
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+class DownloadError(Exception):
+    """Raised when a file cannot be downloaded after all retries."""
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, pooling connections per host.
+
+    Created lazily per process so that forked workers do not share sockets.
+    Connection errors and 429/5xx responses are retried with backoff.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            retry = Retry(
+                total=DOWNLOAD_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=DOWNLOAD_POOL_SIZE,
+                pool_maxsize=DOWNLOAD_POOL_SIZE,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = False
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def _read_validator(filepath: str) -> Optional[str]:
+    try:
+        with open(filepath + _VALIDATOR_SUFFIX) as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+
+
+def _remove_partial(filepath: str) -> None:
+    for suffix in (PARTIAL_SUFFIX, _VALIDATOR_SUFFIX):
+        try:
+            os.remove(filepath + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _resume_offset(filepath: str) -> int:
+    """Bytes already downloaded that can be resumed, or 0 to start over."""
+    partial = filepath + PARTIAL_SUFFIX
+    if not os.path.isfile(partial) or _read_validator(filepath) is None:
+        return 0
+    return os.path.getsize(partial)
+
+
+def _download_attempt(url: str, filepath: str) -> None:
+    """Stream url into the partial file, resuming it if possible."""
+    offset = _resume_offset(filepath)
+    # Byte ranges must refer to the stored bytes, not to a compressed stream.
+    headers = {"Accept-Encoding": "identity"}
+    if offset > 0:
+        # If-Range makes the server send the whole file if it has changed.
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = _read_validator(filepath)
+
+    with get_session().get(
+        url,
+        headers=headers,
+        stream=True,
+        timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT),
+    ) as response:
+        if response.status_code == 416:
+            # The partial file is already complete or does not match anymore.
+            _remove_partial(filepath)
+            raise requests.ConnectionError("Range not satisfiable, restarting.")
+        response.raise_for_status()
+
+        resumed = response.status_code == 206
+        if resumed:
+            logger.info("Resuming download of %s at byte %d.", url, offset)
+            increment("resumed_downloads")
+        else:
+            validator = response.headers.get("ETag") or response.headers.get(
+                "Last-Modified"
+            )
+            with open(filepath + _VALIDATOR_SUFFIX, "w") as f:
+                f.write(validator or "")
+
+        with open(filepath + PARTIAL_SUFFIX, "ab" if resumed else "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+
+def download_file(url: str, filepath: str) -> None:
+    """Download url to filepath in chunks, without holding it in memory.
+
+    Data is streamed to ``filepath + ".part"`` and renamed into place when
+    complete. Interrupted transfers are resumed with an HTTP Range request
+    (guarded by If-Range) on the next attempt, including by a later call
+    after a crash. Callers must serialize downloads of the same filepath.
+
+    Raises
+    ------
+    requests.HTTPError
+        When the server answers with an error status.
+    DownloadError
+        When the transfer keeps failing after DOWNLOAD_RETRIES retries.
+    """
+    start = time.time()
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            _download_attempt(url, filepath)
+            break
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as error:
+            if attempt == DOWNLOAD_RETRIES:
+                raise DownloadError(f"Could not download {url}: {error}") from error
+            logger.warning("Download of %s interrupted, retrying: %s", url, error)
+            time.sleep(0.5 * 2**attempt)
+
+    os.replace(filepath + PARTIAL_SUFFIX, filepath)
+    _remove_partial(filepath)
+
+    size_mb = os.path.getsize(filepath) / 1024**2
+    elapsed = max(time.time() - start, 1e-3)
+    record("download_mb", round(size_mb, 2))
+    record("download_mb_per_s", round(size_mb / elapsed, 2))
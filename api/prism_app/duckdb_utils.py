@@ -1,7 +1,18 @@
+import logging
 import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Final, Iterator, Optional
 
 import duckdb
 
+logger = logging.getLogger(__name__)
+
+# Set up the DuckDB pool when the API starts instead of on the first request.
+DUCKDB_WARM_UP: Final[bool] = (
+    os.getenv("DUCKDB_WARM_UP", "true").strip().lower() == "true"
+)
+
 
 def setup_duckdb_connection():
     """Set up a DuckDB connection with necessary extensions and S3 credentials."""
@@ -21,3 +32,93 @@ def setup_duckdb_connection():
         """)
 
     return con
+
+
+# Errors after which a DuckDB database must not be used anymore.
+_FATAL_ERRORS = (
+    duckdb.FatalException,
+    duckdb.InternalException,
+    duckdb.ConnectionException,
+)
+
+
+class DuckDBPool:
+    """One initialized DuckDB database per process, handing out cursors.
+
+    Extensions are installed and loaded, and the S3 secret created, once per
+    process instead of on every query. Each ``cursor()`` is a separate
+    connection to that database, safe to use from its own thread. After a
+    fatal error the database is discarded and set up again on next use.
+    """
+
+    def __init__(
+        self,
+        initialize: Callable[[], duckdb.DuckDBPyConnection] = setup_duckdb_connection,
+    ):
+        self._initialize = initialize
+        self._connection: Optional[duckdb.DuckDBPyConnection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            # Forked workers must not share the parent's database.
+            if self._connection is None or self._pid != os.getpid():
+                self._connection = self._initialize()
+                self._pid = os.getpid()
+            return self._connection
+
+    def _discard(self, connection: duckdb.DuckDBPyConnection) -> None:
+        with self._lock:
+            if self._connection is connection:
+                self._connection = None
+        try:
+            connection.close()
+        except duckdb.Error:
+            pass
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Yield a cursor on the pooled database, closed when done."""
+        connection = self._get_connection()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        except _FATAL_ERRORS as error:
+            logger.warning("Recycling DuckDB connection after error: %s", error)
+            self._discard(connection)
+            raise
+        finally:
+            cursor.close()
+
+    def warm_up(self) -> None:
+        """Initialize the database now rather than on the first request."""
+        with self.cursor() as cursor:
+            cursor.execute("SELECT 1").fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.close()
+
+
+duckdb_pool = DuckDBPool()
+
+
+def warm_up_duckdb() -> None:
+    """Set up the DuckDB pool in the background; failures are only logged.
+
+    Skipped when disabled or when no vector store credentials are configured.
+    """
+    if not DUCKDB_WARM_UP or "VECTOR_STORE_ACCESS_KEY_ID" not in os.environ:
+        logger.debug("Skipping DuckDB warm-up.")
+        return
+
+    def warm_up() -> None:
+        try:
+            duckdb_pool.warm_up()
+        except Exception as error:
+            logger.warning("DuckDB warm-up failed: %r", error)
+
+    threading.Thread(target=warm_up, name="duckdb-warm-up", daemon=True).start()
@@ -18,6 +18,7 @@ from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright
 from pypdf import PdfReader, PdfWriter
 
+from . import metrics
 from .models import ExportFormat
 from .utils import extract_dates_from_urls
 
@@ -37,6 +38,10 @@ DEVICE_SCALE_FACTOR: Final[float] = 2
 BROWSER_POOL_SIZE: Final[int] = int(os.getenv("BROWSER_POOL_SIZE", "2"))
 MAX_RENDER_RETRIES: Final[int] = 3
 
+BROWSER_ACQUIRE_SECONDS = metrics.histogram(
+    "prism_browser_pool_acquire_seconds", "Wait for a free map export browser."
+)
+
 # Browser launch arguments optimized for Docker with proper shm_size
 BROWSER_LAUNCH_ARGS: Final[list[str]] = [
     "--disable-gpu",
@@ -78,7 +83,8 @@ class BrowserPool:
 
     async def acquire(self) -> BrowserContext:
         """Acquire a browser context from the pool (blocks if none available)."""
-        return await self.available.get()
+        with BROWSER_ACQUIRE_SECONDS.time():
+            return await self.available.get()
 
     async def release(self, context: BrowserContext) -> None:
         """Return a browser context to the pool."""
@@ -108,6 +114,24 @@ _pool: Optional[BrowserPool] = None
 _pool_lock: Optional[asyncio.Lock] = None
 
 
+def _browser_pool_metrics():
+    """Browser contexts of the shared pool, by state."""
+    if _pool is None:
+        return []
+    available = _pool.available.qsize()
+    return [
+        ({"state": "available"}, available),
+        ({"state": "in_use"}, _pool.size - available),
+    ]
+
+
+metrics.register_callback(
+    "prism_browser_pool_contexts",
+    "Browser contexts of the map export pool, by state.",
+    _browser_pool_metrics,
+)
+
+
 def _get_pool_lock() -> asyncio.Lock:
     """Get or create the pool lock, ensuring it's created in a running event loop."""
     global _pool_lock
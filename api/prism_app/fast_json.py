@@ -0,0 +1,85 @@
+"""Fast JSON serialization of large stats responses.
+
+Responses are serialized with orjson, several times faster than the json
+module on large responses, and streamed one feature at a time, instead of
+going through FastAPI's jsonable_encoder and one large JSON document in memory.
+"""
+
+import time
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+import orjson
+from prism_app.metrics import STAGE_SECONDS
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize numpy scalars and arrays."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes of value, NaN and infinite values being null."""
+    return orjson.dumps(value, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _round_coordinates(coordinates: list, precision: int) -> list:
+    if not coordinates:
+        return coordinates
+    if isinstance(coordinates[0], (int, float)) or isinstance(
+        coordinates[0][0], (int, float)
+    ):
+        # A position, or a ring or line whose positions are rounded at once.
+        return np.round(np.asarray(coordinates, dtype=float), precision).tolist()
+    return [_round_coordinates(part, precision) for part in coordinates]
+
+
+def round_geometry(geometry: Optional[dict], precision: int) -> Optional[dict]:
+    """Copy of a GeoJSON geometry with coordinates rounded to precision decimals."""
+    if geometry is None:
+        return None
+    if geometry.get("type") == "GeometryCollection":
+        return {
+            **geometry,
+            "geometries": [
+                round_geometry(part, precision) for part in geometry["geometries"]
+            ],
+        }
+    return {
+        **geometry,
+        "coordinates": _round_coordinates(geometry["coordinates"], precision),
+    }
+
+
+def iter_json_array(
+    items: Iterable[Any],
+    coordinate_precision: Optional[int] = None,
+    stage: Optional[str] = None,
+) -> Iterator[bytes]:
+    """Chunks of a JSON array of items, one item per chunk.
+
+    With coordinate_precision, the geometries of GeoJSON features are rounded
+    as they are written. With stage, the time spent serializing (not waiting
+    for the client to read chunks) is observed in the stage histogram.
+    """
+    serializing = 0.0
+    yield b"["
+    for index, item in enumerate(items):
+        start = time.perf_counter()
+        if (
+            coordinate_precision is not None
+            and isinstance(item, dict)
+            and item.get("type") == "Feature"
+        ):
+            item = {
+                **item,
+                "geometry": round_geometry(item.get("geometry"), coordinate_precision),
+            }
+        chunk = (b"," if index else b"") + dumps(item)
+        serializing += time.perf_counter() - start
+        yield chunk
+    yield b"]"
+    if stage is not None:
+        STAGE_SECONDS.observe(serializing, stage=stage)
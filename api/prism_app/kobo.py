@@ -19,11 +19,7 @@ logger = logging.getLogger(__name__)
 T = TypeVar("T")
 
 kobo_username = getenv("KOBO_USERNAME", "")
-if kobo_username == "":
-    raise Exception("Missing backend parameter: KOBO_USERNAME")
 kobo_pw = getenv("KOBO_PASSWORD", "")
-if kobo_pw == "":
-    raise Exception("Missing backend parameter: KOBO_PASSWORD")
 
 
 class KoboForm(TypedDict):
@@ -54,6 +50,13 @@ def get_kobo_params(
         id=form_id, datetime=datetime_field, geom_field=geom_field, filters=filters
     )
 
+    # Checked here rather than at import, so that the API starts without them.
+    for name, value in (("KOBO_USERNAME", kobo_username), ("KOBO_PASSWORD", kobo_pw)):
+        if value == "":
+            logger.error("Missing backend parameter: %s", name)
+            raise HTTPException(
+                status_code=500, detail=f"Missing backend parameter: {name}"
+            )
     auth = (kobo_username, kobo_pw)
 
     return auth, form_fields
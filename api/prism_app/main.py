@@ -1,19 +1,38 @@
 """FastAPI API for geospatial utils."""
 
-import functools
+import asyncio
 import json
 import logging
 import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import date
-from typing import Annotated, Any, Literal, Optional
-from urllib.parse import ParseResult, urlencode, urlunparse
-
-import rasterio  # type: ignore
-from fastapi import Depends, FastAPI, HTTPException, Path, Query, Response
+from typing import Annotated, Any, AsyncIterator, Final, Literal, Optional
+from urllib.parse import ParseResult, parse_qs, urlencode, urlparse, urlunparse
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from prism_app.admin import register_alerts_admin_views
 from prism_app.admin_map_export import PrismAdmin, register_map_export_admin_views
+from prism_app.admission import (
+    INUNDATIONS_REGION_COST,
+    RASTER_GEOTIFF_COST,
+    REPORT_COST,
+    admission_controller,
+    admitted,
+    estimate_stats_cost,
+)
 from prism_app.auth import auth_oidc
 from prism_app.auth.access_pages import access_not_configured_response
 from prism_app.auth.admin_oidc_auth import PrismAdminAuthProvider
@@ -21,6 +40,7 @@ from prism_app.auth.admin_settings import get_admin_auth_settings
 from prism_app.auth.deps import require_permissions, require_prism_session
 from prism_app.auth.permission_codes import ADMIN_ACCESS
 from prism_app.auth_legacy import optional_validate_user, validate_user
+from prism_app.cache_manager import start_sweeper, stop_sweeper
 from prism_app.caching import FilePath, cache_file, cache_geojson
 from prism_app.dashboard.published_dashboards import (
     merge_published_dashboard_rows_for_country,
@@ -29,36 +49,50 @@ from prism_app.database.alert_model import AlchemyEncoder, AlertModel
 from prism_app.database.database import DB_URI, AlertsDataBase
 from prism_app.database.kobo_user_model import KoboUser
 from prism_app.database.user_model import User
+from prism_app.duckdb_utils import warm_up_duckdb
 from prism_app.export_jobs import router as export_map_jobs_router
-from prism_app.export_maps import export_maps
 from prism_app.export_schedules import router as export_map_schedules_router
-from prism_app.googleflood import (
-    get_google_flood_dates,
-    get_google_floods_gauge_forecast,
-    get_google_floods_gauges,
-    get_google_floods_inundations,
-)
+from prism_app.fast_json import iter_json_array
 from prism_app.hdc import get_hdc_stats
-from prism_app.kobo import get_form_dates, get_form_responses, parse_datetime_params
+from prism_app.metrics import (
+    CONTENT_TYPE,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+    MetricsMiddleware,
+    render,
+    span,
+)
 from prism_app.models import AcledRequest, MapExportRequestModel, RasterGeotiffModel
-from prism_app.report import download_report
+from prism_app.profiling import (
+    PROFILE_HEADER,
+    profile,
+    profiled,
+    request_fingerprint,
+    should_profile,
+)
+from prism_app.startup import preload_modules
+from prism_app.stats_pool import stats_pool
 from prism_app.timer import timed
 from prism_app.utils import extract_dates_from_urls
 from prism_app.validation import validate_intersect_parameter
-from prism_app.zonal_stats import (
-    DEFAULT_STATS,
-    GroupBy,
-    calculate_stats,
-    get_wfs_response,
-)
 from pydantic import EmailStr, HttpUrl, ValidationError
 from requests import get
 from sqlalchemy import create_engine
 from starlette.middleware.sessions import SessionMiddleware
 from starlette_admin.contrib.sqla import Admin
 
-from .geotiff_from_stac_api import get_geotiff
-from .models import AlertsModel, StatsModel
+from .models import (
+    AlertsModel,
+    BatchStatsModel,
+    GroupBy,
+    StatsModel,
+    StatsZonesModel,
+    WfsResponse,
+)
+
+# Subsystems with heavy dependencies are imported by the routes using them, so
+# that API processes start (and recycle) fast; preload_modules imports them in
+# the background once the API is up. See scripts/profile_startup.py.
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
@@ -70,10 +104,32 @@ logger = logging.getLogger(__name__)
 # silence boto3 logging to avoid spamming the logs
 logging.getLogger("botocore").setLevel(logging.WARNING)
 
+# Concurrent raster downloads per /stats/batch request.
+BATCH_STATS_DOWNLOAD_WORKERS: Final[int] = int(
+    os.getenv("BATCH_STATS_DOWNLOAD_WORKERS", "4")
+)
+# Rasters of a /stats/batch request computed per stats pool job.
+BATCH_STATS_CHUNK_RASTERS: Final[int] = int(
+    os.getenv("BATCH_STATS_CHUNK_RASTERS", "10")
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # Keep CACHE_DIRECTORY within its size budget while the API is running.
+    start_sweeper()
+    warm_up_duckdb()
+    preload_modules()
+    yield
+    stop_sweeper()
+    stats_pool.shutdown()
+
+
 app = FastAPI(
     title="PRISM Geospatial API by WFP",
     description="A geospatial API enabling aggregation and intersection calculations "
     "between rasters and polygons.",
+    lifespan=lifespan,
 )
 
 cors_origins = [
@@ -100,6 +156,7 @@ app.add_middleware(
     same_site=_admin_session_settings.session_cookie_samesite,  # type: ignore[arg-type]
     https_only=_admin_session_settings.session_cookie_secure,
 )
+app.add_middleware(MetricsMiddleware)
 app.include_router(export_map_jobs_router)
 app.include_router(export_map_schedules_router)
 
@@ -154,6 +211,36 @@ admin.mount_to(app)
 alert_db = AlertsDataBase()
 
 
+@app.get("/internal/admission", include_in_schema=False)
+def admission_stats(prism: _AdminSession) -> dict[str, Any]:
+    """Queue and admission counters of the expensive endpoints, in this process.
+
+    Admins only.
+    """
+    return admission_controller.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(
+    authorization: Annotated[Optional[str], Header(include_in_schema=False)] = None,
+) -> Response:
+    """Metrics of this process in the Prometheus text format.
+
+    Only served with METRICS_TOKEN set, to requests bearing it.
+    """
+    if not METRICS_ENABLED or METRICS_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    if not secrets.compare_digest(
+        (authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/")
 def healthcheck() -> str:
     """Verify that the server is healthy."""
@@ -192,70 +279,22 @@ def get_published_dashboards(
     )
 
 
-@timed
-@functools.lru_cache(maxsize=128)
-def _calculate_stats(
-    zones_filepath: FilePath,
-    geotiff: FilePath,
-    stats,
-    prefix: str,
-    group_by: GroupBy,
-    geojson_out,
-    # passed as hashable frozenset for caching
-    wfs_response: Optional[frozenset],
-    intersect_comparison,
-    mask_geotiff,
-    mask_calc_expr: Optional[str] = None,
-    filter_by: Optional[tuple[str, str]] = None,
-    admin_level: Optional[int] = None,
-    simplify_tolerance: Optional[float] = None,
-    iso3_filter: Optional[str] = None,
-):
-    """Calculate stats."""
-    return calculate_stats(
-        zones_filepath,
-        geotiff,
-        stats=stats,
-        prefix=prefix,
-        group_by=group_by,
-        geojson_out=geojson_out,
-        wfs_response=dict(wfs_response) if wfs_response is not None else None,
-        intersect_comparison=intersect_comparison,
-        mask_geotiff=mask_geotiff,
-        mask_calc_expr=mask_calc_expr,
-        filter_by=filter_by,
-        admin_level=admin_level,
-        simplify_tolerance=simplify_tolerance,
-        iso3_filter=iso3_filter,
-    )
-
-
-@timed
-@app.post("/stats", responses={500: {"description": "Internal server error"}})
-def stats(stats_model: StatsModel) -> list[dict[str, Any]]:
-    """Return zonal statistics."""
-    # Accept data as json or form.
-    logger.debug("New stats request:")
-    logger.debug(stats_model)
-    geotiff_url = stats_model.geotiff_url
+def _prepare_stats_zones(
+    stats_model: StatsZonesModel,
+) -> tuple[FilePath, dict[str, Any]]:
+    """Fetch the zones and mask and parse the options shared by stats routes."""
     zones_url = stats_model.zones_url
     zones_geojson = stats_model.zones
-    geojson_out = stats_model.geojson_out
     intersect_comparison_string = stats_model.intersect_comparison
     mask_geotiff_url = stats_model.mask_url
-    mask_calc_expr = stats_model.mask_calc_expr
-    simplify_tolerance = stats_model.simplify_tolerance
-    iso3_filter = stats_model.iso3_filter
 
     filter_by = None
     # Tuple transformation fixes unhashable type error caused by timed decorator.
     if stats_model.filter_by is not None:
         filter_by = (stats_model.filter_by.key, str(stats_model.filter_by.value))
 
-    group_by = stats_model.group_by
     wfs_params = stats_model.wfs_params
 
-    geotiff = cache_file(prefix="raster", url=geotiff_url, extension="tif")
     mask_geotiff: FilePath = None
     if mask_geotiff_url:
         mask_geotiff = cache_file(
@@ -276,6 +315,8 @@ def stats(stats_model: StatsModel) -> list[dict[str, Any]]:
 
     wfs_response = None
     if wfs_params is not None:
+        from prism_app.zonal_stats import get_wfs_response
+
         wfs_response = get_wfs_response(wfs_params)
 
     intersect_comparison_tuple = None
@@ -284,32 +325,218 @@ def stats(stats_model: StatsModel) -> list[dict[str, Any]]:
             intersect_comparison_string
         )
 
-    features = _calculate_stats(
+    return zones, {
+        "group_by": stats_model.group_by,
+        "geojson_out": stats_model.geojson_out,
+        "wfs_response": wfs_response,
+        "intersect_comparison": intersect_comparison_tuple,
+        "mask_geotiff": mask_geotiff,
+        "mask_calc_expr": stats_model.mask_calc_expr,
+        "filter_by": filter_by,
+        "admin_level": stats_model.admin_level,
+        "simplify_tolerance": stats_model.simplify_tolerance,
+        "iso3_filter": stats_model.iso3_filter,
+    }
+
+
+async def _group_stats_zones(zones: FilePath, options: dict[str, Any]) -> None:
+    """Group zones here, where large groups are dissolved in parallel.
+
+    Stats pool workers dissolve serially, then find the grouped zones cached.
+    """
+    if not options["group_by"]:
+        return
+
+    from prism_app.zonal_stats import group_zones
+
+    await asyncio.to_thread(
+        group_zones,
         zones,
-        geotiff,
-        stats=" ".join(DEFAULT_STATS),
-        prefix="stats_",
-        group_by=group_by,
-        geojson_out=geojson_out,
-        wfs_response=(
-            frozenset(wfs_response.items()) if wfs_response is not None else None
-        ),
-        intersect_comparison=intersect_comparison_tuple,
-        mask_geotiff=mask_geotiff,
-        mask_calc_expr=mask_calc_expr,
-        filter_by=filter_by,
-        admin_level=stats_model.admin_level,
-        simplify_tolerance=simplify_tolerance,
-        iso3_filter=iso3_filter,
+        options["group_by"],
+        options["admin_level"],
+        options["simplify_tolerance"],
+        options["iso3_filter"],
     )
 
-    return features
 
+@app.post(
+    "/stats",
+    responses={
+        500: {"description": "Internal server error"},
+        503: {"description": "Too many stats requests in progress"},
+        504: {"description": "Stats took too long to compute"},
+    },
+)
+@timed
+async def stats(
+    stats_model: StatsModel,
+    profile_token: Annotated[
+        Optional[str], Header(alias=PROFILE_HEADER, include_in_schema=False)
+    ] = None,
+) -> StreamingResponse:
+    """Return zonal statistics.
+
+    Downloads run in threads and stats in the stats process pool, so the
+    event loop is never blocked. The JSON array is streamed feature by feature,
+    with geojson_out coordinates rounded to coordinate_precision if set. All
+    features are computed before the response starts: only serialization is
+    streamed, so the response never exists as one JSON document in memory.
+    """
+    from prism_app.zonal_stats import DEFAULT_STATS, calculate_cached_stats
 
-@app.get("/report")
+    # Accept data as json or form.
+    logger.debug("New stats request:")
+    logger.debug(stats_model)
+
+    with span("download"):
+        geotiff, (zones, options) = await asyncio.gather(
+            asyncio.to_thread(
+                cache_file,
+                prefix="raster",
+                url=str(stats_model.geotiff_url),
+                extension="tif",
+            ),
+            asyncio.to_thread(_prepare_stats_zones, stats_model),
+        )
+
+    cost = await asyncio.to_thread(
+        estimate_stats_cost, geotiff, zones, options["mask_geotiff"]
+    )
+    calculate = calculate_cached_stats
+    if should_profile(profile_token):
+        calculate = profiled(
+            "calculate_stats", request_fingerprint(stats_model), calculate
+        )
+    async with admission_controller.admit("stats", cost):
+        await _group_stats_zones(zones, options)
+        features = await stats_pool.run(
+            calculate,
+            zones,
+            geotiff,
+            stats=" ".join(DEFAULT_STATS),
+            prefix="stats_",
+            **options,
+        )
+
+    return StreamingResponse(
+        iter_json_array(features, stats_model.coordinate_precision, stage="serialize"),
+        media_type="application/json",
+    )
+
+
+def _estimate_batch_cost(
+    geotiffs: list[FilePath], zones: FilePath, mask_geotiff: Optional[FilePath]
+) -> float:
+    return sum(
+        estimate_stats_cost(geotiff, zones, mask_geotiff) for geotiff in geotiffs
+    )
+
+
+async def _batch_stats(
+    geotiff_urls: list[str], zones: FilePath, options: dict[str, Any]
+) -> AsyncIterator[dict[str, Any]]:
+    """Download rasters concurrently and yield their stats in request order.
+
+    Rasters are computed in the stats pool by chunks of
+    BATCH_STATS_CHUNK_RASTERS, each admitted as a "stats_batch" request
+    costing the sum of its rasters' costs.
+    """
+    from prism_app.zonal_stats import DEFAULT_STATS, calculate_stats_batch
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(BATCH_STATS_DOWNLOAD_WORKERS, len(geotiff_urls))
+    )
+    try:
+        downloads = [
+            executor.submit(cache_file, prefix="raster", url=url, extension="tif")
+            for url in geotiff_urls
+        ]
+        for start in range(0, len(geotiff_urls), BATCH_STATS_CHUNK_RASTERS):
+            # Rasters before a failed download are still computed and sent.
+            geotiffs: list[FilePath] = []
+            download_error: Optional[Exception] = None
+            for download in downloads[start : start + BATCH_STATS_CHUNK_RASTERS]:
+                try:
+                    geotiffs.append(await asyncio.wrap_future(download))
+                except Exception as error:
+                    download_error = error
+                    break
+
+            if geotiffs:
+                cost = await asyncio.to_thread(
+                    _estimate_batch_cost, geotiffs, zones, options["mask_geotiff"]
+                )
+                async with admission_controller.admit("stats_batch", cost):
+                    await _group_stats_zones(zones, options)
+                    results = await stats_pool.run(
+                        calculate_stats_batch,
+                        zones,
+                        geotiffs,
+                        stats=DEFAULT_STATS,
+                        prefix="stats_",
+                        **options,
+                    )
+                for url, result in zip(geotiff_urls[start:], results):
+                    yield {
+                        "date": parse_qs(urlparse(url).query).get("date", [None])[0],
+                        "geotiff_url": url,
+                        "stats": result,
+                    }
+            if download_error is not None:
+                raise download_error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _ndjson_lines(results: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    try:
+        async for result in results:
+            yield json.dumps(result) + "\n"
+    except HTTPException as error:
+        yield json.dumps({"error": error.detail}) + "\n"
+    except Exception as error:
+        logger.error("Batch stats failed: %s", error)
+        yield json.dumps({"error": "An error occured calculating statistics."}) + "\n"
+
+
+@app.post(
+    "/stats/batch",
+    responses={
+        500: {"description": "Internal server error"},
+        503: {"description": "Too many stats requests in progress"},
+        504: {"description": "Stats took too long to compute"},
+    },
+)
+async def stats_batch(stats_model: BatchStatsModel):
+    """Return zonal statistics for a series of rasters over the same zones.
+
+    Zones are prepared once and rasters are downloaded concurrently, then
+    computed in the stats pool like /stats. Returns one
+    ``{"date", "geotiff_url", "stats"}`` entry per raster in request order, with
+    the ``date`` query parameter of each URL when present. With ``stream`` the
+    response is NDJSON, lines being sent as rasters are done, and a final
+    ``{"error"}`` line if a raster fails.
+    """
+    logger.debug("New batch stats request:")
+    logger.debug(stats_model)
+
+    zones, options = await asyncio.to_thread(_prepare_stats_zones, stats_model)
+    results = _batch_stats(
+        [str(url) for url in stats_model.geotiff_urls], zones, options
+    )
+    if stats_model.stream:
+        return StreamingResponse(
+            _ndjson_lines(results), media_type="application/x-ndjson"
+        )
+    return [result async for result in results]
+
+
+@app.get("/report", dependencies=[Depends(admitted("report", REPORT_COST))])
 async def get_report(
     url: str, language: str, exposureLayerId: str, country: str
 ) -> FileResponse:
+    from prism_app.report import download_report
+
     tmp_file_path: str = await download_report(url, exposureLayerId, country, language)
     return FileResponse(path=tmp_file_path, filename=os.path.basename(tmp_file_path))
 
@@ -384,6 +611,8 @@ def get_kobo_form_dates(
     if not allDates and access and isinstance(access, dict):
         province = access.get("province", None)
 
+    from prism_app.kobo import get_form_dates
+
     return get_form_dates(koboUrl, formId, datetimeField, filters, province)
 
 
@@ -399,6 +628,8 @@ def get_kobo_forms(
     endDateTime: Optional[str] = None,
 ) -> list[dict]:
     """Get all form responses."""
+    from prism_app.kobo import get_form_responses, parse_datetime_params
+
     begin_datetime, end_datetime = parse_datetime_params(beginDateTime, endDateTime)
 
     if begin_datetime > end_datetime:
@@ -465,6 +696,8 @@ def alert_by_id(
 @app.post("/alerts")
 def post_alerts(alerts_model: AlertsModel):
     """Post new alerts."""
+    import rasterio  # type: ignore
+
     try:
         data = alerts_model.model_dump(mode="json")
         for key in ("min", "max"):
@@ -480,8 +713,8 @@ def post_alerts(alerts_model: AlertsModel):
     return JSONResponse(content="Success", status_code=200)
 
 
-@timed
 @app.get("/demo", responses={400: {"description": "Invalid intersect_comparison"}})
+@timed
 def stats_demo(
     geojson_out: bool = False,
     group_by: Optional[GroupBy] = None,
@@ -530,7 +763,9 @@ def stats_demo(
     if intersect_comparison is not None:
         intersect_comparison_tuple = validate_intersect_parameter(intersect_comparison)
 
-    features = _calculate_stats(
+    from prism_app.zonal_stats import DEFAULT_STATS, calculate_cached_stats
+
+    features = calculate_cached_stats(
         zones_filepath,
         geotiff,
         stats=" ".join(DEFAULT_STATS),
@@ -546,7 +781,11 @@ def stats_demo(
     return features
 
 
-@app.post("/raster_geotiff", responses={500: {"description": "Internal server error"}})
+@app.post(
+    "/raster_geotiff",
+    responses={500: {"description": "Internal server error"}},
+    dependencies=[Depends(admitted("raster_geotiff", RASTER_GEOTIFF_COST))],
+)
 def post_raster_geotiff(raster_geotiff: RasterGeotiffModel):
     """Get the geotiff of a raster"""
     collection = raster_geotiff.collection
@@ -558,6 +797,8 @@ def post_raster_geotiff(raster_geotiff: RasterGeotiffModel):
     )
     date_value = raster_geotiff.date
     band = raster_geotiff.band
+    from prism_app.geotiff_from_stac_api import get_geotiff
+
     presigned_download_url = get_geotiff(
         collection,
         bbox,
@@ -597,6 +838,8 @@ def get_google_floods_gauges_api(
             )
 
     iso2_codes = [region_code.upper() for region_code in region_codes]
+    from prism_app.googleflood import get_google_floods_gauges
+
     return get_google_floods_gauges(iso2_codes, True, run_sequentially)
 
 
@@ -627,6 +870,8 @@ def get_google_floods_dates_api(
             )
 
     iso2_codes = [region_code.upper() for region_code in region_codes]
+    from prism_app.googleflood import get_google_flood_dates
+
     return get_google_flood_dates(iso2_codes, run_sequentially)
 
 
@@ -641,10 +886,21 @@ def get_google_floods_gauge_forecast_api(
             status_code=400,
             detail="gauge_ids must be provided and contain at least one value.",
         )
+    from prism_app.googleflood import get_google_floods_gauge_forecast
+
     return get_google_floods_gauge_forecast(gauge_id_list)
 
 
-@app.get("/google-floods/inundations")
+def _inundations_cost(request: Request) -> float:
+    return INUNDATIONS_REGION_COST * max(
+        len(request.query_params.getlist("region_codes")), 1
+    )
+
+
+@app.get(
+    "/google-floods/inundations",
+    dependencies=[Depends(admitted("google_floods_inundations", _inundations_cost))],
+)
 def get_google_floods_inundations_api(
     region_codes: list[str] = Query(...), run_sequentially: bool = Query(default=False)
 ):
@@ -670,10 +926,11 @@ def get_google_floods_inundations_api(
 
     iso2_codes = [region_code.upper() for region_code in region_codes]
 
+    from prism_app.googleflood import get_google_floods_inundations
+
     return get_google_floods_inundations(iso2_codes, run_sequentially)
 
 
-@timed
 @app.post(
     "/export-map",
     responses={
@@ -683,21 +940,34 @@ def get_google_floods_inundations_api(
         500: {"description": "Internal server error"},
     },
 )
-async def export_maps_endpoint(export_request: MapExportRequestModel) -> Response:
+@timed
+async def export_maps_endpoint(
+    export_request: MapExportRequestModel,
+    profile_token: Annotated[
+        Optional[str], Header(alias=PROFILE_HEADER, include_in_schema=False)
+    ] = None,
+) -> Response:
     """
     Export maps for multiple dates using server-side rendering.
 
     Accepts a URL with map parameters and a list of dates, renders maps using
     Playwright, and returns either a merged PDF or ZIP archive of PNGs.
     """
+    from prism_app.export_maps import export_maps
+
     try:
         dates = extract_dates_from_urls(export_request.urls)
-        file_bytes, content_type = await export_maps(
-            urls=export_request.urls,
-            viewport_width=export_request.viewportWidth,
-            viewport_height=export_request.viewportHeight,
-            format_type=export_request.format,
-        )
+        with profile(
+            "export_maps",
+            request_fingerprint(export_request),
+            enabled=should_profile(profile_token),
+        ):
+            file_bytes, content_type = await export_maps(
+                urls=export_request.urls,
+                viewport_width=export_request.viewportWidth,
+                viewport_height=export_request.viewportHeight,
+                format_type=export_request.format,
+            )
 
         # Generate filename based on format and date range
         # TODO: get dates from URLs
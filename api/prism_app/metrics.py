@@ -0,0 +1,350 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are kept in memory per API process and served by
+``/metrics`` to scrapers bearing METRICS_TOKEN, together with gauges read from
+callbacks at scrape time (pools, queues, caches). With METRICS_ENABLED=false,
+observations return right away.
+
+Work run in the stats process pool records into a capture (see ``capture``)
+that is sent back and replayed in the API process, so that its stages show up
+in the API process metrics.
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Final, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED: Final[bool] = (
+    os.getenv("METRICS_ENABLED", "true").strip().lower() == "true"
+)
+
+# Bearer token Prometheus sends to scrape /metrics, which is not served without it.
+METRICS_TOKEN: Final[Optional[str]] = os.getenv("METRICS_TOKEN") or None
+
+CONTENT_TYPE: Final[str] = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from fast function calls to long stats jobs.
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+Labels = tuple[tuple[str, str], ...]
+# (metric name, labels, value) recorded while a capture is active.
+Observation = tuple[str, Labels, float]
+
+_captured: ContextVar[Optional[list[Observation]]] = ContextVar(
+    "metrics_captured", default=None
+)
+
+
+def _key(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def record(self, labels: Labels, value: float) -> None:
+        raise NotImplementedError
+
+    def _observe(self, value: float, labels: dict[str, Any]) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _key(labels)
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((self.name, key, value))
+        else:
+            self.record(key, value)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        self._observe(amount, labels)
+
+    def record(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: non-cumulative bucket counts (last one is +Inf), sum.
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        self._observe(value, labels)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def record(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(
+                labels, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            counts, _ = self._values.get(_key(labels), ([0], [0.0]))
+            return sum(counts)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = {
+                labels: (list(counts), total[0])
+                for labels, (counts, total) in self._values.items()
+            }
+        lines = []
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class _Callback(_Metric):
+    """Metric read from a callback at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type_name: str,
+        callback: Callable[[], Iterable[tuple[dict[str, Any], float]]],
+    ):
+        super().__init__(name, documentation)
+        self.type_name = type_name
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        try:
+            values = list(self.callback())
+        except Exception as error:
+            logger.warning("Could not read metric %s: %s", self.name, error)
+            return []
+        return [
+            f"{self.name}{_format_labels(_key(labels))} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+_registry: dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, documentation: str) -> Counter:
+    """Counter registered under name (ending with _total), created on first use."""
+    return _register(Counter(name, documentation))
+
+
+def histogram(
+    name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Histogram registered under name, created on first use."""
+    return _register(Histogram(name, documentation, buckets))
+
+
+def register_callback(
+    name: str,
+    documentation: str,
+    callback: Callable[[], Iterable[tuple[dict[str, Any], float]]],
+    type_name: str = "gauge",
+) -> None:
+    """Serve (labels, value) pairs returned by callback at every scrape.
+
+    Counters read this way are named with their ``_total`` suffix.
+    """
+    with _registry_lock:
+        _registry[name] = _Callback(name, documentation, type_name, callback)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        samples = metric.samples()
+        if samples:
+            lines += metric.header() + samples
+    return "\n".join(lines) + "\n"
+
+
+FUNCTION_SECONDS = histogram(
+    "prism_function_duration_seconds", "Duration of @timed functions."
+)
+STAGE_SECONDS = histogram(
+    "prism_stage_duration_seconds", "Duration of the stages of stats requests."
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "prism_http_request_duration_seconds", "Duration of HTTP requests by route."
+)
+CACHE_REQUESTS = counter(
+    "prism_cache_requests_total", "cache_file lookups by cache prefix and result."
+)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage of a stats request.
+
+    The duration goes to the stage histogram and, in milliseconds, to the
+    log line of the innermost running @timed call.
+    """
+    # Imported here: timer imports this module.
+    from prism_app.timer import record
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record(f"{stage}_ms", round(elapsed * 1000))
+
+
+@contextmanager
+def capture() -> Iterator[list[Observation]]:
+    """Collect the observations made in the block instead of recording them."""
+    observations: list[Observation] = []
+    token = _captured.set(observations)
+    try:
+        yield observations
+    finally:
+        _captured.reset(token)
+
+
+def replay(observations: Iterable[Observation]) -> None:
+    """Record observations captured in another process (or thread)."""
+    for name, labels, value in observations:
+        metric = _registry.get(name)
+        if isinstance(metric, (Counter, Histogram)):
+            metric.record(labels, value)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route is set on the scope by the router; unmatched paths are
+            # grouped to keep label values bounded.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route,
+                status=status["code"],
+            )
@@ -27,6 +27,9 @@ GeoJSONFeature = TypedDict(
 GeoJSON = TypedDict("GeoJSON", {"features": list[GeoJSONFeature]})
 # GeoJSON = geojson.FeatureCollection
 
+# Upper bound on the number of rasters in one /stats/batch request.
+BATCH_STATS_MAX_RASTERS = int(getenv("BATCH_STATS_MAX_RASTERS", 120))
+
 WfsResponse = TypedDict("WfsResponse", {"filter_property_key": str, "path": FilePath})
 
 
@@ -63,11 +66,10 @@ class FilterProperty(BaseModel):
     value: str = Field(..., examples=["Barranquilla"])
 
 
-class StatsModel(BaseModel):
-    """Schema for stats data to be passed to /stats endpoint."""
+class StatsZonesModel(BaseModel):
+    """Zones and options shared by the /stats and /stats/batch endpoints."""
 
     admin_level: Optional[int] = None
-    geotiff_url: HttpUrl = Field(..., examples=[stats_data["geotiff_url"]])
     zones_url: Optional[str] = Field(None, examples=[stats_data["zones_url"]])
     group_by: Optional[str] = Field(None, examples=[stats_data["group_by"]])
     wfs_params: Optional[WfsParamsModel] = None
@@ -87,6 +89,27 @@ class StatsModel(BaseModel):
         return self
 
 
+class StatsModel(StatsZonesModel):
+    """Schema for stats data to be passed to /stats endpoint."""
+
+    geotiff_url: HttpUrl = Field(..., examples=[stats_data["geotiff_url"]])
+    # Decimal places kept in geojson_out coordinates, all of them if unset.
+    coordinate_precision: Optional[int] = Field(None, ge=0, le=15)
+
+
+class BatchStatsModel(StatsZonesModel):
+    """Schema for a series of rasters passed to the /stats/batch endpoint."""
+
+    geotiff_urls: list[HttpUrl] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_STATS_MAX_RASTERS,
+        examples=[[stats_data["geotiff_url"]]],
+    )
+    # Stream one NDJSON line per raster as soon as it is done.
+    stream: Optional[bool] = False
+
+
 class RasterGeotiffModel(BaseModel):
     """Schema for raster_geotiff data to be passed to /raster_geotiff endpoint."""
 
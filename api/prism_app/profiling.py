@@ -0,0 +1,167 @@
+"""Opt-in cProfile profiles of single stats and map export calls.
+
+A call is profiled when the request carries the X-Prism-Profile header set to
+PROFILE_TOKEN, or at random for a PROFILE_SAMPLE_RATE share of requests. The
+profile is written to CACHE_DIRECTORY/profiles as a ``.prof`` file (readable
+with pstats or snakeviz) and a JSON summary named after the request
+fingerprint, and the slowest ones are listed in the admin (see ProfilesView).
+Only the newest PROFILE_MAX_FILES profiles are kept.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from functools import partial, update_wrapper
+from typing import Any, Callable, Final, Iterator, Optional
+
+import prism_app.caching as caching
+from prism_app.result_cache import result_key
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER: Final[str] = "X-Prism-Profile"
+# Secret value of PROFILE_HEADER that profiles a request; unset disables it.
+PROFILE_TOKEN: Final[Optional[str]] = os.getenv("PROFILE_TOKEN") or None
+# Share of requests profiled at random, from 0 to 1.
+PROFILE_SAMPLE_RATE: Final[float] = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_MAX_FILES: Final[int] = int(os.getenv("PROFILE_MAX_FILES", 200))
+# Functions in the summary shown in the admin, by cumulative time.
+PROFILE_SUMMARY_LINES: Final[int] = 30
+
+_PROFILE_NAME = re.compile(r"^\d+-[\w.]+-[0-9a-f]+$")
+
+
+def profiles_directory() -> str:
+    return os.path.join(caching.CACHE_DIRECTORY, "profiles")
+
+
+def request_fingerprint(request: Any) -> str:
+    """Short hash identifying the parameters of a request model."""
+    return result_key(request.model_dump(mode="json"))[:16]
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """Whether to profile a request with the given PROFILE_HEADER value."""
+    if PROFILE_TOKEN is not None and header_value == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _summary(profiler: cProfile.Profile) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_SUMMARY_LINES)
+    return stream.getvalue()
+
+
+def _prune(directory: str) -> None:
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES."""
+    names = sorted(
+        entry[: -len(".json")]
+        for entry in os.listdir(directory)
+        if entry.endswith(".json")
+    )
+    for name in names[: max(len(names) - PROFILE_MAX_FILES, 0)]:
+        for extension in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(directory, name + extension))
+            except FileNotFoundError:
+                pass
+
+
+def _write_profile(
+    profiler: cProfile.Profile, name: str, fingerprint: str, duration: float
+) -> None:
+    directory = profiles_directory()
+    os.makedirs(directory, exist_ok=True)
+    created_at = time.time()
+    basename = f"{int(created_at * 1000)}-{name}-{fingerprint}"
+    path = os.path.join(directory, basename)
+
+    profiler.dump_stats(f"{path}.prof.tmp")
+    os.replace(f"{path}.prof.tmp", f"{path}.prof")
+    metadata = {
+        "name": basename,
+        "function": name,
+        "fingerprint": fingerprint,
+        "created_at": created_at,
+        "duration_ms": round(duration * 1000),
+        "summary": _summary(profiler),
+    }
+    # The summary is written last: profiles are listed from it.
+    with open(f"{path}.json.tmp", "w") as f:
+        json.dump(metadata, f)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+    _prune(directory)
+    logger.info("Profiled %s in %d ms: %s.prof", name, duration * 1000, path)
+
+
+@contextmanager
+def profile(name: str, fingerprint: str, enabled: bool = True) -> Iterator[None]:
+    """Profile the block with cProfile and write it to the profiles directory.
+
+    Only the current thread is profiled; around awaits, other tasks of the
+    event loop show up too. Failing to write the profile does not fail the
+    profiled call.
+    """
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - start
+        try:
+            _write_profile(profiler, name, fingerprint, duration)
+        except (OSError, ValueError) as error:
+            logger.warning("Could not write the %s profile: %s", name, error)
+
+
+def _run_profiled(
+    name: str, fingerprint: str, fn: Callable[..., Any], *args: Any, **kwargs: Any
+) -> Any:
+    with profile(name, fingerprint):
+        return fn(*args, **kwargs)
+
+
+def profiled(name: str, fingerprint: str, fn: Callable[..., Any]) -> Callable:
+    """fn, profiled on each call; picklable to run in the stats process pool."""
+    return update_wrapper(partial(_run_profiled, name, fingerprint, fn), fn)
+
+
+def list_profiles(limit: int = 50) -> list[dict[str, Any]]:
+    """Summaries of the kept profiles, slowest first."""
+    directory = profiles_directory()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.listdir(directory):
+        if not entry.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda metadata: metadata.get("duration_ms", 0), reverse=True)
+    return profiles[:limit]
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of the ``.prof`` file of a listed profile, None if there is none."""
+    if not _PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(profiles_directory(), f"{name}.prof")
+    return path if os.path.isfile(path) else None
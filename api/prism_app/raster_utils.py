@@ -1,49 +1,318 @@
 """Raster utilility functions for reprojection and calculation."""
 
+import ast
 import logging
+import operator as op
 import os
-import subprocess
+import re
+from contextlib import nullcontext
+from typing import Callable, Final, Optional
 
+import numpy as np
 import rasterio
 import rioxarray
 from prism_app.timer import timed
+from prism_app.validation import VALID_OPERATORS
+from rasterio.coords import BoundingBox
+from rasterio.enums import MaskFlags
+from rasterio.transform import Affine
+from rasterio.vrt import WarpedVRT
 from rasterio.warp import CRS, Resampling, calculate_default_transform, reproject
+from rasterio.windows import Window
 
 from .models import FilePath
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CALC_EXPR: Final[str] = "A*(B==1)"
 
-@timed
-def gdal_calc(
-    input_file_path,
-    mask_file_path,
-    output_file_path,
-    calc_expr=None,
-    nodata="0",
-):
-    """Utility function to run gdal_calc between two rasters."""
-    gdal_calc_path = os.path.join("/usr/bin/", "gdal_calc.py")
-
-    # Add a proper default for the calculation expression
-    calc_expr = calc_expr or "A*(B==1)"
-
-    # Generate string of process.
-    gdal_calc_str = '{0} -A {1} -B {2} --outfile={3} --calc="{4}" --NoDataValue={5} --extent=intersect --overwrite > /dev/null'
-    gdal_calc_process = gdal_calc_str.format(
-        gdal_calc_path,
-        input_file_path,
-        mask_file_path,
-        output_file_path,
-        calc_expr,
-        nodata,
+# Output types in GDALDataType order; gdal_calc writes the largest input type.
+_GDAL_TYPE_ORDER: Final[tuple[str, ...]] = (
+    "uint8",
+    "uint16",
+    "int16",
+    "uint32",
+    "int32",
+    "float32",
+    "float64",
+)
+
+# Fraction of a pixel within which two grids are considered aligned.
+_GRID_TOLERANCE: Final[float] = 1e-3
+
+_CALC_OPERATORS = {
+    ast.Add: op.add,
+    ast.Sub: op.sub,
+    ast.Mult: op.mul,
+    ast.Div: op.truediv,
+    ast.BitAnd: op.and_,
+    ast.BitOr: op.or_,
+}
+# Python comparison nodes, keyed to their VALID_OPERATORS symbol.
+_CALC_COMPARATORS = {
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+}
+
+CalcFunction = Callable[..., np.ndarray]
+
+
+class InvalidCalcExprError(ValueError):
+    """Raised when a mask calc expression uses anything but the allowed syntax."""
+
+
+def parse_calc_expr(calc_expr: str) -> CalcFunction:
+    """Compile a gdal_calc style expression over the rasters ``A`` and ``B``.
+
+    Only the names ``A`` and ``B``, numbers, ``+ - * /``, ``& |``, parentheses
+    and the comparison operators of ``VALID_OPERATORS`` are allowed, so the
+    expression can be evaluated in-process without ``eval``.
+    """
+    # gdal_calc expressions are Python; accept a lone "=" as equality as well.
+    normalized_expr = re.sub(r"(?<![<>=!])=(?!=)", "==", calc_expr)
+    try:
+        tree = ast.parse(normalized_expr, mode="eval")
+    except SyntaxError as error:
+        raise InvalidCalcExprError(f"Invalid calc expression {calc_expr}.") from error
+
+    def compile_node(node: ast.AST) -> CalcFunction:
+        if isinstance(node, ast.Name) and node.id in ("A", "B"):
+            index = 0 if node.id == "A" else 1
+            return lambda *rasters: rasters[index]
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = node.value
+            return lambda *rasters: value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = compile_node(node.operand)
+            return lambda *rasters: -operand(*rasters)
+        if isinstance(node, ast.BinOp) and type(node.op) in _CALC_OPERATORS:
+            operator = _CALC_OPERATORS[type(node.op)]
+            left, right = compile_node(node.left), compile_node(node.right)
+            return lambda *rasters: operator(left(*rasters), right(*rasters))
+        if isinstance(node, ast.Compare) and all(
+            type(o) in _CALC_COMPARATORS for o in node.ops
+        ):
+            operands = [compile_node(n) for n in [node.left, *node.comparators]]
+            comparators = [
+                VALID_OPERATORS[_CALC_COMPARATORS[type(o)]] for o in node.ops
+            ]
+
+            def compare(*rasters):
+                values = [operand(*rasters) for operand in operands]
+                result = comparators[0](values[0], values[1])
+                for i, comparator in enumerate(comparators[1:], start=1):
+                    result = result & comparator(values[i], values[i + 1])
+                return result
+
+            return compare
+        raise InvalidCalcExprError(
+            f"Unsupported element {ast.dump(node)} in calc expression {calc_expr}."
+        )
+
+    return compile_node(tree.body)
+
+
+def _largest_gdal_type(*dtypes: str) -> str:
+    """Pick the output type the way gdal_calc does: the largest input type."""
+    return max(
+        dtypes,
+        key=lambda t: _GDAL_TYPE_ORDER.index(t) if t in _GDAL_TYPE_ORDER else -1,
     )
 
-    logger.debug("Calling gdal_calc.py...")
-    logger.debug(gdal_calc_process)
 
-    # TODO - secure call input or remove shell=True
-    subprocess.check_call(str(gdal_calc_process), shell=True)
+def _pixel_offset(offset: float, resolution: float) -> int:
+    pixels = offset / resolution
+    if abs(pixels - round(pixels)) > _GRID_TOLERANCE:
+        raise ValueError("Rasters are not aligned on the same pixel grid.")
+    return int(round(pixels))
+
+
+class MaskedRaster:
+    """``calc_expr`` evaluated lazily over an input raster and a mask raster.
+
+    Replaces ``gdal_calc.py --extent=intersect``: the result covers the
+    intersection of both rasters, pixels that are nodata in either input are
+    set to ``nodata``, and windows are computed on demand. It exposes the part
+    of the rasterio dataset API used for zonal stats (``read``, ``transform``,
+    ``nodata``, ``block_shapes``...), so no intermediate GeoTIFF is needed.
+
+    When the rasters do not share a CRS and pixel grid, the input is warped
+    onto the mask grid on the fly through a ``WarpedVRT`` with ``resampling``
+    (``Resampling.sum`` preserves population totals), so each block is
+    reprojected and masked in one pass instead of writing a reprojected copy.
+    With ``resampling=None`` mismatched grids raise ``ValueError`` instead.
+    """
+
+    count = 1
+    mask_flag_enums = ([MaskFlags.nodata],)
+
+    def __init__(
+        self,
+        input_file_path: FilePath,
+        mask_file_path: FilePath,
+        calc_expr: Optional[str] = None,
+        nodata: float = 0,
+        resampling: Optional[Resampling] = Resampling.sum,
+    ):
+        self.calc_expr = calc_expr or DEFAULT_CALC_EXPR
+        self._calc = parse_calc_expr(self.calc_expr)
+        self.nodata = nodata
+        self._warped_from = None
+        self._input = rasterio.open(input_file_path)
+        try:
+            self._mask = rasterio.open(mask_file_path)
+        except Exception:
+            self._input.close()
+            raise
+        try:
+            try:
+                self._align()
+            except ValueError as error:
+                if resampling is None:
+                    raise
+                logger.debug(
+                    "%s Warping %s onto the mask grid.", error, input_file_path
+                )
+                self._warp_input(resampling)
+                self._align()
+        except Exception:
+            self.close()
+            raise
+
+    def _warp_input(self, resampling: Resampling) -> None:
+        """Replace the input by a virtual warp of it onto the mask grid.
+
+        Like ``reproj_match``, pixels without source data are set to 0, which
+        the mask then treats as nodata.
+        """
+        self._warped_from = self._input
+        self._input = WarpedVRT(
+            self._warped_from,
+            crs=self._mask.crs,
+            transform=self._mask.transform,
+            width=self._mask.width,
+            height=self._mask.height,
+            resampling=resampling,
+            nodata=0,
+        )
+
+    def _align(self) -> None:
+        src, mask = self._input, self._mask
+        if src.crs != mask.crs:
+            raise ValueError("Rasters do not share the same CRS.")
+        if not np.allclose(src.res, mask.res, rtol=_GRID_TOLERANCE, atol=0):
+            raise ValueError("Rasters do not share the same resolution.")
+
+        left = max(src.bounds.left, mask.bounds.left)
+        top = min(src.bounds.top, mask.bounds.top)
+        right = min(src.bounds.right, mask.bounds.right)
+        bottom = max(src.bounds.bottom, mask.bounds.bottom)
+        xres, yres = src.res
+        self.width = _pixel_offset(right - left, xres)
+        self.height = _pixel_offset(top - bottom, yres)
+        if self.width <= 0 or self.height <= 0:
+            raise ValueError("Rasters do not intersect.")
+
+        self._offsets = [
+            (
+                _pixel_offset(left - dataset.bounds.left, xres),
+                _pixel_offset(dataset.bounds.top - top, yres),
+            )
+            for dataset in (src, mask)
+        ]
+        col_off, row_off = self._offsets[0]
+        self.transform = src.transform @ Affine.translation(col_off, row_off)
+        self.crs = src.crs
+        self.dtypes = (_largest_gdal_type(src.dtypes[0], mask.dtypes[0]),)
+        self.block_shapes = src.block_shapes
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.height, self.width)
+
+    @property
+    def bounds(self) -> BoundingBox:
+        left, top = self.transform @ (0, 0)
+        right, bottom = self.transform @ (self.width, self.height)
+        return BoundingBox(left, bottom, right, top)
+
+    def read(self, indexes: int = 1, window: Optional[Window] = None) -> np.ndarray:
+        """Compute band 1 for a window of the intersection grid."""
+        if indexes != 1:
+            raise ValueError("Masked rasters have a single band.")
+        window = window or Window(0, 0, self.width, self.height)
+
+        rasters = []
+        is_nodata = np.zeros((int(window.height), int(window.width)), dtype=bool)
+        for dataset, (col_off, row_off) in zip(
+            (self._input, self._mask), self._offsets
+        ):
+            values = dataset.read(
+                1,
+                window=Window(
+                    window.col_off + col_off,
+                    window.row_off + row_off,
+                    window.width,
+                    window.height,
+                ),
+            )
+            if dataset.nodata is not None:
+                is_nodata |= values == dataset.nodata
+            rasters.append(values)
+
+        with np.errstate(all="ignore"):
+            result = np.broadcast_to(self._calc(*rasters), is_nodata.shape)
+        result = result.astype(self.dtypes[0])
+        result[is_nodata] = self.nodata
+        return result
+
+    def close(self) -> None:
+        self._input.close()
+        if self._warped_from is not None:
+            self._warped_from.close()
+        if hasattr(self, "_mask"):
+            self._mask.close()
+
+    def __enter__(self) -> "MaskedRaster":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def open_raster(raster: "FilePath | MaskedRaster"):
+    """Open a raster path, or pass an already open raster through."""
+    if isinstance(raster, MaskedRaster):
+        return nullcontext(raster)
+    return rasterio.open(raster)
+
+
+@timed
+def write_raster(raster: MaskedRaster, output_file_path: FilePath) -> None:
+    """Write a masked raster to a tiled GeoTIFF block by block, atomically."""
+    profile = {
+        "driver": "GTiff",
+        "dtype": raster.dtypes[0],
+        "count": 1,
+        "width": raster.width,
+        "height": raster.height,
+        "crs": raster.crs,
+        "transform": raster.transform,
+        "nodata": raster.nodata,
+        "tiled": True,
+        "blockxsize": 256,
+        "blockysize": 256,
+        "compress": "deflate",
+    }
+    tmp_file_path = f"{output_file_path}.{os.getpid()}.tmp"
+    with rasterio.open(tmp_file_path, "w", **profile) as dst:
+        for _, window in dst.block_windows(1):
+            dst.write(raster.read(1, window=window), 1, window=window)
+    os.replace(tmp_file_path, output_file_path)
 
 
 @timed
@@ -104,7 +373,7 @@ def reproj_match(
 
 
 def calculate_pixel_area(geotiff_file):
-    with rasterio.open(geotiff_file) as dataset:
+    with open_raster(geotiff_file) as dataset:
         crs = dataset.crs
         # Get pixel width and height in the CRS units
         _, pixel_width, pixel_height = calculate_default_transform(
@@ -0,0 +1,218 @@
+"""On-disk cache of computed results shared by all API worker processes.
+
+Results are stored as compressed JSON in a SQLite database in CACHE_DIRECTORY,
+bounded in bytes with least recently used eviction and expired after a TTL.
+Hit, miss and eviction counters live in the same database so that they cover
+every worker. Cache failures are logged and never fail the request.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Final, Iterator, Optional
+
+import prism_app.caching as caching
+import prism_app.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_FILENAME: Final[str] = "results_cache.sqlite"
+RESULT_CACHE_MAX_BYTES: Final[int] = int(
+    os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024**2)
+)
+RESULT_CACHE_TTL_SECONDS: Final[int] = int(
+    os.getenv("RESULT_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+)
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)",
+    """CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""",
+)
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize numpy scalars returned by rasterstats."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def result_key(*parts: Any) -> str:
+    """Canonical hash of the parts of a request.
+
+    Tuples and lists hash the same, dicts are key sorted and callables (e.g.
+    comparison operators) are identified by name.
+    """
+
+    def canonical(value: Any) -> Any:
+        if callable(value):
+            return f"{value.__module__}.{value.__qualname__}"
+        return _json_default(value)
+
+    serialized = json.dumps(parts, sort_keys=True, default=canonical)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def file_fingerprint(filepath: Optional[str]) -> Optional[str]:
+    """Identify a local file by path, mtime and size; other values pass through."""
+    if filepath is None or not os.path.isfile(filepath):
+        return filepath
+    stat = os.stat(filepath)
+    return f"{filepath}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class ResultCache:
+    """Bounded, TTL-expired key/value store for JSON results."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl_seconds: int = RESULT_CACHE_TTL_SECONDS,
+    ):
+        # Resolved lazily so that CACHE_DIRECTORY can be configured at startup.
+        self._path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def path(self) -> str:
+        return self._path or os.path.join(
+            caching.CACHE_DIRECTORY, RESULT_CACHE_FILENAME
+        )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit mode; closing rolls back any unfinished transaction.
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _increment(connection: sqlite3.Connection, name: str, amount: int = 1):
+        connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT value, created_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] < now - self.ttl_seconds:
+                    connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._increment(connection, "expired")
+                    row = None
+                if row is None:
+                    self._increment(connection, "misses")
+                    return None
+                connection.execute(
+                    "UPDATE results SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._increment(connection, "hits")
+        except sqlite3.Error as error:
+            logger.warning("Result cache read failed: %s", error)
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON serializable value, evicting LRU entries over budget."""
+        blob = zlib.compress(json.dumps(value, default=_json_default).encode())
+        if len(blob) > self.max_bytes:
+            logger.debug("Result of %d bytes is too large to cache.", len(blob))
+            return
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now),
+                )
+                self._evict(connection)
+                connection.execute("COMMIT")
+        except sqlite3.Error as error:
+            logger.warning("Result cache write failed: %s", error)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute(
+            "SELECT key, size FROM results ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._increment(connection, "evictions", evicted)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        """Entries, bytes and hit/miss/eviction counters across all workers."""
+        try:
+            with self._connect() as connection:
+                entries, size = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+                counters = dict(
+                    connection.execute("SELECT name, value FROM counters").fetchall()
+                )
+        except sqlite3.Error as error:
+            logger.warning("Result cache stats failed: %s", error)
+            return {}
+        return {
+            "entries": entries,
+            "bytes": size,
+            **{
+                name: counters.get(name, 0)
+                for name in ("hits", "misses", "expired", "evictions")
+            },
+        }
+
+
+stats_result_cache = ResultCache()
+
+metrics.register_callback(
+    "prism_result_cache",
+    "Entries, bytes and lookup counters of the stats result cache, all workers.",
+    lambda: [
+        ({"field": name}, value) for name, value in stats_result_cache.stats().items()
+    ],
+)
@@ -0,0 +1,120 @@
+"""Precomputed simplification levels of GeoParquet zones.
+
+Instead of simplifying boundaries on every request, requested tolerances are
+snapped down to a small ladder of levels (ZONES_SIMPLIFY_LEVELS), so zones are
+never simplified more than requested and nearby tolerances share cached
+results. Each level is simplified once per zones source and partition filters
+(iso3, admin level), so that a global boundaries dataset is never simplified
+as a whole for one country, and stored as local GeoParquet in CACHE_DIRECTORY.
+"""
+
+import logging
+import os
+from typing import Final, Optional, Sequence
+
+from prism_app.caching import _download_lock, _get_cached_filepath, is_file_valid
+from prism_app.duckdb_utils import duckdb_pool
+from prism_app.models import FilePath
+from prism_app.timer import timed
+
+logger = logging.getLogger(__name__)
+
+# Tolerances (in zones CRS units, degrees for EPSG:4326) that requests snap to.
+# Keep the simplify_tolerance values of the frontend layers config among them.
+ZONES_SIMPLIFY_LEVELS: Final[tuple[float, ...]] = tuple(
+    sorted(
+        float(level)
+        for level in os.getenv(
+            "ZONES_SIMPLIFY_LEVELS", "0.0005,0.001,0.005,0.01,0.05,0.1"
+        ).split(",")
+        if level.strip()
+    )
+)
+SIMPLIFIED_ZONES_PREFIX: Final[str] = "zones_simplified"
+
+
+def snap_tolerance(tolerance: Optional[float]) -> Optional[float]:
+    """Largest stored level not above tolerance, or None for full resolution."""
+    if tolerance is None:
+        return None
+    levels = [level for level in ZONES_SIMPLIFY_LEVELS if level <= tolerance]
+    return levels[-1] if levels else None
+
+
+def simplified_zones_path(
+    zones_filepath: FilePath, level: float, conditions: Sequence[str] = ()
+) -> FilePath:
+    return _get_cached_filepath(
+        prefix=SIMPLIFIED_ZONES_PREFIX,
+        cache_lookup=" AND ".join([f"{zones_filepath}@{level}", *conditions]),
+        hash_lookup=True,
+        extension="parquet",
+    )
+
+
+def get_simplified_zones(
+    zones_filepath: FilePath,
+    level: float,
+    conditions: Sequence[str] = (),
+    has_bbox_column: bool = False,
+) -> FilePath:
+    """Path of the zones matching conditions, simplified at a stored level."""
+    path = simplified_zones_path(zones_filepath, level, conditions)
+    if not is_file_valid(path):
+        build_simplified_zones(
+            zones_filepath, level, conditions, has_bbox_column=has_bbox_column
+        )
+    return path
+
+
+@timed
+def build_simplified_zones(
+    zones_filepath: FilePath,
+    level: float,
+    conditions: Sequence[str] = (),
+    has_bbox_column: bool = False,
+) -> FilePath:
+    """Write the zones matching the SQL conditions, simplified at level.
+
+    Geometries are simplified with ST_SimplifyPreserveTopology, so zones stay
+    valid polygons. Row order and all other columns are kept, except for the
+    bbox covering column, computed again from the simplified geometries.
+    Concurrent builds of the same zones, in any process, wait for the first.
+    """
+    path = simplified_zones_path(zones_filepath, level, conditions)
+    with _download_lock(path):
+        if is_file_valid(path):
+            return path
+
+        logger.info(
+            "Simplifying %s where %s at tolerance %s.",
+            zones_filepath,
+            " AND ".join(conditions) or "true",
+            level,
+        )
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT * REPLACE (
+                ST_SimplifyPreserveTopology(geometry, {level}) AS geometry
+            )
+            FROM read_parquet('{zones_filepath}', hive_partitioning=true){where}
+        """
+        if has_bbox_column:
+            query = f"""
+                SELECT * REPLACE (
+                    struct_pack(
+                        xmin := ST_XMin(geometry),
+                        ymin := ST_YMin(geometry),
+                        xmax := ST_XMax(geometry),
+                        ymax := ST_YMax(geometry)
+                    ) AS bbox
+                )
+                FROM ({query})
+            """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with duckdb_pool.cursor() as cursor:
+            cursor.execute(
+                f"COPY ({query}) TO '{tmp_path}' (FORMAT PARQUET, COMPRESSION zstd)"
+            )
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,51 @@
+"""Background preloading of the modules main imports lazily.
+
+main imports the subsystems with heavy dependencies (rasterio/shapely stats,
+geopandas, odc-stac, playwright) in the routes that use them, so that the API
+answers its healthcheck quickly after a deploy or a worker recycle. Once it is
+up, preload_modules imports them in a background thread, so that the first
+requests of each route do not pay for them either.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Final
+
+logger = logging.getLogger(__name__)
+
+# Imported in the background once the API has started.
+LAZY_MODULES: Final[tuple[str, ...]] = (
+    "prism_app.zonal_stats",
+    "prism_app.kobo",
+    "prism_app.googleflood",
+    "prism_app.geotiff_from_stac_api",
+    "prism_app.report",
+    "prism_app.export_maps",
+)
+PRELOAD_MODULES: Final[bool] = (
+    os.getenv("PRELOAD_MODULES", "true").strip().lower() == "true"
+)
+
+
+def _preload() -> None:
+    for name in LAZY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as error:
+            # The routes using the module will fail with the same error.
+            logger.warning("Could not preload %s: %r", name, error)
+            continue
+        logger.debug(
+            "Preloaded %s in %d ms.", name, (time.perf_counter() - start) * 1000
+        )
+
+
+def preload_modules() -> None:
+    """Import LAZY_MODULES in a background thread, unless disabled."""
+    if not PRELOAD_MODULES:
+        return
+    threading.Thread(target=_preload, name="preload-modules", daemon=True).start()
@@ -0,0 +1,178 @@
+"""Bounded process pool running CPU-bound stats off the event loop.
+
+Async routes await ``stats_pool.run(...)``. Jobs run in STATS_WORKERS spawned
+processes, so numpy/GEOS work neither blocks the event loop nor contends for
+the GIL of the API process. At most STATS_QUEUE_LIMIT jobs wait for a free
+worker: further requests fail fast with a 503 rather than piling up, and jobs
+running longer than STATS_TIMEOUT_SECONDS answer with a 504.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Final, Optional
+
+import prism_app.metrics as metrics
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Worker processes computing stats; 0 runs jobs one at a time in a thread.
+STATS_WORKERS: Final[int] = int(os.getenv("STATS_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs allowed to wait for a busy worker before requests are turned away.
+STATS_QUEUE_LIMIT: Final[int] = int(os.getenv("STATS_QUEUE_LIMIT", 16))
+STATS_TIMEOUT_SECONDS: Final[float] = float(os.getenv("STATS_TIMEOUT_SECONDS", 300))
+# Sent with 503 responses when the pool is saturated.
+STATS_RETRY_AFTER_SECONDS: Final[int] = 5
+
+STATS_QUEUE_SECONDS = metrics.histogram(
+    "prism_stats_queue_wait_seconds", "Wait of stats jobs for a pool worker."
+)
+
+
+class _WorkerHTTPError(Exception):
+    """Picklable stand-in for an HTTPException raised by a job."""
+
+
+def _run_job(
+    fn: Callable[..., Any], args: tuple, kwargs: dict, submitted_at: float
+) -> tuple[float, float, list[metrics.Observation], Any]:
+    """Run fn in a worker.
+
+    Returns its queue wait, compute time, the metrics it observed (to replay
+    in the API process) and its result.
+    """
+    started_at = time.time()
+    try:
+        with metrics.capture() as observations:
+            result = fn(*args, **kwargs)
+    except HTTPException as error:
+        raise _WorkerHTTPError(error.status_code, error.detail) from None
+    return started_at - submitted_at, time.time() - started_at, observations, result
+
+
+class StatsPool:
+    """Process pool with a bounded queue, timeouts and timing logs."""
+
+    def __init__(
+        self,
+        workers: int = STATS_WORKERS,
+        queue_limit: int = STATS_QUEUE_LIMIT,
+        timeout: float = STATS_TIMEOUT_SECONDS,
+    ):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        """Jobs admitted at once, running or queued."""
+        return max(self.workers, 1) + self.queue_limit
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # Spawned rather than forked: API processes run threads.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+            return self._executor
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._pending >= self.capacity:
+                logger.warning("Stats pool saturated: %d jobs pending.", self._pending)
+                raise HTTPException(
+                    status_code=503,
+                    detail="The server is busy computing statistics, retry later.",
+                    headers={"Retry-After": str(STATS_RETRY_AFTER_SECONDS)},
+                )
+            self._pending += 1
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) in the pool and return its result.
+
+        fn and its arguments must be picklable. A job that times out keeps
+        its worker, and its queue slot, until it finishes.
+
+        Raises
+        ------
+        HTTPException
+            503 when the queue is full, 504 on timeout, or as raised by fn.
+        """
+        self._reserve()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_run_job, fn, args, kwargs, time.time())
+        except BaseException:
+            self._release()
+            raise
+        # Free the slot when the job is done, even after a timeout.
+        future.add_done_callback(self._release)
+
+        try:
+            queue_wait, compute, observations, result = await asyncio.wait_for(
+                asyncio.wrap_future(future), self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error("%s timed out after %d s.", fn.__name__, self.timeout)
+            raise HTTPException(
+                status_code=504, detail="Statistics took too long to compute."
+            ) from None
+        except _WorkerHTTPError as error:
+            status_code, detail = error.args
+            raise HTTPException(status_code=status_code, detail=detail) from None
+        except BrokenProcessPool as error:
+            # A worker died (e.g. out of memory): start a new pool next time.
+            logger.error("Stats worker died: %s", error)
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise HTTPException(
+                status_code=500, detail="An error occured calculating statistics."
+            ) from error
+
+        metrics.replay(observations)
+        STATS_QUEUE_SECONDS.observe(queue_wait)
+        logger.info(
+            "%s queue wait %d ms, compute %d ms.",
+            fn.__name__,
+            queue_wait * 1000,
+            compute * 1000,
+        )
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+stats_pool = StatsPool()
+
+metrics.register_callback(
+    "prism_stats_pool_pending_jobs",
+    "Stats jobs running or waiting in the pool.",
+    lambda: [({}, stats_pool.pending)],
+)
@@ -10,9 +10,12 @@ if not hasattr(_aiohttp_streams, "AsyncStreamReaderMixin"):
 
 # Allow Starlette admin and tests to import the app without full OIDC configuration.
 os.environ.setdefault("PRISM_ADMIN_AUTH_DISABLED", "true")
-# main imports kobo, which validates credentials at import time.
+# Kobo routes check that credentials are configured.
 os.environ.setdefault("KOBO_USERNAME", "test")
 os.environ.setdefault("KOBO_PASSWORD", "test")
+# Compute /stats in a thread so that tests can patch the modules it uses
+# (test_stats_pool covers spawned worker processes).
+os.environ.setdefault("STATS_WORKERS", "0")
 
 import prism_app.caching as caching_module
 import prism_app.export_maps as export_maps_module
@@ -0,0 +1,148 @@
+"""Tests for the admission control of expensive endpoints."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from prism_app.admission import (
+    REMOTE_ZONES_COST,
+    AdmissionController,
+    estimate_stats_cost,
+)
+from prism_app.auth.deps import require_prism_session
+from prism_app.auth.permission_codes import ADMIN_ACCESS
+from prism_app.main import app
+
+GEOTIFF = "/prism_app/tests/raster_sample.tif"
+ZONES = "/prism_app/tests/small_admin_boundaries.json"
+
+
+async def _hold(controller, endpoint, cost, order, release):
+    async with controller.admit(endpoint, cost):
+        order.append(endpoint)
+        await release.wait()
+
+
+def test_endpoint_limit_queues_requests():
+    async def scenario():
+        controller = AdmissionController(limits={"stats": 1}, budget=100)
+        order: list[str] = []
+        release = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(_hold(controller, "stats", 1, order, release))
+            for _ in range(2)
+        ]
+        # Other endpoints are not held back by the stats limit.
+        tasks.append(
+            asyncio.ensure_future(_hold(controller, "report", 1, order, release))
+        )
+        await asyncio.sleep(0.01)
+        stats = controller.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return order, stats, controller.stats()
+
+    order, during, after = asyncio.run(scenario())
+    assert order == ["stats", "report", "stats"]
+    assert during["endpoints"]["stats"]["running"] == 1
+    assert during["endpoints"]["stats"]["queued"] == 1
+    assert after["endpoints"]["stats"]["admitted"] == 2
+    assert after["running_cost"] == 0
+
+
+def test_fair_queue_interleaves_endpoints():
+    """A burst of stats requests does not push a report request to the back."""
+
+    async def scenario():
+        controller = AdmissionController(limits={}, budget=1)
+        names = ["blocker"] + ["stats"] * 3 + ["report"]
+        releases = [asyncio.Event() for _ in names]
+        order: list[str] = []
+        tasks = []
+        for name, release in zip(names, releases):
+            tasks.append(
+                asyncio.ensure_future(_hold(controller, name, 1, order, release))
+            )
+            await asyncio.sleep(0)
+        for release in releases:
+            await asyncio.sleep(0.01)
+            release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "stats", "report", "stats", "stats"]
+
+
+def test_budget_defers_and_oversized_requests_run_alone():
+    async def scenario():
+        controller = AdmissionController(limits={}, budget=10)
+        order: list[str] = []
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_hold(controller, "a", 8, order, release))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(_hold(controller, "b", 50, order, release))
+        await asyncio.sleep(0.01)
+        during = list(order)
+        release.set()
+        await asyncio.gather(first, second)
+        return during, order
+
+    during, order = asyncio.run(scenario())
+    assert during == ["a"]
+    assert order == ["a", "b"]
+
+
+def test_full_queue_and_timeout_are_rejected():
+    async def scenario():
+        controller = AdmissionController(
+            limits={"stats": 1}, queue_limit=1, queue_timeout=0.05
+        )
+        release = asyncio.Event()
+        running = asyncio.ensure_future(_hold(controller, "stats", 1, [], release))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(_hold(controller, "stats", 1, [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as full:
+            async with controller.admit("stats"):
+                pass
+        with pytest.raises(HTTPException) as timed_out:
+            await waiting
+        release.set()
+        await running
+        return full.value, timed_out.value, controller.stats()
+
+    full, timed_out, stats = asyncio.run(scenario())
+    assert full.status_code == timed_out.status_code == 503
+    assert stats["endpoints"]["stats"]["rejected"] == 1
+    assert stats["endpoints"]["stats"]["timed_out"] == 1
+    assert stats["queued"] == 0
+
+
+def test_estimate_stats_cost():
+    cost = estimate_stats_cost(GEOTIFF, ZONES)
+    with_mask = estimate_stats_cost(GEOTIFF, ZONES, mask_geotiff=GEOTIFF)
+    assert cost >= 1
+    assert with_mask > cost
+    assert (
+        estimate_stats_cost(GEOTIFF, "s3://bucket/zones.parquet") >= REMOTE_ZONES_COST
+    )
+
+
+def test_admission_endpoint():
+    client = TestClient(app)
+    user = MagicMock()
+    try:
+        app.dependency_overrides[require_prism_session] = lambda: (user, set())
+        assert client.get("/internal/admission").status_code == 403
+
+        app.dependency_overrides[require_prism_session] = lambda: (
+            user,
+            {ADMIN_ACCESS},
+        )
+        response = client.get("/internal/admission")
+    finally:
+        app.dependency_overrides.pop(require_prism_session, None)
+    assert response.status_code == 200
+    assert {"budget", "running_cost", "queued", "endpoints"} <= response.json().keys()
@@ -256,10 +256,6 @@ def test_stats_endpoint2():
     assert response.status_code == 200
 
 
-@pytest.mark.skipif(
-    os.getenv("SKIP_GDAL_MASK_STATS_TEST") == "1",
-    reason="Full GDAL stack not available; unmasked stats + Docker api-test still cover /stats",
-)
 def test_stats_endpoint_masked():
     """
     Call /stats with known-good parameters with a geotiff mask.
@@ -294,7 +290,7 @@ def test_kobo_forms_endpoint(monkeypatch):
     assert response.status_code == 200
 
 
-@patch("prism_app.main.get_geotiff")
+@patch("prism_app.geotiff_from_stac_api.get_geotiff")
 def test_raster_geotiff_endpoint(get_geotiff_mock):
     """
     Call /raster_geotiff with known-good parameters.
@@ -0,0 +1,137 @@
+"""Tests for the CACHE_DIRECTORY size budget and eviction."""
+
+import os
+
+import prism_app.cache_manager as cache_manager
+import prism_app.caching as caching
+import pytest
+from prism_app.cache_manager import cache_category, get_cache_stats, sweep
+from prism_app.caching import get_cache_by_key, is_file_valid
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    monkeypatch.setattr(cache_manager, "_last_recorded", {})
+    return tmp_path
+
+
+def _write(directory, name: str, size: int, mtime: float = 1000) -> str:
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_cache_category():
+    assert cache_category("raster_masked_abc.tif") == "raster_masked"
+    assert cache_category("raster_https___x.tif") == "raster"
+    assert cache_category("zones_geojson_abc.json") == "zones_geojson"
+    assert cache_category("zone_labels_abc.npz") == "zone_labels"
+    assert cache_category("6162.json") == "kobo"
+    assert cache_category("temp_zones.geojson") == "other"
+
+
+def test_sweep_evicts_least_recently_used(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100, mtime=1000)
+    _write(cache_dir, "raster_b.tif", 100, mtime=2000)
+    _write(cache_dir, "zones_c.json", 100, mtime=1500)
+    # Never counted nor evicted.
+    _write(cache_dir, "raster_d.tif.part", 1000, mtime=0)
+
+    summary = sweep(max_bytes=250, quotas={}, grace_seconds=0)
+
+    assert summary == {
+        "files": 2,
+        "bytes": 200,
+        "evicted_files": 1,
+        "evicted_bytes": 100,
+    }
+    assert sorted(os.listdir(cache_dir)) == [
+        "cache_index.sqlite",
+        "cache_sweep.lock",
+        "raster_b.tif",
+        "raster_d.tif.part",
+        "zones_c.json",
+    ]
+
+
+def test_sweep_removes_stale_orphan_lock_files(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100, mtime=1000)
+    _write(cache_dir, "raster_a.tif.lock", 0, mtime=1000)
+    _write(cache_dir, "raster_gone.tif.lock", 0, mtime=1000)
+    # Taken recently, for a download in progress.
+    _write(cache_dir, "raster_new.tif.lock", 0, mtime=10**10)
+
+    sweep(max_bytes=0, quotas={}, grace_seconds=0)
+
+    assert (cache_dir / "raster_a.tif.lock").exists()
+    assert not (cache_dir / "raster_gone.tif.lock").exists()
+    assert (cache_dir / "raster_new.tif.lock").exists()
+
+
+def test_sweep_enforces_category_quotas(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100, mtime=1000)
+    _write(cache_dir, "raster_b.tif", 100, mtime=2000)
+    _write(cache_dir, "zones_c.json", 100, mtime=500)
+
+    sweep(max_bytes=0, quotas={"raster": 150}, grace_seconds=0)
+
+    assert not (cache_dir / "raster_a.tif").exists()
+    assert (cache_dir / "raster_b.tif").exists()
+    assert (cache_dir / "zones_c.json").exists()
+
+
+def test_sweep_keeps_recently_used_files(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100, mtime=1000)
+
+    sweep(max_bytes=1, quotas={}, grace_seconds=10**10)
+
+    assert (cache_dir / "raster_a.tif").exists()
+
+
+def test_access_is_recorded_for_eviction(cache_dir):
+    """Files read through the cache helpers outlive newer, unused files."""
+    _write(cache_dir, "zones_old.json", 100, mtime=1000)
+    _write(cache_dir, "zones_new.json", 100, mtime=2000)
+    (cache_dir / "stats_old.cache").write_text("{}")
+    os.utime(cache_dir / "stats_old.cache", (1000, 1000))
+
+    assert is_file_valid(str(cache_dir / "zones_old.json"))
+    assert get_cache_by_key("stats", "old") == {}
+
+    sweep(max_bytes=150, quotas={}, grace_seconds=0)
+
+    assert (cache_dir / "zones_old.json").exists()
+    assert (cache_dir / "stats_old.cache").exists()
+    assert not (cache_dir / "zones_new.json").exists()
+
+
+def test_cache_stats(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100, mtime=1000)
+    _write(cache_dir, "raster_b.tif", 50, mtime=2000)
+    _write(cache_dir, "zones_c.json", 10)
+
+    sweep(max_bytes=0, quotas={"raster": 60}, grace_seconds=0)
+    stats = get_cache_stats()
+
+    assert stats["files"] == 2
+    assert stats["bytes"] == 60
+    assert stats["sweeps"] == 1
+    assert stats["categories"]["raster"] == {
+        "files": 1,
+        "bytes": 50,
+        "evicted_files": 1,
+        "evicted_bytes": 100,
+    }
+    assert stats["categories"]["zones"]["files"] == 1
+
+
+def test_sweep_is_skipped_while_another_sweep_runs(cache_dir):
+    _write(cache_dir, "raster_a.tif", 100)
+
+    with cache_manager._sweep_lock() as acquired:
+        assert acquired
+        assert sweep(max_bytes=1, quotas={}, grace_seconds=0) is None
+
+    assert (cache_dir / "raster_a.tif").exists()
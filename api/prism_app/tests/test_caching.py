@@ -0,0 +1,183 @@
+"""Tests for cached downloads."""
+
+import fcntl
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import prism_app.caching as caching
+import pytest
+from fastapi import HTTPException
+from rasterio.errors import RasterioIOError
+
+SAMPLE_RASTER = os.path.join(os.path.dirname(__file__), "raster_sample.tif")
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    return tmp_path
+
+
+def _slow_download(url, filepath):
+    time.sleep(0.2)
+    with open(filepath, "wb") as f:
+        f.write(b'{"features": []}')
+
+
+def test_concurrent_downloads_are_coalesced(cache_directory):
+    """Concurrent callers for one URL share a single download."""
+    before = caching.get_download_stats()
+    barrier = threading.Barrier(4)
+
+    def fetch():
+        barrier.wait()
+        return caching.cache_file(
+            url="https://example.org/zones.json", prefix="zones", extension="json"
+        )
+
+    with patch("prism_app.caching.download_file", side_effect=_slow_download) as get:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            paths = list(executor.map(lambda _: fetch(), range(4)))
+
+    assert get.call_count == 1
+    assert len(set(paths)) == 1
+    with open(paths[0], "rb") as f:
+        assert f.read() == b'{"features": []}'
+    after = caching.get_download_stats()
+    assert after["fresh"] - before["fresh"] == 1
+    assert after["coalesced"] - before["coalesced"] == 3
+
+
+def test_failed_download_leaves_no_file(cache_directory):
+    with patch(
+        "prism_app.caching.download_file",
+        side_effect=caching.requests.HTTPError("404"),
+    ):
+        with pytest.raises(HTTPException):
+            caching.cache_file(
+                url="https://example.org/missing.json", prefix="zones", extension="json"
+            )
+
+    assert not list(cache_directory.glob("zones_*.json"))
+
+
+def test_waits_for_download_in_another_process(cache_directory):
+    """A lock held on the sidecar lock file (as by another worker) is waited on."""
+    url = "https://example.org/raster.json"
+    cache_filepath = caching._get_cached_filepath(
+        prefix="raster", cache_lookup=url, extension="json"
+    )
+
+    with open(f"{cache_filepath}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        with patch("prism_app.caching.download_file") as get:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(
+                    caching.cache_file, url=url, prefix="raster", extension="json"
+                )
+                time.sleep(0.1)
+                assert not future.done()
+                # The other worker finishes its download and releases the lock.
+                with open(cache_filepath, "w") as f:
+                    f.write("{}")
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                assert future.result(timeout=5) == cache_filepath
+        get.assert_not_called()
+
+
+def _copy_sample_raster(directory) -> str:
+    path = os.path.join(directory, "raster_sample.tif")
+    shutil.copy(SAMPLE_RASTER, path)
+    return path
+
+
+def test_tif_validity_uses_manifest(cache_directory):
+    """A GeoTIFF is opened once, later checks only read its manifest."""
+    path = _copy_sample_raster(cache_directory)
+
+    assert caching.is_file_valid(path)
+    assert os.path.isfile(path + caching.MANIFEST_SUFFIX)
+
+    with patch("rasterio.open") as rasterio_open:
+        assert caching.is_file_valid(path)
+        rasterio_open.assert_not_called()
+
+
+def test_tif_not_matching_manifest_is_reopened(cache_directory):
+    path = _copy_sample_raster(cache_directory)
+    caching.write_manifest(path)
+
+    with open(path, "r+b") as f:
+        f.truncate(1024)
+
+    with patch(
+        "rasterio.open",
+        side_effect=RasterioIOError("truncated"),
+    ) as rasterio_open:
+        assert not caching.is_file_valid(path)
+        rasterio_open.assert_called_once()
+
+
+def test_downloaded_tif_gets_manifest(cache_directory):
+    def download(url, filepath):
+        shutil.copy(SAMPLE_RASTER, filepath)
+
+    with patch("prism_app.caching.download_file", side_effect=download):
+        path = caching.cache_file(
+            url="https://example.org/raster.tif", prefix="raster", extension="tif"
+        )
+
+    assert os.path.isfile(path + caching.MANIFEST_SUFFIX)
+    with patch("rasterio.open") as rasterio_open:
+        assert caching.cache_file(
+            url="https://example.org/raster.tif", prefix="raster", extension="tif"
+        )
+        rasterio_open.assert_not_called()
+
+
+def test_download_locks_are_dropped(cache_directory):
+    """No per-file lock is kept once no thread holds or waits on it."""
+    with patch("prism_app.caching.download_file", side_effect=_slow_download):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            list(
+                executor.map(
+                    lambda i: caching.cache_file(
+                        url=f"https://example.org/zones{i % 2}.json",
+                        prefix="zones",
+                        extension="json",
+                    ),
+                    range(3),
+                )
+            )
+
+    assert caching._download_locks == {}
+
+
+def test_lock_file_deleted_while_waiting_is_taken_again(cache_directory):
+    """A waiter whose lock file was swept takes the lock on the new one."""
+    lock_path = str(cache_directory / "zones_a.json.lock")
+    entered = threading.Event()
+
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+
+            def wait():
+                with caching._flock(lock_path):
+                    entered.set()
+                    return os.stat(lock_path).st_ino
+
+            future = executor.submit(wait)
+            time.sleep(0.1)
+            # As done by the sweeper, under the lock.
+            os.remove(lock_path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            inode = future.result(timeout=5)
+
+    assert entered.is_set()
+    assert os.path.exists(lock_path)
+    assert inode == os.stat(lock_path).st_ino
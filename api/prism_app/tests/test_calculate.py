@@ -1,12 +1,30 @@
 """Tests files for the analytics API."""
 
-from datetime import datetime, timezone
+import json
+import operator
+import os
+from datetime import date, datetime, timezone
 from unittest.mock import patch
 
+import duckdb
+import prism_app.caching as caching
+import pytest
+import rasterio
 from fastapi import HTTPException
+from prism_app.duckdb_utils import DuckDBPool
 from prism_app.kobo import get_form_responses
-from prism_app.zonal_stats import calculate_stats
+from prism_app.zonal_engine import _cached_zone_labels
+from prism_app.zonal_stats import (
+    _bbox_conditions,
+    _get_intersected_polygons,
+    _has_bbox_column,
+    _rasters_bbox,
+    calculate_stats,
+    calculate_stats_series,
+    get_intersected_wfs_polygons,
+)
 from pytest import raises
+from shapely.geometry import box, mapping, shape
 
 
 def test_calculate_stats_json_output():
@@ -161,3 +179,226 @@ def test_kobo_response_form(kobo_params, kobo_data):
     end = datetime(2020, 1, 1).replace(tzinfo=timezone.utc)
     forms = get_form_responses(begin, end, "", "", "", "", "")
     assert len(forms) == 1
+
+
+def test_calculate_stats_series_reuses_zones():
+    """A series over the same zones looks up their label raster once."""
+    zones = "/prism_app/tests/small_admin_boundaries.json"
+    geotiff = "/prism_app/tests/raster_sample.tif"
+    expected = calculate_stats(zones, geotiff, geojson_out=False)
+
+    with patch(
+        "prism_app.zonal_engine._cached_zone_labels", wraps=_cached_zone_labels
+    ) as cached_zone_labels:
+        results = list(calculate_stats_series(zones, [geotiff] * 3, geojson_out=False))
+
+    assert results == [expected] * 3
+    cached_zone_labels.assert_called_once()
+
+
+def _zones_columns() -> dict:
+    """small_admin_boundaries as DuckDB returns a GeoParquet query."""
+    with open("/prism_app/tests/small_admin_boundaries.json") as f:
+        features = json.load(f)["features"]
+    con = duckdb.connect()
+    con.execute("CREATE TABLE zones (ADM2_EN VARCHAR, updated DATE, geometry BLOB)")
+    con.executemany(
+        "INSERT INTO zones VALUES (?, ?, ?)",
+        [
+            (f["properties"]["ADM2_EN"], date(2024, 1, 1), shape(f["geometry"]).wkb)
+            for f in features
+        ],
+    )
+    return con.execute("SELECT * FROM zones").fetchnumpy()
+
+
+def test_calculate_stats_parquet_zones():
+    """GeoParquet zones go from DuckDB columns to stats without a GeoJSON file."""
+    geotiff = "/prism_app/tests/raster_sample.tif"
+    expected = calculate_stats(
+        "/prism_app/tests/small_admin_boundaries.json", geotiff, geojson_out=False
+    )
+
+    with patch(
+        "prism_app.zonal_stats._query_parquet_zones", return_value=_zones_columns()
+    ) as query:
+        features = calculate_stats(
+            "s3://bucket/zones.parquet", geotiff, geojson_out=False, admin_level=2
+        )
+        geojson = calculate_stats(
+            "s3://bucket/zones.parquet", geotiff, geojson_out=True
+        )
+
+    assert query.call_args_list[0].kwargs["admin_level"] == 2
+    assert len(features) == len(expected) == 26
+    for actual, reference in zip(features, expected):
+        assert actual["ADM2_EN"] == reference["ADM2_EN"]
+        assert actual["updated"].startswith("2024-01-01")
+        assert actual["stats_mean"] == reference["stats_mean"]
+    assert geojson[0]["geometry"]["type"] in ("Polygon", "MultiPolygon")
+
+
+def test_calculate_stats_parquet_zones_read_once():
+    """Filtered GeoParquet zones are queried once and joined to their stats."""
+    geotiff = "/prism_app/tests/raster_sample.tif"
+    expected = calculate_stats(
+        "/prism_app/tests/small_admin_boundaries.json",
+        geotiff,
+        geojson_out=False,
+        filter_by=("ADM2_EN", "Nomgon"),
+    )
+
+    with patch(
+        "prism_app.zonal_stats._query_parquet_zones", return_value=_zones_columns()
+    ) as query:
+        features = calculate_stats(
+            "s3://bucket/zones.parquet",
+            geotiff,
+            geojson_out=False,
+            filter_by=("ADM2_EN", "Nomgon"),
+        )
+
+    query.assert_called_once()
+    assert len(features) == 1
+    assert features[0]["ADM2_EN"] == "Nomgon"
+    assert features[0]["stats_mean"] == expected[0]["stats_mean"]
+
+
+def test_calculate_stats_joins_properties_by_zone():
+    """Zones left out by intersect_comparison do not shift properties."""
+    zones = "/prism_app/tests/small_admin_boundaries.json"
+    geotiff = "/prism_app/tests/raster_sample.tif"
+    means = {
+        feature["ADM2_PCODE"]: feature["stats_mean"]
+        for feature in calculate_stats(zones, geotiff, geojson_out=False)
+    }
+
+    features = calculate_stats(
+        zones, geotiff, geojson_out=False, intersect_comparison=(operator.gt, 28000)
+    )
+
+    assert 0 < len(features) < len(means)
+    for feature in features:
+        assert feature["stats_mean"] == means[feature["ADM2_PCODE"]]
+
+
+def test_bbox_conditions_use_covering_column():
+    """bbox filters compare the covering column, checked against row groups."""
+    con = duckdb.connect()
+    con.execute("""
+        CREATE TABLE zones AS SELECT * FROM (VALUES
+            ('inside', {'xmin': 1.0, 'ymin': 1.0, 'xmax': 2.0, 'ymax': 2.0}),
+            ('across', {'xmin': 9.0, 'ymin': 1.0, 'xmax': 12.0, 'ymax': 2.0}),
+            ('outside', {'xmin': 20.0, 'ymin': 20.0, 'xmax': 21.0, 'ymax': 21.0})
+        ) AS zones(name, bbox)
+        """)
+
+    def names(conditions):
+        query = "SELECT name FROM zones WHERE " + " AND ".join(conditions)
+        return sorted(row[0] for row in con.execute(query).fetchall())
+
+    bbox = (0, 0, 10, 10)
+    assert names(_bbox_conditions(bbox, "contains", True)) == ["inside"]
+    intersects = _bbox_conditions(bbox, "intersects", True)
+    # The exact geometry test only runs on zones whose bbox intersects.
+    assert intersects[-1].startswith("ST_Intersects(")
+    assert names(intersects[:-1]) == ["across", "inside"]
+
+    (contains,) = _bbox_conditions(bbox, "contains", False)
+    assert contains.startswith("ST_Contains(")
+
+
+def test_has_bbox_column_follows_rewrites(tmp_path):
+    path = str(tmp_path / "zones.parquet")
+    con = duckdb.connect()
+    pool = DuckDBPool(duckdb.connect)
+    con.execute(f"COPY (SELECT 1 AS id) TO '{path}' (FORMAT PARQUET)")
+    with patch("prism_app.zonal_stats.duckdb_pool", pool):
+        assert not _has_bbox_column(path)
+
+        con.execute(
+            "COPY (SELECT 1 AS id, {'xmin': 0, 'ymin': 0, 'xmax': 1, 'ymax': 1}"
+            f" AS bbox) TO '{path}' (FORMAT PARQUET)"
+        )
+        os.utime(path, (0, 0))
+        assert _has_bbox_column(path)
+    pool.close()
+
+
+def test_stats_zones_are_read_within_raster_bounds():
+    """GeoParquet zones are read with the raster bounds, as intersects."""
+    geotiff = "/prism_app/tests/raster_sample.tif"
+    bbox = _rasters_bbox([geotiff])
+    with rasterio.open(geotiff) as src:
+        assert bbox == pytest.approx(tuple(src.bounds))
+
+    with patch(
+        "prism_app.zonal_stats._query_parquet_zones",
+        side_effect=HTTPException(status_code=418),
+    ) as query:
+        with raises(HTTPException):
+            calculate_stats("s3://bucket/zones.parquet", geotiff)
+
+    assert query.call_args.kwargs["bbox"] == bbox
+    assert query.call_args.kwargs["bbox_predicate"] == "intersects"
+
+
+def test_intersected_polygons_order_and_properties():
+    """Each zone yields one feature per intersecting polygon, in input order."""
+
+    def feature(geometry, **properties):
+        return {"type": "Feature", "properties": properties, "geometry": geometry}
+
+    zones = {
+        "features": [
+            feature(mapping(box(0, 0, 1, 1)), name="a"),
+            feature(mapping(box(5, 5, 6, 6)), name="far"),
+            feature(mapping(box(1, 0, 2, 1)), name="b"),
+        ]
+    }
+    wfs = {
+        "features": [
+            feature(mapping(box(1.5, 0, 3, 1)), label="east"),
+            feature(mapping(box(-1, 0, 1.5, 1)), label="west"),
+            feature(mapping(box(0, 0, 9, 9)), label="Uncertainty Cones"),
+            feature({"type": "Point", "coordinates": [0.5, 0.5]}, label="point"),
+        ]
+    }
+
+    intersected = _get_intersected_polygons(zones, wfs, "label")
+
+    assert [f["feature"]["properties"] for f in intersected] == [
+        {"name": "a", "label": "west"},
+        {"name": "b", "label": "east"},
+        {"name": "b", "label": "west"},
+    ]
+    assert intersected[1]["geom"].equals(box(1.5, 0, 2, 1))
+    assert intersected[2]["feature"]["geometry"]["type"] == "Polygon"
+
+
+def test_wfs_intersection_is_cached(tmp_path, monkeypatch):
+    """Intersections are reused per zones and wfs contents, for any raster."""
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    zones = "/prism_app/tests/small_admin_boundaries.json"
+    wfs_response = {
+        "filter_property_key": "label",
+        "path": "/prism_app/tests/wfs_response.json",
+    }
+
+    with patch(
+        "prism_app.zonal_stats._get_intersected_polygons",
+        wraps=_get_intersected_polygons,
+    ) as intersect:
+        first = get_intersected_wfs_polygons(wfs_response, zones)
+        second = get_intersected_wfs_polygons(wfs_response, zones)
+        assert intersect.call_count == 1
+
+        other_wfs = tmp_path / "other_wfs.json"
+        other_wfs.write_text('{"type": "FeatureCollection", "features": []}')
+        third = get_intersected_wfs_polygons(
+            {"filter_property_key": "label", "path": str(other_wfs)}, zones
+        )
+        assert intersect.call_count == 2
+
+    assert first == second != third
+    assert os.path.dirname(first) == str(tmp_path)
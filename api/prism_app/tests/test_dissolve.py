@@ -0,0 +1,61 @@
+"""Tests for grouped polygon dissolve."""
+
+import json
+from unittest.mock import patch
+
+import numpy as np
+import prism_app.dissolve as dissolve_module
+import shapely
+from prism_app.dissolve import dissolve, dissolve_groups
+from shapely.geometry import box, shape
+
+ZONES = "/prism_app/tests/small_admin_boundaries.json"
+
+
+def _zones() -> tuple[list, np.ndarray]:
+    with open(ZONES) as f:
+        features = json.load(f)["features"]
+    keys = [f["properties"]["ADM1_PCODE"] for f in features]
+    return keys, np.array([shape(f["geometry"]) for f in features], dtype=object)
+
+
+def test_dissolve_coverage_and_overlaps():
+    # Edge-sharing squares form a coverage, overlapping ones do not.
+    coverage = np.array([box(0, 0, 1, 1), box(1, 0, 2, 1)])
+    overlapping = np.array([box(0, 0, 1, 1), box(0.5, 0, 1.5, 1)])
+
+    assert dissolve(coverage).equals(box(0, 0, 2, 1))
+    assert dissolve(overlapping).equals(box(0, 0, 1.5, 1))
+
+
+def test_parallel_dissolve_matches_serial(monkeypatch):
+    keys, geometries = _zones()
+    serial = dissolve_groups(keys, geometries, workers=1)
+
+    monkeypatch.setattr(dissolve_module, "DISSOLVE_PARALLEL_MIN_GEOMETRIES", 0)
+    try:
+        parallel = dissolve_groups(keys, geometries, workers=2)
+        executor = dissolve_module._executor
+        # The pool is kept for the next calls.
+        assert executor is not None
+        dissolve_groups(keys, geometries, workers=2)
+        assert dissolve_module._executor is executor
+    finally:
+        dissolve_module.shutdown_pool()
+
+    assert list(parallel) == list(serial) == list(dict.fromkeys(keys))
+    for key, geometry in serial.items():
+        assert shapely.equals_exact(parallel[key], geometry, tolerance=1e-9)
+
+
+def test_dissolve_is_serial_in_child_processes(monkeypatch):
+    keys, geometries = _zones()
+    monkeypatch.setattr(dissolve_module, "DISSOLVE_PARALLEL_MIN_GEOMETRIES", 0)
+
+    with patch("prism_app.dissolve.multiprocessing.parent_process"), patch(
+        "prism_app.dissolve._get_executor"
+    ) as get_executor:
+        dissolved = dissolve_groups(keys, geometries, workers=2)
+
+    get_executor.assert_not_called()
+    assert list(dissolved) == list(dict.fromkeys(keys))
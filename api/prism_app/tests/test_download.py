@@ -0,0 +1,116 @@
+"""Tests for streaming, resumable downloads."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import prism_app.download as download
+import pytest
+import requests
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT with Range support; can cut the first response short."""
+
+    etag = '"v1"'
+    drop_after: int | None = None
+    requests_seen: list[dict] = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests_seen.append(dict(self.headers))
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == self.etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(CONTENT) - start))
+        self.end_headers()
+
+        body = CONTENT[start:]
+        if type(self).drop_after is not None:
+            body = body[: type(self).drop_after]
+            type(self).drop_after = None
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    _RangeHandler.requests_seen = []
+    _RangeHandler.drop_after = None
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/raster.tif"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_streams_to_file(server, tmp_path):
+    filepath = str(tmp_path / "raster.tif")
+
+    download.download_file(server, filepath)
+
+    with open(filepath, "rb") as f:
+        assert f.read() == CONTENT
+    assert not list(tmp_path.glob("*.part*"))
+
+
+def test_interrupted_download_is_resumed(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download.time, "sleep", lambda seconds: None)
+    _RangeHandler.drop_after = 300_000
+    filepath = str(tmp_path / "raster.tif")
+
+    download.download_file(server, filepath)
+
+    with open(filepath, "rb") as f:
+        assert f.read() == CONTENT
+    # Whole chunks received before the connection dropped are kept.
+    resumed = _RangeHandler.requests_seen[-1]
+    assert resumed["Range"] == f"bytes={download.DOWNLOAD_CHUNK_SIZE * 4}-"
+    assert resumed["If-Range"] == '"v1"'
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    """A partial file from an older version of the remote file is discarded."""
+    filepath = str(tmp_path / "raster.tif")
+    with open(filepath + download.PARTIAL_SUFFIX, "wb") as f:
+        f.write(b"stale")
+    with open(filepath + ".part.validator", "w") as f:
+        f.write('"v0"')
+
+    download.download_file(server, filepath)
+
+    with open(filepath, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_download_errors(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(download, "DOWNLOAD_RETRIES", 1)
+    monkeypatch.setattr(download, "_session", None)
+
+    with pytest.raises(download.DownloadError):
+        download.download_file("http://127.0.0.1:1/raster.tif", str(tmp_path / "x"))
+    monkeypatch.setattr(_RangeHandler, "do_GET", _not_found)
+    with pytest.raises(requests.HTTPError):
+        download.download_file(server, str(tmp_path / "y"))
+
+
+def _not_found(handler):
+    handler.send_response(404)
+    handler.send_header("Content-Length", "0")
+    handler.end_headers()
+
+
+def test_session_is_pooled_per_process():
+    assert download.get_session() is download.get_session()
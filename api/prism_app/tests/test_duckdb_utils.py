@@ -0,0 +1,65 @@
+"""Tests for the per-process DuckDB pool."""
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import duckdb
+import pytest
+from prism_app.duckdb_utils import DuckDBPool
+
+
+@pytest.fixture
+def initialize():
+    def connect():
+        connection = duckdb.connect()
+        connection.execute("CREATE TABLE zones AS SELECT 1 AS id")
+        return connection
+
+    return MagicMock(side_effect=connect)
+
+
+def test_database_is_set_up_once(initialize):
+    pool = DuckDBPool(initialize)
+
+    def count_zones(_):
+        with pool.cursor() as cursor:
+            return cursor.execute("SELECT COUNT(*) FROM zones").fetchone()[0]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(count_zones, range(8))) == [1] * 8
+    assert initialize.call_count == 1
+
+
+def test_query_errors_keep_the_database(initialize):
+    pool = DuckDBPool(initialize)
+
+    with pytest.raises(duckdb.CatalogException):
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT * FROM missing")
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT * FROM zones")
+
+    assert initialize.call_count == 1
+
+
+def test_fatal_errors_recycle_the_database(initialize):
+    pool = DuckDBPool(initialize)
+
+    with pytest.raises(duckdb.FatalException):
+        with pool.cursor():
+            raise duckdb.FatalException("database invalidated")
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT * FROM zones")
+
+    assert initialize.call_count == 2
+
+
+def test_warm_up(initialize):
+    pool = DuckDBPool(initialize)
+
+    pool.warm_up()
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT * FROM zones")
+
+    assert initialize.call_count == 1
+    pool.close()
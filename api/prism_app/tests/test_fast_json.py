@@ -0,0 +1,72 @@
+"""Tests for fast JSON responses."""
+
+import json
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from prism_app.fast_json import dumps, iter_json_array, round_geometry
+from prism_app.main import app
+from prism_app.zonal_stats import calculate_stats
+
+client = TestClient(app)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ZONES = os.path.join(TESTS_DIR, "small_admin_boundaries.json")
+GEOTIFF = os.path.join(TESTS_DIR, "raster_sample.tif")
+
+
+def test_dumps_numpy_and_nan():
+    value = {"a": np.float32(1.5), "b": np.int64(3), "c": np.array([1, 2])}
+    assert json.loads(dumps(value)) == {"a": 1.5, "b": 3, "c": [1, 2]}
+    assert dumps({"d": float("nan"), "e": np.float64("nan")}) == b'{"d":null,"e":null}'
+
+
+def test_iter_json_array_rounds_feature_coordinates():
+    feature = {
+        "type": "Feature",
+        "properties": {"name": "a"},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[(0.123456, 1.0), (1.987654, 1.0), (0.123456, 1.0)]],
+        },
+    }
+    chunks = list(iter_json_array([feature, {"stats_mean": 1.0}], 2))
+    assert len(chunks) == 4
+    result = json.loads(b"".join(chunks))
+    assert result[0]["geometry"]["coordinates"][0][1] == [1.99, 1.0]
+    assert result[1] == {"stats_mean": 1.0}
+    assert round_geometry(
+        {"type": "MultiPolygon", "coordinates": [[[[0.15, 0.0]]]]}, 1
+    ) == {"type": "MultiPolygon", "coordinates": [[[[0.2, 0.0]]]]}
+    assert json.loads(b"".join(iter_json_array([]))) == []
+
+
+def test_stats_endpoint_streams_json():
+    def cache_file(prefix: str, url: str, extension: str) -> str:
+        return ZONES if extension == "json" else GEOTIFF
+
+    with patch("prism_app.main.cache_file", side_effect=cache_file):
+        response = client.post(
+            "/stats",
+            json={
+                "geotiff_url": "https://example.org/rainfall.tif",
+                "zones_url": "https://example.org/zones.json",
+                "geojson_out": True,
+                "coordinate_precision": 3,
+            },
+        )
+
+    assert response.status_code == 200
+    features = response.json()
+    expected = calculate_stats(ZONES, GEOTIFF, geojson_out=True)
+    assert len(features) == len(expected) == 26
+    assert features[0]["properties"]["stats_mean"] == pytest.approx(
+        expected[0]["properties"]["stats_mean"]
+    )
+    position = features[0]["geometry"]["coordinates"]
+    while isinstance(position[0], list):
+        position = position[0]
+    assert [round(c, 3) for c in position] == position
@@ -0,0 +1,112 @@
+"""Tests for the in-process Prometheus metrics."""
+
+import asyncio
+import logging
+
+import prism_app.metrics as metrics
+from fastapi.testclient import TestClient
+from prism_app.main import app
+from prism_app.metrics import Counter, Histogram, capture, replay
+from prism_app.stats_pool import StatsPool
+from prism_app.timer import timed
+
+client = TestClient(app)
+
+
+def test_exposition_format():
+    counter = Counter("test_requests_total", "Test requests.")
+    counter.inc(route="/a")
+    counter.inc(2, route="/a")
+    counter.inc(route='/"b"')
+    assert counter.samples() == [
+        'test_requests_total{route="/\\"b\\""} 1',
+        'test_requests_total{route="/a"} 3',
+    ]
+
+    histogram = Histogram("test_seconds", "Test durations.", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="x")
+    assert histogram.samples() == [
+        'test_seconds_bucket{stage="x",le="0.1"} 1',
+        'test_seconds_bucket{stage="x",le="1"} 2',
+        'test_seconds_bucket{stage="x",le="+Inf"} 3',
+        'test_seconds_sum{stage="x"} 5.55',
+        'test_seconds_count{stage="x"} 3',
+    ]
+
+
+def test_capture_and_replay():
+    stage_count = metrics.STAGE_SECONDS.count(stage="test_capture")
+    with capture() as observations:
+        with metrics.span("test_capture"):
+            pass
+    assert [name for name, _, _ in observations] == [metrics.STAGE_SECONDS.name]
+    assert metrics.STAGE_SECONDS.count(stage="test_capture") == stage_count
+
+    replay(observations)
+    assert metrics.STAGE_SECONDS.count(stage="test_capture") == stage_count + 1
+
+
+def test_disabled_metrics_are_not_recorded(monkeypatch):
+    counter = Counter("test_disabled_total", "Test counter.")
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    counter.inc()
+    assert counter.value() == 0
+
+
+def test_timed_coroutine(caplog):
+    @timed
+    async def slow_job():
+        await asyncio.sleep(0)
+        return 42
+
+    count = metrics.FUNCTION_SECONDS.count(function="slow_job")
+    with caplog.at_level(logging.INFO, logger="prism_app.timer"):
+        assert asyncio.run(slow_job()) == 42
+    assert "slow_job took" in caplog.text
+    assert metrics.FUNCTION_SECONDS.count(function="slow_job") == count + 1
+
+
+def _observed_job():
+    with metrics.span("test_pool"):
+        return "done"
+
+
+def test_pool_jobs_metrics_are_replayed():
+    pool = StatsPool(workers=0)
+    count = metrics.STAGE_SECONDS.count(stage="test_pool")
+    try:
+        assert asyncio.run(pool.run(_observed_job)) == "done"
+    finally:
+        pool.shutdown()
+    assert metrics.STAGE_SECONDS.count(stage="test_pool") == count + 1
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr("prism_app.main.METRICS_TOKEN", "scrape")
+    client.get("/")
+    assert client.get("/metrics").status_code == 401
+    assert (
+        client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code
+        == 401
+    )
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE prism_http_request_duration_seconds histogram" in response.text
+    assert (
+        'prism_http_request_duration_seconds_count{method="GET",route="/",status="200"}'
+        in response.text
+    )
+    assert "prism_stats_pool_pending_jobs 0" in response.text
+
+
+def test_metrics_endpoint_disabled(monkeypatch):
+    # Not served without a token.
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr("prism_app.main.METRICS_TOKEN", "scrape")
+    monkeypatch.setattr("prism_app.main.METRICS_ENABLED", False)
+    headers = {"Authorization": "Bearer scrape"}
+    assert client.get("/metrics", headers=headers).status_code == 404
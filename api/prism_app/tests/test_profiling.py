@@ -0,0 +1,111 @@
+"""Tests for the opt-in cProfile profiles of stats and map export calls."""
+
+import asyncio
+import os
+import pstats
+from unittest.mock import patch
+
+import prism_app.caching as caching
+import prism_app.profiling as profiling
+import pytest
+from fastapi.testclient import TestClient
+from prism_app.main import app
+from prism_app.profiling import (
+    PROFILE_HEADER,
+    list_profiles,
+    profile,
+    profile_path,
+    profiled,
+    should_profile,
+)
+from prism_app.stats_pool import StatsPool
+
+client = TestClient(app)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ZONES = os.path.join(TESTS_DIR, "small_admin_boundaries.json")
+GEOTIFF = os.path.join(TESTS_DIR, "raster_sample.tif")
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    return tmp_path
+
+
+def _work(n: int) -> int:
+    return sum(range(n))
+
+
+def test_should_profile(monkeypatch):
+    assert not should_profile(None)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    assert should_profile("secret")
+    assert not should_profile("guess")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    assert should_profile(None)
+
+
+def test_profiles_are_written_and_listed_slowest_first(cache_directory):
+    for fingerprint, n in (("aa", 10), ("bb", 10**6)):
+        with profile("calculate_stats", fingerprint):
+            _work(n)
+    with profile("calculate_stats", "cc", enabled=False):
+        _work(10)
+
+    profiles = list_profiles()
+    assert [p["fingerprint"] for p in profiles] == ["bb", "aa"]
+    assert profiles[0]["duration_ms"] >= profiles[1]["duration_ms"]
+    assert "_work" in profiles[0]["summary"]
+
+    path = profile_path(profiles[0]["name"])
+    assert path is not None
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_oldest_profiles_are_pruned(cache_directory, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 2)
+    for fingerprint in ("aa", "bb", "cc"):
+        with profile("export_maps", fingerprint):
+            pass
+
+    assert sorted(p["fingerprint"] for p in list_profiles()) == ["bb", "cc"]
+    assert len(os.listdir(cache_directory / "profiles")) == 4
+
+
+def test_profile_path_rejects_other_files(cache_directory):
+    assert profile_path("../results_cache.sqlite") is None
+    assert profile_path("1-calculate_stats-ab") is None
+
+
+def test_profiled_jobs_run_in_the_stats_pool(cache_directory):
+    pool = StatsPool(workers=0)
+    try:
+        job = profiled("work", "ab", _work)
+        assert job.__name__ == "_work"
+        assert asyncio.run(pool.run(job, 100)) == 4950
+    finally:
+        pool.shutdown()
+    assert [p["function"] for p in list_profiles()] == ["work"]
+
+
+def test_stats_endpoint_profiles_with_token(cache_directory, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+
+    def cache_file(prefix: str, url: str, extension: str) -> str:
+        return ZONES if extension == "json" else GEOTIFF
+
+    with patch("prism_app.main.cache_file", side_effect=cache_file):
+        response = client.post(
+            "/stats",
+            headers={PROFILE_HEADER: "secret"},
+            json={
+                "geotiff_url": "https://example.org/profiled.tif",
+                "zones_url": "https://example.org/zones.json",
+            },
+        )
+
+    assert response.status_code == 200
+    (stats_profile,) = list_profiles()
+    assert stats_profile["function"] == "calculate_stats"
+    assert len(stats_profile["fingerprint"]) == 16
@@ -1,9 +1,24 @@
 import os
 import tempfile
 
+import numpy as np
 import pytest
 import rasterio
-from prism_app.raster_utils import get_raster_crs, reproject_raster
+from prism_app.raster_utils import (
+    InvalidCalcExprError,
+    MaskedRaster,
+    get_raster_crs,
+    parse_calc_expr,
+    reproj_match,
+    reproject_raster,
+    write_raster,
+)
+from prism_app.zonal_engine import compute_zonal_stats
+from prism_app.zonal_stats import DEFAULT_STATS
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from rasterstats import zonal_stats  # type: ignore
+from shapely.geometry import box, mapping  # type: ignore
 
 
 def test_reproject_raster():
@@ -27,3 +42,118 @@ def test_reproject_raster():
         assert os.path.exists(output_file)
         output_crs = get_raster_crs(output_file)
         assert output_crs == rasterio.crs.CRS.from_epsg(3857)
+
+
+def _write_geotiff(path, values, transform, nodata):
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        dtype=values.dtype,
+        count=1,
+        width=values.shape[1],
+        height=values.shape[0],
+        crs="EPSG:4326",
+        transform=transform,
+        nodata=nodata,
+    ) as dst:
+        dst.write(values, 1)
+
+
+@pytest.fixture
+def population_and_flood(tmp_path):
+    """A population raster and a flood mask shifted by (3 cols, 2 rows)."""
+    rng = np.random.default_rng(0)
+    population = rng.integers(0, 100, (40, 50)).astype("float32")
+    population[5, 5] = -1
+    flood = rng.integers(0, 4, (45, 40)).astype("uint8")
+    flood[10, 10] = 255
+
+    population_path = str(tmp_path / "population.tif")
+    flood_path = str(tmp_path / "flood.tif")
+    _write_geotiff(
+        population_path, population, Affine(0.1, 0, 10, 0, -0.1, 5), nodata=-1
+    )
+    _write_geotiff(flood_path, flood, Affine(0.1, 0, 10.3, 0, -0.1, 4.8), nodata=255)
+    return population_path, flood_path, population, flood
+
+
+def test_masked_raster_matches_gdal_calc_semantics(population_and_flood):
+    population_path, flood_path, population, flood = population_and_flood
+
+    with MaskedRaster(population_path, flood_path, calc_expr="A*(B>=2)") as masked:
+        assert masked.shape == (38, 40)
+        assert masked.dtypes[0] == "float32"
+        assert masked.transform == Affine(0.1, 0, 10.3, 0, -0.1, 4.8)
+        values = masked.read(1)
+        window = masked.read(1, window=Window(4, 6, 10, 5))
+
+    a = population[2:40, 3:43]
+    b = flood[:38, :40]
+    expected = a * (b >= 2)
+    expected[(a == -1) | (b == 255)] = 0
+    np.testing.assert_array_equal(values, expected)
+    np.testing.assert_array_equal(window, expected[6:11, 4:14])
+
+
+def test_masked_raster_written_and_streamed(population_and_flood, tmp_path):
+    """Stats from the in-process raster match stats from its persisted copy."""
+    population_path, flood_path, _, _ = population_and_flood
+    zone = {
+        "type": "Feature",
+        "properties": {},
+        "geometry": mapping(box(10.5, 1.5, 13.5, 4.5)),
+    }
+    output_path = str(tmp_path / "masked.tif")
+
+    with MaskedRaster(population_path, flood_path) as masked:
+        write_raster(masked, output_path)
+        streamed = compute_zonal_stats([zone], masked, stats=DEFAULT_STATS)
+
+    with rasterio.open(output_path) as written:
+        assert written.nodata == 0
+    (expected,) = zonal_stats([zone], output_path, stats=DEFAULT_STATS)
+    assert streamed[0] == pytest.approx(expected)
+
+
+def test_masked_raster_warps_mismatched_grids(population_and_flood, tmp_path):
+    """Mismatched grids are warped on the fly like reproj_match then masking."""
+    _, flood_path, _, _ = population_and_flood
+    rng = np.random.default_rng(1)
+    coarse_path = str(tmp_path / "coarse.tif")
+    _write_geotiff(
+        coarse_path,
+        rng.integers(0, 100, (30, 30)).astype("float32"),
+        Affine(0.15, 0, 10.02, 0, -0.15, 5.01),
+        nodata=-1,
+    )
+
+    with pytest.raises(ValueError):
+        MaskedRaster(coarse_path, flood_path, resampling=None)
+
+    reprojected_path = str(tmp_path / "reprojected.tif")
+    reproj_match(coarse_path, flood_path, reprojected_path)
+    with MaskedRaster(reprojected_path, flood_path, resampling=None) as masked:
+        expected = masked.read(1)
+    with MaskedRaster(coarse_path, flood_path) as warped:
+        assert warped.transform == masked.transform
+        np.testing.assert_allclose(warped.read(1), expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "calc_expr", ["__import__('os').system('ls')", "A.sum()", "C*(B==1)", "A*(B==1"]
+)
+def test_parse_calc_expr_rejects_unsafe_expressions(calc_expr):
+    with pytest.raises(InvalidCalcExprError):
+        parse_calc_expr(calc_expr)
+
+
+def test_parse_calc_expr_accepts_valid_operators():
+    a = np.array([1.0, 2.0, 3.0])
+    b = np.array([1, 2, 3])
+
+    np.testing.assert_array_equal(parse_calc_expr("A*(B=1)")(a, b), [1, 0, 0])
+    np.testing.assert_array_equal(parse_calc_expr("A*(1<B<=3)")(a, b), [0, 2, 3])
+    np.testing.assert_array_equal(
+        parse_calc_expr("-A*((B!=2)&(B>1))")(a, b), [0, 0, -3]
+    )
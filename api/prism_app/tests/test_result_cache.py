@@ -0,0 +1,136 @@
+"""Tests for the on-disk result cache shared by API workers."""
+
+import operator
+import time
+from unittest.mock import patch
+
+import pytest
+from prism_app.result_cache import ResultCache, file_fingerprint, result_key
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "results.sqlite")
+
+
+def test_result_cache_is_shared_between_instances(cache_path):
+    """Two instances over one file behave like two worker processes."""
+    writer = ResultCache(cache_path)
+    reader = ResultCache(cache_path)
+
+    assert reader.get("key") is None
+    writer.set("key", [{"stats_mean": 1.5, "name": "zone"}])
+
+    assert reader.get("key") == [{"stats_mean": 1.5, "name": "zone"}]
+    assert writer.stats() == {
+        "entries": 1,
+        "bytes": writer.stats()["bytes"],
+        "hits": 1,
+        "misses": 1,
+        "expired": 0,
+        "evictions": 0,
+    }
+
+
+def test_result_cache_expires_entries(cache_path, monkeypatch):
+    cache = ResultCache(cache_path, ttl_seconds=60)
+    cache.set("key", {"value": 1})
+
+    now = time.time()
+    monkeypatch.setattr("prism_app.result_cache.time.time", lambda: now + 61)
+
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_cache_evicts_least_recently_used(cache_path):
+    value = list(range(2000))
+    cache = ResultCache(cache_path)
+    cache.set("probe", value)
+    entry_bytes = cache.stats()["bytes"]
+
+    cache = ResultCache(cache_path, max_bytes=2 * entry_bytes)
+    cache.set("old", value)
+    cache.set("recent", value)
+    # Reading "old" makes "recent" the least recently used entry.
+    assert cache.get("old") == value
+    cache.set("new", value)
+
+    assert cache.get("old") == value
+    assert cache.get("recent") is None
+    assert cache.get("new") == value
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_result_cache_get_or_compute(cache_path):
+    cache = ResultCache(cache_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"count": 3}
+
+    assert cache.get_or_compute("key", compute) == {"count": 3}
+    assert cache.get_or_compute("key", compute) == {"count": 3}
+    assert len(calls) == 1
+
+
+def test_result_cache_failures_do_not_raise(tmp_path):
+    cache = ResultCache(str(tmp_path / "missing" / "results.sqlite"))
+
+    cache.set("key", {"value": 1})
+    assert cache.get("key") is None
+    assert cache.get_or_compute("key", lambda: 1) == 1
+
+
+def test_result_key_is_canonical(tmp_path):
+    raster = tmp_path / "raster.tif"
+    raster.write_bytes(b"1")
+
+    assert result_key({"a": 1, "b": (1, 2)}, operator.ge) == result_key(
+        {"b": [1, 2], "a": 1}, operator.ge
+    )
+    assert result_key(operator.ge) != result_key(operator.le)
+
+    fingerprint = file_fingerprint(str(raster))
+    raster.write_bytes(b"22")
+    assert file_fingerprint(str(raster)) != fingerprint
+    assert file_fingerprint("https://example.org/zones.parquet").startswith("https")
+
+
+def test_calculate_stats_results_are_cached(tmp_path, monkeypatch):
+    from prism_app import zonal_stats
+
+    monkeypatch.setattr(
+        zonal_stats,
+        "stats_result_cache",
+        ResultCache(str(tmp_path / "results.sqlite")),
+    )
+    geotiff = tmp_path / "raster.tif"
+    geotiff.write_bytes(b"1")
+    options = {
+        "stats": "mean",
+        "prefix": "stats_",
+        "group_by": None,
+        "geojson_out": False,
+        "wfs_response": None,
+        "intersect_comparison": (operator.ge, 1.0),
+        "mask_geotiff": None,
+    }
+
+    with patch.object(
+        zonal_stats, "calculate_stats", return_value=[{"stats_mean": 1.0}]
+    ) as calculate_stats:
+        first = zonal_stats.calculate_cached_stats(
+            "zones.json", str(geotiff), **options
+        )
+        second = zonal_stats.calculate_cached_stats(
+            "zones.json", str(geotiff), **options
+        )
+        # A refreshed raster is a different request.
+        geotiff.write_bytes(b"22")
+        zonal_stats.calculate_cached_stats("zones.json", str(geotiff), **options)
+
+    assert first == second == [{"stats_mean": 1.0}]
+    assert calculate_stats.call_count == 2
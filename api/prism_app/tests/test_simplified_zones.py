@@ -0,0 +1,104 @@
+"""Tests for the stored simplification levels of GeoParquet zones."""
+
+import os
+from unittest.mock import patch
+
+import duckdb
+import prism_app.caching as caching
+import pytest
+from prism_app.duckdb_utils import DuckDBPool
+from prism_app.simplified_zones import (
+    ZONES_SIMPLIFY_LEVELS,
+    get_simplified_zones,
+    simplified_zones_path,
+    snap_tolerance,
+)
+from prism_app.zonal_stats import calculate_stats
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    return tmp_path
+
+
+@pytest.fixture
+def pool():
+    """A pool without the spatial extension, where geometries are numbers.
+
+    Simplifying at a tolerance rounds a geometry to it, and a geometry is its
+    own bbox.
+    """
+
+    def connect():
+        connection = duckdb.connect()
+        connection.execute(
+            "CREATE MACRO ST_SimplifyPreserveTopology(g, t) AS round(g / t) * t"
+        )
+        for function in ("ST_XMin", "ST_YMin", "ST_XMax", "ST_YMax"):
+            connection.execute(f"CREATE MACRO {function}(g) AS g")
+        return connection
+
+    pool = DuckDBPool(connect)
+    with patch("prism_app.simplified_zones.duckdb_pool", pool):
+        yield pool
+    pool.close()
+
+
+def test_snap_tolerance():
+    assert ZONES_SIMPLIFY_LEVELS == (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+    assert snap_tolerance(None) is None
+    assert snap_tolerance(0.0001) is None
+    assert snap_tolerance(0.001) == 0.001
+    assert snap_tolerance(0.004) == 0.001
+    assert snap_tolerance(0.1) == 0.1
+    assert snap_tolerance(1) == 0.1
+
+
+def _write_source(path: str) -> None:
+    with duckdb.connect() as connection:
+        connection.execute(f"""
+            COPY (
+                SELECT
+                    range AS id,
+                    if(range < 3, 'AAA', 'BBB') AS iso3,
+                    range + 0.3 AS geometry,
+                    struct_pack(xmin := -1, ymin := -1, xmax := -1, ymax := -1)
+                        AS bbox
+                FROM range(5)
+            ) TO '{path}' (FORMAT PARQUET)
+            """)
+
+
+def test_zones_are_simplified_once_per_filter(cache_directory, pool):
+    source = str(cache_directory / "source.parquet")
+    _write_source(source)
+
+    path = get_simplified_zones(source, 0.5, ["iso3 = 'AAA'"], has_bbox_column=True)
+
+    assert path == simplified_zones_path(source, 0.5, ["iso3 = 'AAA'"])
+    assert not os.path.isfile(simplified_zones_path(source, 0.5))
+    assert not os.path.isfile(simplified_zones_path(source, 0.1, ["iso3 = 'AAA'"]))
+    with pool.cursor() as cursor:
+        rows = cursor.execute(
+            f"SELECT id, geometry, bbox.xmin, bbox.ymax FROM '{path}' ORDER BY id"
+        ).fetchall()
+    # The bbox is computed from the simplified geometries.
+    assert rows == [(0, 0.5, 0.5, 0.5), (1, 1.5, 1.5, 1.5), (2, 2.5, 2.5, 2.5)]
+
+    with patch("prism_app.simplified_zones.build_simplified_zones") as build:
+        assert get_simplified_zones(source, 0.5, ["iso3 = 'AAA'"]) == path
+        build.assert_not_called()
+
+
+def test_grouped_zones_are_shared_by_snapped_tolerances(cache_directory):
+    zones = "/prism_app/tests/small_admin_boundaries.json"
+    geotiff = "/prism_app/tests/raster_sample.tif"
+
+    for tolerance in (0.0012, 0.004):
+        calculate_stats(
+            zones, geotiff, group_by="ADM1_PCODE", simplify_tolerance=tolerance
+        )
+
+    (grouped,) = cache_directory.glob("*.ADM1_PCODE.all.all")
+    assert ".0.001.ADM1_PCODE." in grouped.name
@@ -0,0 +1,45 @@
+"""Tests for the import time of the API, see scripts/profile_startup.py."""
+
+import json
+import os
+import subprocess
+import sys
+
+import prism_app
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(prism_app.__file__)))
+# Loaded by the routes using them, or in the background by preload_modules.
+LAZY_DEPENDENCIES = (
+    "geopandas",
+    "odc.stac",
+    "playwright",
+    "pystac_client",
+    "rasterio",
+    "rasterstats",
+    "rioxarray",
+    "prism_app.zonal_stats",
+)
+
+_IMPORT_MAIN = f"""
+import json, sys
+import prism_app.main
+print(json.dumps([name for name in {LAZY_DEPENDENCIES!r} if name in sys.modules]))
+"""
+
+
+def test_import_main_is_lazy():
+    # A fresh interpreter, as the test session already imported everything.
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_MAIN],
+        cwd=API_ROOT,
+        env={**os.environ, "PYTHONPATH": API_ROOT},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == [], (
+        f"import prism_app.main loaded {loaded}: import them where they are used,"
+        " see scripts/profile_startup.py"
+    )
@@ -0,0 +1,119 @@
+"""API tests for POST /stats/batch."""
+
+import json
+import os
+from unittest.mock import patch
+
+import prism_app.main as main
+from fastapi.testclient import TestClient
+from prism_app.admission import admission_controller, estimate_stats_cost
+from prism_app.main import app
+from prism_app.zonal_stats import calculate_stats
+
+client = TestClient(app)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ZONES = os.path.join(TESTS_DIR, "small_admin_boundaries.json")
+GEOTIFF = os.path.join(TESTS_DIR, "raster_sample.tif")
+GEOTIFF_URLS = [
+    f"https://example.org/rainfall.tif?date=2024-01-{day:02d}" for day in (1, 11, 21)
+]
+
+
+def _cache_file(prefix: str, url: str, extension: str) -> str:
+    return ZONES if extension == "json" else GEOTIFF
+
+
+def test_stats_batch_returns_one_entry_per_raster():
+    with patch("prism_app.main.cache_file", side_effect=_cache_file) as cache_file:
+        response = client.post(
+            "/stats/batch",
+            json={
+                "geotiff_urls": GEOTIFF_URLS,
+                "zones_url": "https://example.org/zones.json",
+            },
+        )
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["date"] for r in results] == ["2024-01-01", "2024-01-11", "2024-01-21"]
+    assert [r["geotiff_url"] for r in results] == GEOTIFF_URLS
+    expected = calculate_stats(ZONES, GEOTIFF, prefix="stats_")
+    assert results[0]["stats"] == json.loads(json.dumps(expected))
+    # One zones download and one download per raster.
+    assert cache_file.call_count == 1 + len(GEOTIFF_URLS)
+
+
+def test_stats_batch_streams_ndjson():
+    with patch("prism_app.main.cache_file", side_effect=_cache_file):
+        response = client.post(
+            "/stats/batch",
+            json={
+                "geotiff_urls": GEOTIFF_URLS[:2],
+                "zones_url": "https://example.org/zones.json",
+                "stream": True,
+            },
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["date"] for line in lines] == ["2024-01-01", "2024-01-11"]
+    assert len(lines[0]["stats"]) == 26
+
+
+def test_stats_batch_reports_stream_errors():
+    def failing_cache_file(prefix: str, url: str, extension: str) -> str:
+        if "2024-01-11" in url:
+            raise ValueError("download failed")
+        return _cache_file(prefix, url, extension)
+
+    with patch("prism_app.main.cache_file", side_effect=failing_cache_file):
+        response = client.post(
+            "/stats/batch",
+            json={
+                "geotiff_urls": GEOTIFF_URLS[:2],
+                "zones_url": "https://example.org/zones.json",
+                "stream": True,
+            },
+        )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["date"] == "2024-01-01"
+    assert "error" in lines[1]
+
+
+def test_stats_batch_is_admitted_by_chunks(monkeypatch):
+    """Each chunk of rasters takes a stats_batch slot costing its rasters."""
+    monkeypatch.setattr(main, "BATCH_STATS_CHUNK_RASTERS", 2)
+    admitted = []
+    admit = admission_controller.admit
+
+    def record(endpoint, cost=1.0):
+        admitted.append((endpoint, cost))
+        return admit(endpoint, cost)
+
+    with patch("prism_app.main.cache_file", side_effect=_cache_file), patch.object(
+        admission_controller, "admit", side_effect=record
+    ), patch("prism_app.main.stats_pool.run", wraps=main.stats_pool.run) as run:
+        response = client.post(
+            "/stats/batch",
+            json={
+                "geotiff_urls": GEOTIFF_URLS,
+                "zones_url": "https://example.org/zones.json",
+            },
+        )
+
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    cost = estimate_stats_cost(GEOTIFF, ZONES)
+    assert admitted == [("stats_batch", 2 * cost), ("stats_batch", cost)]
+    assert run.call_count == 2
+
+
+def test_stats_batch_requires_rasters():
+    response = client.post(
+        "/stats/batch",
+        json={"geotiff_urls": [], "zones_url": "https://example.org/zones.json"},
+    )
+    assert response.status_code == 422
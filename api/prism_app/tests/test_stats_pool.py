@@ -0,0 +1,111 @@
+"""Tests for the /stats process pool."""
+
+import asyncio
+import math
+import os
+import threading
+
+import prism_app.metrics as metrics
+import pytest
+from fastapi import HTTPException
+from prism_app.stats_pool import StatsPool
+from prism_app.zonal_stats import DEFAULT_STATS, calculate_cached_stats, calculate_stats
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ZONES = os.path.join(TESTS_DIR, "small_admin_boundaries.json")
+GEOTIFF = os.path.join(TESTS_DIR, "raster_sample.tif")
+
+
+def _not_found():
+    raise HTTPException(status_code=404, detail="missing")
+
+
+def test_pool_runs_jobs_in_worker_processes():
+    pool = StatsPool(workers=1)
+    try:
+        assert asyncio.run(pool.run(math.factorial, 5)) == 120
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(pool.run(_not_found))
+        assert error.value.status_code == 404
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+
+
+def test_pool_computes_stats_in_spawned_worker(tmp_path, monkeypatch):
+    """Stats run as in /stats: pickled to a spawned worker, metrics replayed."""
+    # Read by the worker when it imports prism_app.caching.
+    monkeypatch.setenv("CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    count = metrics.FUNCTION_SECONDS.count(function="calculate_cached_stats")
+    pool = StatsPool(workers=1)
+    try:
+        features = asyncio.run(
+            pool.run(
+                calculate_cached_stats,
+                ZONES,
+                GEOTIFF,
+                stats=" ".join(DEFAULT_STATS),
+                prefix="stats_",
+                group_by=None,
+                geojson_out=False,
+                wfs_response=None,
+                intersect_comparison=None,
+                mask_geotiff=None,
+            )
+        )
+    finally:
+        pool.shutdown()
+
+    expected = calculate_stats(ZONES, GEOTIFF, stats=DEFAULT_STATS, prefix="stats_")
+    assert len(features) == len(expected) == 26
+    assert features[0]["stats_mean"] == pytest.approx(expected[0]["stats_mean"])
+    # Observed in the worker only.
+    assert (
+        metrics.FUNCTION_SECONDS.count(function="calculate_cached_stats") == count + 1
+    )
+
+
+def test_pool_recovers_from_dead_worker():
+    pool = StatsPool(workers=1)
+    try:
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(pool.run(os._exit, 1))
+        assert error.value.status_code == 500
+        assert pool._executor is None
+        # A new pool is started for the next job.
+        assert asyncio.run(pool.run(math.factorial, 5)) == 120
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+
+
+def test_pool_rejects_jobs_beyond_queue_limit():
+    pool = StatsPool(workers=0, queue_limit=1)
+    release = threading.Event()
+
+    async def saturate():
+        running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.1)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        return error.value
+
+    error = asyncio.run(saturate())
+    pool.shutdown()
+    assert error.status_code == 503
+    assert error.headers["Retry-After"]
+    assert pool.pending == 0
+
+
+def test_pool_times_out():
+    pool = StatsPool(workers=0, timeout=0.1)
+    release = threading.Event()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(pool.run(release.wait, 5))
+    assert error.value.status_code == 504
+    # The slot is freed once the job is done.
+    assert pool.pending == 1
+    release.set()
+    pool.shutdown()
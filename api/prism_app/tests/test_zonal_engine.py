@@ -0,0 +1,180 @@
+"""Tests for the rasterize-once zonal stats engine."""
+
+import json
+import logging
+import os
+from unittest.mock import patch
+
+import numpy as np
+import prism_app.caching as caching
+import pytest
+from prism_app.timer import timed
+from prism_app.zonal_engine import (
+    SUPPORTED_STATS,
+    ZONE_LABELS_PREFIX,
+    MedianSketch,
+    UnsupportedZonesError,
+    compute_zonal_stats,
+)
+from prism_app.zonal_stats import DEFAULT_STATS
+from rasterstats import zonal_stats  # type: ignore
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ZONES = os.path.join(TESTS_DIR, "small_admin_boundaries.json")
+GEOTIFF = os.path.join(TESTS_DIR, "raster_sample.tif")
+
+
+def _load_features() -> list[dict]:
+    with open(ZONES) as f:
+        return json.load(f)["features"]
+
+
+def _assert_same_stats(expected: dict, actual: dict) -> None:
+    assert expected.keys() == actual.keys()
+    for key, value in expected.items():
+        if value is None:
+            assert actual[key] is None, key
+        else:
+            assert actual[key] == pytest.approx(value, rel=1e-5), key
+
+
+def test_matches_rasterstats():
+    """The engine reproduces rasterstats output for every zone."""
+    features = _load_features()
+
+    expected = zonal_stats(features, GEOTIFF, stats=DEFAULT_STATS, prefix="stats_")
+    actual = compute_zonal_stats(
+        features, GEOTIFF, stats=DEFAULT_STATS, prefix="stats_"
+    )
+
+    assert len(actual) == len(expected) == len(features)
+    for e, a in zip(expected, actual):
+        _assert_same_stats(e, a)
+
+
+def test_overlapping_zones_and_add_stats():
+    """Nested zones are all counted and add_stats receives the zone pixels."""
+    features = _load_features()[:3]
+    # Duplicate a zone so that two features cover the very same pixels.
+    features = features + [features[0]]
+
+    def above_zero(masked) -> float:
+        return float((masked > 0).sum())
+
+    expected = zonal_stats(
+        features, GEOTIFF, stats=DEFAULT_STATS, add_stats={"above": above_zero}
+    )
+    actual = compute_zonal_stats(
+        features, GEOTIFF, stats=DEFAULT_STATS, add_stats={"above": above_zero}
+    )
+
+    for e, a in zip(expected, actual):
+        _assert_same_stats(e, a)
+    assert actual[0] == actual[-1]
+
+
+def test_geojson_out_keeps_properties():
+    features = _load_features()
+
+    results = compute_zonal_stats(
+        features, GEOTIFF, stats=list(SUPPORTED_STATS), geojson_out=True
+    )
+
+    assert results[0]["type"] == "Feature"
+    assert results[0]["properties"]["ADM2_EN"] == features[0]["properties"]["ADM2_EN"]
+    assert "median" in results[0]["properties"]
+    # Inputs are left untouched.
+    assert "median" not in features[0]["properties"]
+
+
+def test_unsupported_inputs_raise():
+    features = _load_features()
+
+    with pytest.raises(UnsupportedZonesError):
+        compute_zonal_stats(features, GEOTIFF, stats=["majority"])
+
+    point = {
+        "type": "Feature",
+        "properties": {},
+        "geometry": {"type": "Point", "coordinates": [100, 45]},
+    }
+    with pytest.raises(UnsupportedZonesError):
+        compute_zonal_stats([point], GEOTIFF, stats=DEFAULT_STATS)
+
+
+def test_zone_labels_cache(tmp_path, monkeypatch):
+    """Label rasters are cached per zones and grid and reused on later calls."""
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    features = _load_features()
+
+    first = compute_zonal_stats(
+        features, GEOTIFF, stats=DEFAULT_STATS, zones_key="small_admin"
+    )
+    cached_files = list(tmp_path.glob(f"{ZONE_LABELS_PREFIX}_*.npz"))
+    assert len(cached_files) == 1
+
+    with patch("prism_app.zonal_engine.rasterize_zones") as rasterize_zones:
+        second = compute_zonal_stats(
+            features, GEOTIFF, stats=DEFAULT_STATS, zones_key="small_admin"
+        )
+        rasterize_zones.assert_not_called()
+    assert first == second
+
+
+def test_zone_labels_cache_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "CACHE_DIRECTORY", f"{tmp_path}{os.sep}")
+    features = _load_features()
+
+    compute_zonal_stats(features, GEOTIFF, stats=["count"], zones_key="old")
+    (old_file,) = tmp_path.glob(f"{ZONE_LABELS_PREFIX}_*.npz")
+    os.utime(old_file, (0, 0))
+
+    monkeypatch.setattr(
+        "prism_app.zonal_engine.ZONE_LABELS_CACHE_MAX_BYTES",
+        old_file.stat().st_size,
+    )
+    compute_zonal_stats(features[:5], GEOTIFF, stats=["count"], zones_key="new")
+
+    remaining = list(tmp_path.glob(f"{ZONE_LABELS_PREFIX}_*.npz"))
+    assert len(remaining) == 1
+    assert remaining[0] != old_file
+
+
+def test_streaming_matches_in_memory(caplog):
+    """A tiny memory budget streams block-aligned chunks with the same results."""
+    features = _load_features()
+
+    in_memory = compute_zonal_stats(features, GEOTIFF, stats=DEFAULT_STATS)
+    with caplog.at_level(logging.INFO, logger="prism_app.timer"):
+        streamed = timed(compute_zonal_stats)(
+            features, GEOTIFF, stats=DEFAULT_STATS, memory_budget=256 * 1024
+        )
+
+    for expected, actual in zip(in_memory, streamed):
+        median = actual.pop("median")
+        expected_median = expected.pop("median")
+        _assert_same_stats(expected, actual)
+        if expected_median is not None:
+            assert median == pytest.approx(expected_median, rel=0.05)
+    assert "blocks_read=" in caplog.text
+    assert "peak_rss_mb=" in caplog.text
+
+
+def test_median_sketch_is_mergeable():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 15, 50_000)
+
+    sketches = []
+    for chunk in np.array_split(values, 7):
+        sketch = MedianSketch(capacity=512)
+        for block in np.array_split(chunk, 5):
+            sketch.add(np.sort(block))
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+
+    assert merged.median() == pytest.approx(np.median(values), abs=1.0)
+    exact = MedianSketch()
+    exact.add(values)
+    assert exact.median() == np.median(values)
@@ -1,23 +1,79 @@
 """Timer functions."""
 
+import inspect
 import logging
+from contextvars import ContextVar
 from functools import wraps
 from time import time
+from typing import Optional
+
+from prism_app.metrics import FUNCTION_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# Counters attached to the innermost running @timed call.
+_timer_counters: ContextVar[Optional[dict[str, float]]] = ContextVar(
+    "timer_counters", default=None
+)
+
+
+def record(name: str, value: float) -> None:
+    """Attach a value to the log line of the innermost running @timed call."""
+    counters = _timer_counters.get()
+    if counters is not None:
+        counters[name] = value
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Add to a counter logged by the innermost running @timed call."""
+    counters = _timer_counters.get()
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def _log_timing(name: str, start: float, counters: Optional[dict]) -> None:
+    elapsed = time() * 1000 - start
+    FUNCTION_SECONDS.observe(elapsed / 1000, function=name)
+
+    timer_message = "%s took %d ms to complete." % (name, elapsed)
+    if counters:
+        timer_message += " " + ", ".join(
+            "%s=%s" % (counter, value) for counter, value in counters.items()
+        )
+    logger.info(timer_message)
+
 
 def timed(f):
-    """Timer wrapper."""
+    """Timer wrapper, for functions and coroutine functions.
+
+    Durations are logged and observed in the function duration histogram.
+    """
+    if inspect.iscoroutinefunction(f):
+
+        @wraps(f)
+        async def async_wrapper(*args, **kwds):
+            start = time() * 1000
+            token = _timer_counters.set({})
+            try:
+                result = await f(*args, **kwds)
+            finally:
+                counters = _timer_counters.get()
+                _timer_counters.reset(token)
+            _log_timing(f.__name__, start, counters)
+            return result
+
+        return async_wrapper
 
     @wraps(f)
     def wrapper(*args, **kwds):
         start = time() * 1000
-        result = f(*args, **kwds)
-        elapsed = time() * 1000 - start
-
-        timer_message = "%s took %d ms to complete." % (f.__name__, elapsed)
-        logger.info(timer_message)
+        token = _timer_counters.set({})
+        try:
+            result = f(*args, **kwds)
+        finally:
+            counters = _timer_counters.get()
+            _timer_counters.reset(token)
+        _log_timing(f.__name__, start, counters)
         return result
 
     return wrapper
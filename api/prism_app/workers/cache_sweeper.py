@@ -0,0 +1,64 @@
+"""Report on and evict files from CACHE_DIRECTORY (see ``prism_app.cache_manager``).
+
+Run: ``python -m prism_app.workers.cache_sweeper stats|sweep|run``
+
+``stats`` prints occupancy and eviction counters per category as JSON,
+``sweep`` evicts once and ``run`` sweeps every CACHE_SWEEP_INTERVAL_SECONDS,
+for deployments that disable the in-process sweeper of the API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+from prism_app.cache_manager import (
+    CACHE_MAX_BYTES,
+    CACHE_SWEEP_INTERVAL_SECONDS,
+    get_cache_stats,
+    sweep,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=("stats", "sweep", "run"))
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=CACHE_MAX_BYTES,
+        help="Total cache budget in bytes, 0 for no limit (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=CACHE_SWEEP_INTERVAL_SECONDS or 300,
+        help="Seconds between sweeps for 'run' (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(get_cache_stats(), indent=2))
+        return 0
+
+    while True:
+        summary = sweep(max_bytes=args.max_bytes)
+        if summary is None:
+            logger.info("Another process is sweeping the cache.")
+        if args.command == "sweep":
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,807 @@
+"""Rasterize-once zonal statistics engine.
+
+All zones are burnt into integer label rasters aligned to the geotiff grid and
+every statistic is computed for every zone in a single NumPy pass, instead of
+re-reading a raster window and re-rasterizing each polygon one at a time the way
+``rasterstats.zonal_stats`` does. Output matches the rasterstats format so it
+can be swapped in transparently.
+"""
+
+import glob
+import inspect
+import logging
+import math
+import os
+import resource
+from dataclasses import dataclass
+from typing import Any, Callable, Final, Iterator, Optional, Sequence
+
+import numpy as np
+import prism_app.caching as caching
+import shapely  # type: ignore
+from prism_app.metrics import span
+from prism_app.raster_utils import MaskedRaster, open_raster
+from prism_app.timer import increment, record
+from rasterio.enums import MaskFlags  # type: ignore
+from rasterio.features import rasterize  # type: ignore
+from rasterio.transform import Affine  # type: ignore
+from rasterio.windows import Window  # type: ignore
+from shapely.geometry import shape  # type: ignore
+
+from .models import FilePath, GeoJSONFeature
+
+logger = logging.getLogger(__name__)
+
+# "label_raster" (default) or "rasterstats" to force the per-feature fallback.
+ZONAL_STATS_ENGINE: Final[str] = os.getenv("ZONAL_STATS_ENGINE", "label_raster")
+
+# Above this estimated footprint (bytes), rasters are streamed block by block.
+ZONAL_STATS_MEMORY_BUDGET: Final[int] = int(
+    os.getenv("ZONAL_STATS_MEMORY_BUDGET", 512 * 1024**2)
+)
+# Per-zone capacity of the streaming median sketch; medians are exact up to it.
+MEDIAN_SKETCH_CAPACITY: Final[int] = int(os.getenv("MEDIAN_SKETCH_CAPACITY", 4096))
+
+SUPPORTED_STATS: Final[tuple[str, ...]] = (
+    "min",
+    "max",
+    "mean",
+    "count",
+    "sum",
+    "std",
+    "median",
+    "nodata",
+)
+
+# Label rasters are cached as compressed .npz files next to other cached files.
+ZONE_LABELS_PREFIX: Final[str] = "zone_labels"
+ZONE_LABELS_CACHE_MAX_BYTES: Final[int] = int(
+    os.getenv("ZONE_LABELS_CACHE_MAX_BYTES", 2 * 1024**3)
+)
+
+# rasterstats compares against -999 when the raster declares no nodata value.
+RASTERSTATS_DEFAULT_NODATA: Final[float] = -999
+
+# Working bytes per pixel on top of the raster values: int32 labels, int64 zone
+# ids and float64 temporaries.
+_WORKING_BYTES_PER_PIXEL: Final[int] = 24
+
+# shapely type ids of Polygon and MultiPolygon.
+_POLYGON_TYPE_IDS: Final[tuple[int, ...]] = (3, 6)
+
+AddStats = dict[str, Callable[..., Any]]
+
+
+class UnsupportedZonesError(ValueError):
+    """Raised when the inputs need the per-feature rasterstats fallback."""
+
+
+@dataclass
+class ZoneLabels:
+    """Zones burnt into label rasters on a (possibly extended) raster grid.
+
+    Each layer holds ``zone index + 1`` for covered pixels and 0 elsewhere.
+    Overlapping zones are spread over several layers so that every pixel of
+    every zone is counted, exactly like per-feature rasterization.
+    """
+
+    layers: list[np.ndarray]
+    # Position of the label grid relative to the raster; may extend beyond it.
+    window: Window
+    transform: Affine
+    n_zones: int
+    # Per-zone (row_start, row_stop, col_start, col_stop) within the label grid.
+    zone_windows: np.ndarray
+
+
+def _bounds_window(
+    bounds: tuple[float, float, float, float], transform: Affine
+) -> tuple[int, int, int, int]:
+    """Return the (row_start, row_stop, col_start, col_stop) covering bounds.
+
+    Mirrors ``rasterstats.io.bounds_window`` so that zones cover the same pixels.
+    """
+    west, south, east, north = bounds
+    row_start = int(math.floor((north - transform.f) / transform.e))
+    col_start = int(math.floor((west - transform.c) / transform.a))
+    row_stop = int(math.ceil((south - transform.f) / transform.e))
+    col_stop = int(math.ceil((east - transform.c) / transform.a))
+    return row_start, row_stop, col_start, col_stop
+
+
+def _overlap_layers(geometries: np.ndarray) -> list[list[int]]:
+    """Group zone indexes into layers whose members never share interior area.
+
+    Neighbouring admin boundaries only touch, so they all end up in the first
+    layer; nested or overlapping zones (e.g. storm buffers) get extra layers.
+    """
+    tree = shapely.STRtree(geometries)
+    left, right = tree.query(geometries, predicate="intersects")
+    candidates = left < right
+    left, right = left[candidates], right[candidates]
+    if left.size > 0:
+        overlapping = ~shapely.touches(geometries[left], geometries[right])
+        left, right = left[overlapping], right[overlapping]
+
+    conflicts: dict[int, set[int]] = {}
+    for a, b in zip(left.tolist(), right.tolist()):
+        conflicts.setdefault(a, set()).add(b)
+        conflicts.setdefault(b, set()).add(a)
+
+    layers: list[list[int]] = []
+    layer_of: dict[int, int] = {}
+    for index in range(len(geometries)):
+        taken = {layer_of[n] for n in conflicts.get(index, ()) if n in layer_of}
+        layer = next(i for i in range(len(layers) + 1) if i not in taken)
+        if layer == len(layers):
+            layers.append([])
+        layers[layer].append(index)
+        layer_of[index] = layer
+    return layers
+
+
+def _parse_geometries(features: Sequence[GeoJSONFeature]) -> np.ndarray:
+    """Convert GeoJSON features into a shapely geometry array."""
+    geometries = []
+    for feature in features:
+        geometry = feature.get("geometry")
+        if not geometry:
+            raise UnsupportedZonesError("Feature without geometry.")
+        geometries.append(shape(geometry))
+    return _check_geometries(np.array(geometries, dtype=object))
+
+
+def _check_geometries(geometries: np.ndarray) -> np.ndarray:
+    """Make sure every geometry is a non-empty Polygon or MultiPolygon."""
+    if shapely.is_missing(geometries).any():
+        raise UnsupportedZonesError("Feature without geometry.")
+    unsupported = shapely.is_empty(geometries) | ~np.isin(
+        shapely.get_type_id(geometries), _POLYGON_TYPE_IDS
+    )
+    if unsupported.any():
+        geom = geometries[np.argmax(unsupported)]
+        raise UnsupportedZonesError(f"Unsupported geometry {geom.geom_type}.")
+    return geometries
+
+
+def _zones_windows(geometries: np.ndarray, transform: Affine) -> np.ndarray:
+    """Per-zone (row_start, row_stop, col_start, col_stop) on the raster grid."""
+    return np.array(
+        [_bounds_window(tuple(b), transform) for b in shapely.bounds(geometries)]
+    ).reshape(-1, 4)
+
+
+def _union_window(windows: np.ndarray) -> Window:
+    row_start, col_start = int(windows[:, 0].min()), int(windows[:, 2].min())
+    row_stop, col_stop = int(windows[:, 1].max()), int(windows[:, 3].max())
+    return Window(
+        col_off=col_start,
+        row_off=row_start,
+        width=col_stop - col_start,
+        height=row_stop - row_start,
+    )
+
+
+def _rasterize_layers(
+    geometries: np.ndarray,
+    layers: list[list[int]],
+    window: Window,
+    transform: Affine,
+) -> list[np.ndarray]:
+    """Burn each layer of zones into an int32 label array covering window."""
+    window_transform = transform @ Affine.translation(window.col_off, window.row_off)
+    return [
+        rasterize(
+            [(geometries[i], i + 1) for i in members],
+            out_shape=(window.height, window.width),
+            transform=window_transform,
+            fill=0,
+            dtype="int32",
+            all_touched=False,
+        )
+        for members in layers
+        if len(members) > 0
+    ]
+
+
+def rasterize_zones(geometries: np.ndarray, transform: Affine) -> ZoneLabels:
+    """Burn zone geometries into label rasters aligned to the raster transform."""
+    windows = _zones_windows(geometries, transform)
+    window = _union_window(windows)
+    return ZoneLabels(
+        layers=_rasterize_layers(
+            geometries, _overlap_layers(geometries), window, transform
+        ),
+        window=window,
+        transform=transform @ Affine.translation(window.col_off, window.row_off),
+        n_zones=len(geometries),
+        zone_windows=windows
+        - [window.row_off, window.row_off, window.col_off, window.col_off],
+    )
+
+
+def _grid_key(src) -> str:
+    """Identify a raster grid by its CRS, transform and shape."""
+    crs = src.crs.to_wkt() if src.crs is not None else ""
+    return f"{crs}|{tuple(src.transform)}|{src.shape}"
+
+
+def _zone_labels_path(zones_key: str, grid_key: str) -> FilePath:
+    return caching._get_cached_filepath(
+        prefix=ZONE_LABELS_PREFIX,
+        cache_lookup=f"{zones_key}|{grid_key}",
+        hash_lookup=True,
+        extension="npz",
+    )
+
+
+def _save_zone_labels(filepath: FilePath, zone_labels: ZoneLabels) -> None:
+    """Write label rasters as a compressed .npz, atomically."""
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_filepath, "wb") as f:
+        np.savez_compressed(
+            f,
+            layers=np.stack(zone_labels.layers),
+            window=np.array(
+                [
+                    zone_labels.window.col_off,
+                    zone_labels.window.row_off,
+                    zone_labels.window.width,
+                    zone_labels.window.height,
+                ]
+            ),
+            transform=np.array(tuple(zone_labels.transform)[:6]),
+            zone_windows=zone_labels.zone_windows,
+        )
+    os.replace(tmp_filepath, filepath)
+
+
+def _load_zone_labels(filepath: FilePath) -> Optional[ZoneLabels]:
+    try:
+        with np.load(filepath) as data:
+            layers = data["layers"]
+            col_off, row_off, width, height = data["window"].tolist()
+            zone_labels = ZoneLabels(
+                layers=list(layers),
+                window=Window(col_off, row_off, width, height),
+                transform=Affine(*data["transform"].tolist()),
+                n_zones=len(data["zone_windows"]),
+                zone_windows=data["zone_windows"],
+            )
+    except (OSError, ValueError, KeyError) as error:
+        logger.warning("Ignoring unreadable zone labels %s: %s", filepath, error)
+        return None
+    # Record the access for LRU eviction.
+    os.utime(filepath)
+    return zone_labels
+
+
+def _evict_zone_labels(max_bytes: int) -> None:
+    """Delete least recently used zone label files beyond the size budget."""
+    pattern = os.path.join(caching.CACHE_DIRECTORY, f"{ZONE_LABELS_PREFIX}_*.npz")
+    entries = []
+    for filepath in glob.glob(pattern):
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, filepath))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, filepath in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(filepath)
+            logger.info("Evicted zone labels %s", filepath)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _cached_zone_labels(src, zones_key: str, n_zones: int) -> Optional[ZoneLabels]:
+    filepath = _zone_labels_path(zones_key, _grid_key(src))
+    if not os.path.isfile(filepath):
+        return None
+    zone_labels = _load_zone_labels(filepath)
+    if zone_labels is None or zone_labels.n_zones != n_zones:
+        return None
+    logger.debug("Using cached zone labels %s", filepath)
+    return zone_labels
+
+
+def _cache_zone_labels(src, zones_key: str, zone_labels: ZoneLabels) -> None:
+    filepath = _zone_labels_path(zones_key, _grid_key(src))
+    try:
+        _save_zone_labels(filepath, zone_labels)
+        _evict_zone_labels(ZONE_LABELS_CACHE_MAX_BYTES)
+    except OSError as error:
+        logger.warning("Could not cache zone labels %s: %s", filepath, error)
+
+
+def _read_values(src, window: Window) -> np.ndarray:
+    """Read band 1 for a window that may extend beyond the raster extent.
+
+    Pixels outside the raster are filled the same way as a rasterio boundless
+    read: with the nodata value, or 0 when the raster declares none.
+    """
+    fill = src.nodata if src.nodata is not None else 0
+    values = np.full((window.height, window.width), fill, dtype=src.dtypes[0])
+
+    row_start = max(window.row_off, 0)
+    col_start = max(window.col_off, 0)
+    row_stop = min(window.row_off + window.height, src.height)
+    col_stop = min(window.col_off + window.width, src.width)
+    if row_start >= row_stop or col_start >= col_stop:
+        return values
+
+    values[
+        row_start - window.row_off : row_stop - window.row_off,
+        col_start - window.col_off : col_stop - window.col_off,
+    ] = src.read(
+        1,
+        window=Window(col_start, row_start, col_stop - col_start, row_stop - row_start),
+    )
+    return values
+
+
+class MedianSketch:
+    """Mergeable quantile sketch made of weighted compactors.
+
+    Values are kept exactly until a level holds more than ``capacity`` items;
+    that level is then sorted and every other item is promoted to the next
+    level with twice the weight. With ``capacity=None`` every value is kept and
+    the median is exact.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity
+        self.levels: list[list[np.ndarray]] = [[]]
+        self.sizes: list[int] = [0]
+        self._offset = 0
+
+    def add(self, values: np.ndarray, level: int = 0) -> None:
+        if values.size == 0:
+            return
+        while len(self.levels) <= level:
+            self.levels.append([])
+            self.sizes.append(0)
+        self.levels[level].append(values)
+        self.sizes[level] += values.size
+        if self.capacity is not None and self.sizes[level] > self.capacity:
+            self._compact(level)
+
+    def _compact(self, level: int) -> None:
+        items = np.sort(np.concatenate(self.levels[level]))
+        # Keep one item behind when odd so that the total weight is preserved.
+        remainder = items[-1:] if items.size % 2 else items[:0]
+        paired = items[: items.size - remainder.size]
+        # Alternate the kept half between compactions to avoid bias.
+        self._offset ^= 1
+        self.levels[level] = [remainder]
+        self.sizes[level] = remainder.size
+        self.add(paired[self._offset :: 2], level + 1)
+
+    def merge(self, other: "MedianSketch") -> None:
+        for level, arrays in enumerate(other.levels):
+            for values in arrays:
+                self.add(values, level)
+
+    def values(self) -> np.ndarray:
+        """Return every value; only meaningful while the sketch is exact."""
+        return np.concatenate(self.levels[0]) if self.levels[0] else np.empty(0)
+
+    def median(self) -> float:
+        if len(self.levels) == 1:
+            items = np.sort(self.values())
+            count = items.size
+            return (float(items[(count - 1) // 2]) + float(items[count // 2])) / 2
+
+        items = np.concatenate([np.concatenate(a) for a in self.levels if a])
+        weights = np.concatenate(
+            [
+                np.full(sum(v.size for v in arrays), 2**level)
+                for level, arrays in enumerate(self.levels)
+                if arrays
+            ]
+        )
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, cumulative[-1] / 2)
+        return float(items[order][index])
+
+
+class ZoneAccumulator:
+    """Mergeable per-zone partial aggregates for zonal statistics.
+
+    Tracks count, nodata count, sum, min, max, the running mean and sum of
+    squared deviations (merged with Chan's formula, which keeps ``std`` stable
+    across blocks) and a median sketch per zone.
+    """
+
+    def __init__(self, n_zones: int, sketch_capacity: Optional[int] = None):
+        self.n_zones = n_zones
+        self.sketch_capacity = sketch_capacity
+        self.count = np.zeros(n_zones, dtype=np.int64)
+        self.nodata = np.zeros(n_zones, dtype=np.int64)
+        self.sum = np.zeros(n_zones, dtype=np.float64)
+        self.mean = np.zeros(n_zones, dtype=np.float64)
+        self.m2 = np.zeros(n_zones, dtype=np.float64)
+        self.min = np.full(n_zones, np.inf)
+        self.max = np.full(n_zones, -np.inf)
+        self.sketches: dict[int, MedianSketch] = {}
+
+    def _sketch(self, zone: int) -> MedianSketch:
+        if zone not in self.sketches:
+            self.sketches[zone] = MedianSketch(self.sketch_capacity)
+        return self.sketches[zone]
+
+    def _merge_moments(
+        self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray
+    ) -> None:
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(count > 0, mean - self.mean, 0.0)
+            weight = np.where(total > 0, count / total, 0.0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta * delta * self.count * weight
+        self.count = total
+
+    def update(self, zone_ids: np.ndarray, values: np.ndarray, nodata: float) -> None:
+        """Add the pixels of one block; ``zone_ids`` are 0-based zone indexes."""
+        n_zones = self.n_zones
+        is_nodata = values == nodata
+        self.nodata += np.bincount(zone_ids[is_nodata], minlength=n_zones)
+        if np.issubdtype(values.dtype, np.floating):
+            is_nodata |= np.isnan(values)
+
+        valid = ~is_nodata
+        valid_ids = zone_ids[valid]
+        valid_values = values[valid]
+        if valid_values.size == 0:
+            return
+
+        count = np.bincount(valid_ids, minlength=n_zones)
+        block_sum = np.bincount(
+            valid_ids, weights=valid_values.astype(np.float64), minlength=n_zones
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, block_sum / count, 0.0)
+        deviations = valid_values.astype(np.float64) - mean[valid_ids]
+        m2 = np.bincount(valid_ids, weights=deviations * deviations, minlength=n_zones)
+        self.sum += block_sum
+        self._merge_moments(count, mean, m2)
+
+        # Sorting by (zone, value) groups each zone's pixels contiguously, giving
+        # min, max and sketch inputs by position.
+        sorted_values = valid_values[np.lexsort((valid_values, valid_ids))]
+        ends = np.cumsum(count)
+        starts = ends - count
+        zones = np.flatnonzero(count)
+        self.min[zones] = np.minimum(self.min[zones], sorted_values[starts[zones]])
+        self.max[zones] = np.maximum(self.max[zones], sorted_values[ends[zones] - 1])
+        for zone in zones.tolist():
+            self._sketch(zone).add(sorted_values[starts[zone] : ends[zone]])
+
+    def merge(self, other: "ZoneAccumulator") -> None:
+        """Fold in the aggregates of another accumulator over the same zones."""
+        self.nodata += other.nodata
+        self.sum += other.sum
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self._merge_moments(other.count, other.mean, other.m2)
+        for zone, sketch in other.sketches.items():
+            self._sketch(zone).merge(sketch)
+
+    def zone_values(self, zone: int) -> np.ndarray:
+        """Valid pixel values of a zone; requires an exact (unbounded) sketch."""
+        sketch = self.sketches.get(zone)
+        return sketch.values() if sketch is not None else np.empty(0)
+
+    def zone_stats(self, zone: int, stats: list[str]) -> dict[str, Any]:
+        """Stats for one zone, formatted the way rasterstats reports them."""
+        count = int(self.count[zone])
+        if count == 0:
+            feature_stats: dict[str, Any] = {stat: None for stat in stats}
+            if "count" in stats:
+                feature_stats["count"] = 0
+        else:
+            feature_stats = {}
+            if "min" in stats:
+                feature_stats["min"] = float(self.min[zone])
+            if "max" in stats:
+                feature_stats["max"] = float(self.max[zone])
+            if "mean" in stats:
+                feature_stats["mean"] = float(self.sum[zone] / count)
+            if "count" in stats:
+                feature_stats["count"] = count
+            if "sum" in stats:
+                feature_stats["sum"] = float(self.sum[zone])
+            if "std" in stats:
+                feature_stats["std"] = math.sqrt(self.m2[zone] / count)
+            if "median" in stats:
+                feature_stats["median"] = self.sketches[zone].median()
+        if "nodata" in stats:
+            feature_stats["nodata"] = float(self.nodata[zone])
+        return feature_stats
+
+
+def _accumulate(
+    accumulator: ZoneAccumulator,
+    values: np.ndarray,
+    layers: list[np.ndarray],
+    nodata: float,
+) -> None:
+    for labels in layers:
+        in_zone = labels > 0
+        accumulator.update(
+            labels[in_zone].astype(np.int64) - 1, values[in_zone], nodata
+        )
+
+
+def _in_memory_bytes(window: Window, dtype: str) -> int:
+    """Estimate the footprint of aggregating a whole window at once."""
+    bytes_per_pixel = np.dtype(dtype).itemsize + _WORKING_BYTES_PER_PIXEL
+    return window.width * window.height * bytes_per_pixel
+
+
+def _block_windows(src, window: Window, budget: int) -> Iterator[Window]:
+    """Split window into chunks aligned to the raster's internal blocks.
+
+    Chunks are whole multiples of the (COG) block size, as wide as the budget
+    allows, so each internal tile is decoded once.
+    """
+    block_height, block_width = src.block_shapes[0]
+    bytes_per_pixel = np.dtype(src.dtypes[0]).itemsize + _WORKING_BYTES_PER_PIXEL
+    blocks_in_budget = max(1, budget // (bytes_per_pixel * block_height * block_width))
+    col_blocks = min(blocks_in_budget, -(-window.width // block_width) + 1)
+    row_blocks = max(1, blocks_in_budget // col_blocks)
+    chunk_height = row_blocks * block_height
+    chunk_width = col_blocks * block_width
+
+    row_stop = window.row_off + window.height
+    col_stop = window.col_off + window.width
+    first_row = (window.row_off // block_height) * block_height
+    first_col = (window.col_off // block_width) * block_width
+    for row in range(first_row, row_stop, chunk_height):
+        for col in range(first_col, col_stop, chunk_width):
+            chunk_row = max(row, window.row_off)
+            chunk_col = max(col, window.col_off)
+            yield Window(
+                col_off=chunk_col,
+                row_off=chunk_row,
+                width=min(col + chunk_width, col_stop) - chunk_col,
+                height=min(row + chunk_height, row_stop) - chunk_row,
+            )
+
+
+def _count_blocks(src, window: Window) -> int:
+    """Number of internal raster blocks a window touches inside the raster."""
+    block_height, block_width = src.block_shapes[0]
+    row_start = max(window.row_off, 0)
+    row_stop = min(window.row_off + window.height, src.height)
+    col_start = max(window.col_off, 0)
+    col_stop = min(window.col_off + window.width, src.width)
+    if row_start >= row_stop or col_start >= col_stop:
+        return 0
+    rows = (row_stop - 1) // block_height - row_start // block_height + 1
+    cols = (col_stop - 1) // block_width - col_start // block_width + 1
+    return rows * cols
+
+
+def _stream_zones(
+    src,
+    geometries: np.ndarray,
+    window: Window,
+    nodata: float,
+    budget: int,
+) -> ZoneAccumulator:
+    """Aggregate zones chunk by chunk, keeping memory within budget."""
+    accumulator = ZoneAccumulator(len(geometries), MEDIAN_SKETCH_CAPACITY)
+    layers = _overlap_layers(geometries)
+    layer_of = np.zeros(len(geometries), dtype=np.int64)
+    for layer, members in enumerate(layers):
+        layer_of[members] = layer
+    tree = shapely.STRtree(geometries)
+
+    chunks_read = blocks_read = 0
+    for chunk in _block_windows(src, window, budget):
+        west, north = src.transform @ (chunk.col_off, chunk.row_off)
+        east, south = src.transform @ (
+            chunk.col_off + chunk.width,
+            chunk.row_off + chunk.height,
+        )
+        candidates = tree.query(
+            shapely.box(
+                min(west, east), min(south, north), max(west, east), max(south, north)
+            )
+        )
+        if candidates.size == 0:
+            continue
+
+        chunk_layers = [
+            candidates[layer_of[candidates] == layer].tolist()
+            for layer in range(len(layers))
+        ]
+        labels = _rasterize_layers(geometries, chunk_layers, chunk, src.transform)
+        if not any(layer.any() for layer in labels):
+            continue
+
+        _accumulate(accumulator, _read_values(src, chunk), labels, nodata)
+        chunks_read += 1
+        blocks_read += _count_blocks(src, chunk)
+
+    increment("chunks_read", chunks_read)
+    increment("blocks_read", blocks_read)
+    # ru_maxrss is in kilobytes on Linux.
+    record("peak_rss_mb", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+    return accumulator
+
+
+def _apply_add_stats(
+    feature_stats: dict[str, Any],
+    add_stats: AddStats,
+    masked: np.ma.MaskedArray,
+    properties: Callable[[], dict],
+) -> None:
+    """Run the extra stat callables, passing properties to two-argument ones.
+
+    Properties are only looked up when a callable takes them.
+    """
+    for stat_name, stat_func in add_stats.items():
+        if len(inspect.signature(stat_func).parameters) == 2:
+            feature_stats[stat_name] = stat_func(masked, properties())
+        else:
+            feature_stats[stat_name] = stat_func(masked)
+
+
+def _check_inputs(stats: list[str], add_stats: Optional[AddStats]) -> None:
+    unsupported = [s for s in stats if s not in SUPPORTED_STATS]
+    if unsupported:
+        raise UnsupportedZonesError(f"Unsupported stats {unsupported}.")
+    for stat_func in (add_stats or {}).values():
+        if len(inspect.signature(stat_func).parameters) > 2:
+            raise UnsupportedZonesError("add_stats functions need the zone raster.")
+
+
+def compute_zonal_stats(
+    features: Sequence[GeoJSONFeature],
+    geotiff: FilePath | MaskedRaster,
+    stats: list[str] | str,
+    prefix: Optional[str] = None,
+    geojson_out: bool = False,
+    add_stats: Optional[AddStats] = None,
+    zones_key: Optional[str] = None,
+    memory_budget: int = ZONAL_STATS_MEMORY_BUDGET,
+    zone_labels_cache: Optional[dict[str, ZoneLabels]] = None,
+    geometries: Optional[np.ndarray] = None,
+) -> list[dict[str, Any]]:
+    """
+    Compute zonal statistics for all features with one rasterization pass.
+
+    Zones whose extent fits ``memory_budget`` are aggregated in one go; larger
+    extents are streamed in block-aligned chunks, merging per-zone partial
+    aggregates across chunks and estimating medians with a bounded sketch.
+
+    Parameters
+    ----------
+    features : Sequence[GeoJSONFeature]
+        Polygon or MultiPolygon features, in the raster CRS. Only indexed for
+        their properties (and geometry, unless ``geometries`` is given).
+    geotiff : FilePath | MaskedRaster
+        Path to the raster, or an in-process masked raster; only band 1 is used.
+    stats : list[str] | str
+        Stats to compute, among ``SUPPORTED_STATS``.
+    prefix : str, optional
+        Prefix added to each stat key, as in rasterstats.
+    geojson_out : bool
+        Return the features with stats merged into their properties.
+    add_stats : dict, optional
+        Extra stats; each callable receives a 1-D masked array of the zone's
+        valid pixels (and optionally the feature properties).
+    zones_key : str, optional
+        Hash of the zones content; enables the zone label cache.
+    memory_budget : int
+        Approximate bytes allowed for raster values and labels at once.
+    zone_labels_cache : dict, optional
+        In-process zone labels per raster grid, filled and reused across calls
+        over the same features (e.g. a time series of rasters).
+    geometries : np.ndarray, optional
+        Shapely geometries of the features, in order; parsed from the features
+        when not given.
+
+    Returns
+    -------
+    list
+        One dict (or feature) per input feature, in input order, with the same
+        keys rasterstats would produce.
+
+    Raises
+    ------
+    UnsupportedZonesError
+        When the inputs need the rasterstats fallback.
+    """
+    stats = stats.split() if isinstance(stats, str) else list(stats)
+    _check_inputs(stats, add_stats)
+    if len(features) == 0:
+        return []
+
+    with open_raster(geotiff) as src:
+        if all(MaskFlags.per_dataset in flags for flags in src.mask_flag_enums):
+            raise UnsupportedZonesError("Rasters with dataset masks are not supported.")
+        nodata = src.nodata if src.nodata is not None else RASTERSTATS_DEFAULT_NODATA
+        dtype = src.dtypes[0]
+
+        grid_key = _grid_key(src)
+        zone_labels = (zone_labels_cache or {}).get(grid_key)
+        if zone_labels is None and zones_key is not None:
+            zone_labels = _cached_zone_labels(src, zones_key, len(features))
+
+        if zone_labels is None:
+            geometries = (
+                _parse_geometries(features)
+                if geometries is None
+                else _check_geometries(geometries)
+            )
+            window = _union_window(_zones_windows(geometries, src.transform))
+            if _in_memory_bytes(window, dtype) > memory_budget:
+                if add_stats is not None:
+                    raise UnsupportedZonesError(
+                        "add_stats need every zone pixel in memory."
+                    )
+                logger.info(
+                    "Streaming zonal stats over %dx%d pixels.",
+                    window.width,
+                    window.height,
+                )
+                with span("compute"):
+                    accumulator = _stream_zones(
+                        src, geometries, window, nodata, memory_budget
+                    )
+            else:
+                with span("rasterize"):
+                    zone_labels = rasterize_zones(geometries, src.transform)
+                if zones_key is not None:
+                    _cache_zone_labels(src, zones_key, zone_labels)
+
+        if zone_labels is not None:
+            if zone_labels_cache is not None:
+                zone_labels_cache[grid_key] = zone_labels
+            accumulator = ZoneAccumulator(len(features))
+            with span("compute"):
+                _accumulate(
+                    accumulator,
+                    _read_values(src, zone_labels.window),
+                    zone_labels.layers,
+                    nodata,
+                )
+
+    output = []
+    for index in range(len(features)):
+        feature_stats = accumulator.zone_stats(index, stats)
+        if add_stats is not None:
+            _apply_add_stats(
+                feature_stats,
+                add_stats,
+                np.ma.MaskedArray(accumulator.zone_values(index).astype(dtype)),
+                lambda: features[index].get("properties") or {},
+            )
+
+        if prefix is not None:
+            feature_stats = {f"{prefix}{k}": v for k, v in feature_stats.items()}
+
+        if geojson_out:
+            feature = features[index]
+            output.append(
+                {
+                    **feature,
+                    "properties": {
+                        **(feature.get("properties") or {}),
+                        **feature_stats,
+                    },
+                }
+            )
+        else:
+            output.append(feature_stats)
+
+    return output
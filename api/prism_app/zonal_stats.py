@@ -1,19 +1,34 @@
 """Calulate zonal statistics and return a json or a geojson."""
 
+import hashlib
 import logging
 import os
 import re
-from collections import defaultdict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from datetime import datetime
-from json import dump, load
-from typing import Any, NewType, Optional
+from functools import lru_cache
+from json import dump, load, loads
+from typing import Any, Final, Iterable, Iterator, Literal, NewType, Optional, Sequence
 from urllib.parse import urlencode
 
+import numpy as np
 import prism_app.caching as caching
 import rasterio  # type: ignore
+import shapely  # type: ignore
 from fastapi import HTTPException
-from prism_app.caching import _hash_value, cache_file, get_json_file, is_file_valid
-from prism_app.duckdb_utils import setup_duckdb_connection
+from prism_app.caching import (
+    _download_lock,
+    _get_cached_filepath,
+    _hash_value,
+    cache_file,
+    get_json_file,
+    is_file_valid,
+    write_manifest,
+)
+from prism_app.dissolve import dissolve_groups
+from prism_app.duckdb_utils import duckdb_pool
+from prism_app.metrics import span
 from prism_app.models import (
     FilePath,
     GeoJSON,
@@ -22,21 +37,45 @@ from prism_app.models import (
     WfsParamsModel,
     WfsResponse,
 )
-from prism_app.raster_utils import calculate_pixel_area, gdal_calc, reproj_match
+from prism_app.raster_utils import (
+    InvalidCalcExprError,
+    MaskedRaster,
+    calculate_pixel_area,
+    write_raster,
+)
+from prism_app.result_cache import file_fingerprint, result_key, stats_result_cache
+from prism_app.simplified_zones import get_simplified_zones, snap_tolerance
 from prism_app.timer import timed
 from prism_app.validation import VALID_OPERATORS
-from rasterio.warp import Resampling
+from prism_app.zonal_engine import (
+    ZONAL_STATS_ENGINE,
+    UnsupportedZonesError,
+    ZoneLabels,
+    compute_zonal_stats,
+)
+from rasterio.warp import transform_bounds  # type: ignore
 from rasterstats import zonal_stats  # type: ignore
-from shapely.errors import GEOSException  # type: ignore
 from shapely.geometry import mapping, shape  # type: ignore
-from shapely.ops import unary_union  # type: ignore
 
 logger = logging.getLogger(__name__)
 
+# Write in-process masked rasters to the cache instead of only streaming them.
+MASKED_RASTER_PERSIST: Final[bool] = (
+    os.getenv("MASKED_RASTER_PERSIST", "false").strip().lower() == "true"
+)
+
 DEFAULT_STATS = ["min", "max", "mean", "median", "sum", "std", "count", "nodata"]
 
 AreaInSqKm = NewType("AreaInSqKm", float)
 Percentage = NewType("Percentage", float)
+# Keep zones intersecting, or entirely contained in, a bounding box.
+BboxPredicate = Literal["intersects", "contains"]
+
+# Cached intersections of zones with WFS responses.
+WFS_INTERSECTION_PREFIX: Final[str] = "wfs_intersection"
+
+# GeoParquet 1.1 bbox covering column, written by scripts/rewrite_zones_parquet.py.
+BBOX_COLUMN: Final[str] = "bbox"
 
 
 def get_wfs_response(wfs_params: WfsParamsModel) -> WfsResponse:
@@ -76,6 +115,7 @@ def _read_zones(
     bbox: Optional[tuple[float, float, float, float]] = None,
     simplify_tolerance: Optional[float] = None,
     iso3_filter: Optional[str] = None,
+    bbox_predicate: BboxPredicate = "contains",
 ) -> GeoJSON:
     """
     Read the zones file from either a local GeoJSON or an S3-hosted (or local) GeoParquet,
@@ -88,9 +128,12 @@ def _read_zones(
     bbox : tuple[float, float, float, float], optional
         (minx, miny, maxx, maxy) in the same CRS as the zones data,
         used to limit what is read from the parquet dataset.
+    bbox_predicate : "intersects" or "contains"
+        Keep zones intersecting the bbox, or only those it contains.
     simplify_tolerance : float, optional
-        Tolerance value for geometry simplification. Only used for
-        parquet files. If None, no simplification is applied.
+        Tolerance value for geometry simplification, snapped down to a stored
+        level (see simplified_zones). Only used for parquet files. If None,
+        no simplification is applied.
 
     Returns
     -------
@@ -98,42 +141,19 @@ def _read_zones(
         A GeoJSON-style dictionary: {"type": "FeatureCollection", "features": [...]}
     """
     # Check if filepath contains .json or .geojson (case insensitive)
-    filepath_lower = zones_filepath.lower()
-    if ".parquet" in filepath_lower:
-        con = setup_duckdb_connection()
-        # Create a temporary view for the filtered data
-        view_name = "filtered_zones"
-        query = f"CREATE VIEW {view_name} AS SELECT *"
-        if simplify_tolerance is not None:
-            query += f" exclude(geometry), ST_Simplify(geometry, {simplify_tolerance}) AS geometry"
-        query += f" FROM read_parquet('{zones_filepath}', hive_partitioning=true)"
-        conditions: list[str] = []
-        if admin_level is not None:
-            conditions.append(f"admin_level = {admin_level}")
-        if iso3_filter is not None:
-            safe_iso3 = iso3_filter.replace("'", "''")
-            conditions.append(f"iso3 = '{safe_iso3}'")
-        if bbox is not None:
-            minx, miny, maxx, maxy = bbox
-            conditions.append(
-                f"ST_Contains(ST_MakeEnvelope({minx}, {miny}, {maxx}, {maxy}), geometry)"
-            )
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        con.execute(query)
-        # Export to temp GeoJSON using GDAL extension
-        temp_geojson = os.path.join(caching.CACHE_DIRECTORY, "temp_zones.geojson")
-        con.sql(f"""
-            COPY {view_name} TO '{temp_geojson}'
-            WITH (FORMAT GDAL, DRIVER 'GeoJSON', LAYER_CREATION_OPTIONS 'WRITE_BBOX=YES')
-            """)
-
-        with open(temp_geojson, "r") as f:
-            geojson_data = load(f)
-
-        con.close()
-        os.remove(temp_geojson)
-        return geojson_data
+    if ".parquet" in zones_filepath.lower():
+        columns = _query_parquet_zones(
+            zones_filepath,
+            admin_level=admin_level,
+            bbox=bbox,
+            simplify_tolerance=simplify_tolerance,
+            iso3_filter=iso3_filter,
+            bbox_predicate=bbox_predicate,
+        )
+        return {
+            "type": "FeatureCollection",
+            "features": _features_from_columns(columns),
+        }
 
     else:
         # Handle JSON or cache files
@@ -141,29 +161,166 @@ def _read_zones(
             return load(f)
 
 
-def _extract_features_properties(
-    zones_filename: FilePath,
+def _has_bbox_column(zones_filepath: FilePath) -> bool:
+    """Whether a GeoParquet dataset has a bbox covering column."""
+    try:
+        # A rewritten local file is described again.
+        modified_at: Optional[float] = os.path.getmtime(zones_filepath)
+    except OSError:
+        modified_at = None
+    return _describe_has_bbox_column(zones_filepath, modified_at)
+
+
+@lru_cache(maxsize=64)
+def _describe_has_bbox_column(
+    zones_filepath: FilePath, modified_at: Optional[float]
+) -> bool:
+    with duckdb_pool.cursor() as cursor:
+        columns = cursor.execute(
+            "DESCRIBE SELECT * FROM"
+            f" read_parquet('{zones_filepath}', hive_partitioning=true)"
+        ).fetchall()
+    return any(column[0] == BBOX_COLUMN for column in columns)
+
+
+def _bbox_conditions(
+    bbox: tuple[float, float, float, float],
+    bbox_predicate: BboxPredicate,
+    has_bbox_column: bool,
+) -> list[str]:
+    """SQL conditions keeping the zones that intersect or are within bbox.
+
+    With a bbox covering column, plain comparisons on its fields are checked
+    against row group statistics, so row groups out of the bbox are skipped
+    without reading, let alone deserializing, their geometries. A zone is
+    contained in the bbox exactly when its own bbox is, while intersecting
+    bboxes still need an exact test on the remaining geometries.
+    """
+    minx, miny, maxx, maxy = bbox
+    envelope = f"ST_MakeEnvelope({minx}, {miny}, {maxx}, {maxy})"
+    if not has_bbox_column:
+        predicate = "ST_Intersects" if bbox_predicate == "intersects" else "ST_Contains"
+        return [f"{predicate}({envelope}, geometry)"]
+
+    if bbox_predicate == "contains":
+        return [
+            f"{BBOX_COLUMN}.xmin >= {minx}",
+            f"{BBOX_COLUMN}.ymin >= {miny}",
+            f"{BBOX_COLUMN}.xmax <= {maxx}",
+            f"{BBOX_COLUMN}.ymax <= {maxy}",
+        ]
+    return [
+        f"{BBOX_COLUMN}.xmin <= {maxx}",
+        f"{BBOX_COLUMN}.ymin <= {maxy}",
+        f"{BBOX_COLUMN}.xmax >= {minx}",
+        f"{BBOX_COLUMN}.ymax >= {miny}",
+        f"ST_Intersects({envelope}, geometry)",
+    ]
+
+
+def _query_parquet_zones(
+    zones_filepath: FilePath,
     admin_level: Optional[int] = None,
+    bbox: Optional[tuple[float, float, float, float]] = None,
     simplify_tolerance: Optional[float] = None,
     iso3_filter: Optional[str] = None,
-) -> list:
-    zones = _read_zones(
-        zones_filename,
-        admin_level=admin_level,
-        simplify_tolerance=simplify_tolerance,
-        iso3_filter=iso3_filter,
+    bbox_predicate: BboxPredicate = "contains",
+) -> dict[str, np.ndarray]:
+    """Query a GeoParquet zones dataset into columns, with WKB geometries.
+
+    Columns are fetched as numpy arrays straight from DuckDB, without
+    serializing the zones to GeoJSON. Filters on hive partition columns
+    (iso3, admin_level) skip whole files. Simplified zones are read from the
+    stored level of the ladder that simplify_tolerance snaps to, built for
+    these filters only.
+    """
+    conditions: list[str] = []
+    if admin_level is not None:
+        conditions.append(f"admin_level = {admin_level}")
+    if iso3_filter is not None:
+        safe_iso3 = iso3_filter.replace("'", "''")
+        conditions.append(f"iso3 = '{safe_iso3}'")
+    has_bbox_column = _has_bbox_column(zones_filepath)
+    level = snap_tolerance(simplify_tolerance)
+    if level is not None:
+        zones_filepath = get_simplified_zones(
+            zones_filepath, level, conditions, has_bbox_column=has_bbox_column
+        )
+    # The covering column is an index, not a property of the zones.
+    excluded = f"geometry, {BBOX_COLUMN}" if has_bbox_column else "geometry"
+    query = (
+        f"SELECT * EXCLUDE ({excluded}), ST_AsWKB(geometry) AS geometry"
+        f" FROM read_parquet('{zones_filepath}', hive_partitioning=true)"
+    )
+    if bbox is not None:
+        conditions += _bbox_conditions(bbox, bbox_predicate, has_bbox_column)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    with duckdb_pool.cursor() as cursor:
+        return cursor.execute(query).fetchnumpy()
+
+
+def _json_value(value: Any) -> Any:
+    """Keep JSON types, write dates in ISO format and stringify the rest."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _object_array(values: Iterable[Any]) -> np.ndarray:
+    """1-D object array, keeping list or dict values as single elements."""
+    return np.fromiter(values, dtype=object)
+
+
+def _zones_table(
+    columns: dict[str, np.ndarray], geometry_column: str = "geometry"
+) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """Split DuckDB columns into JSON-ready property columns and geometries."""
+    # DuckDB returns BLOBs as bytearray, which shapely does not accept.
+    geometries = shapely.from_wkb(
+        [None if wkb is None else bytes(wkb) for wkb in columns[geometry_column]]
     )
-    return [f["properties"] for f in zones.get("features", [])]
+    properties = {
+        name: _object_array(_json_value(value) for value in column.tolist())
+        for name, column in columns.items()
+        if name != geometry_column
+    }
+    return properties, geometries
+
+
+def _features_from_columns(
+    columns: dict[str, np.ndarray], geometry_column: str = "geometry"
+) -> list[GeoJSONFeature]:
+    """Build GeoJSON features from columns of properties and WKB geometries."""
+    properties, geometries = _zones_table(columns, geometry_column)
+    return [
+        {
+            "type": "Feature",
+            "properties": {name: values[i] for name, values in properties.items()},
+            "geometry": mapping(geometry) if geometry is not None else None,
+        }
+        for i, geometry in enumerate(geometries)
+    ]
 
 
-def _group_zones(
+def group_zones(
     zones_filepath: FilePath,
     group_by: GroupBy,
     admin_level: Optional[int] = None,
     simplify_tolerance: Optional[float] = None,
     iso3_filter: Optional[str] = None,
 ) -> FilePath:
-    """Group zones by a key id and merge polygons."""
+    """Group zones by a key id and merge polygons.
+
+    Grouped zones are cached. Large groupings are only dissolved in parallel
+    outside of stats pool workers, so the API groups zones before sending
+    stats to the pool; see dissolve_groups.
+    """
+    # Tolerances snapping to the same stored level share grouped zones.
+    simplify_tolerance = snap_tolerance(simplify_tolerance)
     safe_filename = zones_filepath.replace("/", "_").replace("s3://", "")
     cache_filename = safe_filename.replace("parquet", "json")
     grouped_basename = (
@@ -188,21 +345,15 @@ def _group_zones(
 
     features = geojson_data.get("features", [])
 
-    grouped_polygons = defaultdict(list)
-
-    for zone_feature in features:
-        grouped_polygons[zone_feature["properties"][group_by]].append(
-            shape(zone_feature["geometry"])
-        )
+    keys = [zone_feature["properties"][group_by] for zone_feature in features]
+    geometries = np.array(
+        [shape(zone_feature["geometry"]) for zone_feature in features], dtype=object
+    )
+    dissolved = dissolve_groups(keys, geometries)
 
     new_features = []
-    for group_id, polygons in grouped_polygons.items():
-        try:
-            new_geometry = mapping(unary_union(polygons))
-        except (ValueError, GEOSException) as error:
-            logger.error(error)
-            logger.error(polygons)
-            new_geometry = {}
+    for group_id, geometry in dissolved.items():
+        new_geometry = {} if geometry is None else mapping(geometry)
 
         if "coordinates" not in new_geometry:
             logger.error(
@@ -228,7 +379,7 @@ def _group_zones(
     outjson = dict(type="FeatureCollection", features=new_features)
 
     with open(output_filename, "w") as outfile:
-        dump(outjson, outfile)
+        dump(outjson, outfile, separators=(",", ":"))
 
     return FilePath(output_filename)
 
@@ -268,96 +419,108 @@ def _get_intersected_polygons(
     - 'geom' key contains the shapely object which is used for statistics
     - 'feature' key is a geojson feature with the intersected geometry
 
+    Intersecting pairs are found with an STRtree over the wfs polygons rather
+    than by testing every zone against every polygon.
     """
     wfs_shapes = _create_shapely_geoms(wfs_geojson, filter_property_key)
+    zones = zones_geojson.get("features", [])
+    if not wfs_shapes or not zones:
+        return []
+
+    wfs_geoms = np.array([s for _, s in wfs_shapes], dtype=object)
+    # Shapely objects from zone geojson geometries, prepared for the predicate.
+    zone_geoms = np.array([shape(zone.get("geometry")) for zone in zones], dtype=object)
+    shapely.prepare(zone_geoms)
+
+    # Candidate pairs from the spatial index, kept in zone then WFS order.
+    zone_index, wfs_index = shapely.STRtree(wfs_geoms).query(
+        zone_geoms, predicate="intersects"
+    )
+    order = np.lexsort((wfs_index, zone_index))
+    zone_index, wfs_index = zone_index[order], wfs_index[order]
 
-    intersected_zones = []
-    zone: GeoJSONFeature
-    for zone in zones_geojson.get("features", []):
-        # Shapely object from zone geojson geometry.
-        geom = shape(zone.get("geometry"))
-
-        # Get geometry intersection between zone and wfs response polygons.
-        filtered = [
-            (k, geom.intersection(s)) for k, s in wfs_shapes if geom.intersects(s)
-        ]
-
-        if len(filtered) == 0:
-            continue
-
-        filtered_dict = []
-
-        for k, geom in filtered:
-            properties = zone.get("properties", {}).copy()
-
-            # Include property value from wfs_response.
-            properties[filter_property_key] = k
-
-            # Create geojson feature.
-            feature = {
-                "type": "Feature",
-                "geometry": mapping(geom),
-                "properties": properties,
-            }
-
-            filtered_dict.append({"geom": geom, "feature": feature})
-
-        intersected_zones.append(filtered_dict)
+    # Get geometry intersections between zones and wfs response polygons.
+    intersections = shapely.intersection(zone_geoms[zone_index], wfs_geoms[wfs_index])
 
-    # Flatten.
-    flattened_intersected_zones = [
-        item for sublist in intersected_zones for item in sublist
-    ]
+    intersected_zones = []
+    for i, j, geom in zip(zone_index, wfs_index, intersections):
+        properties = zones[i].get("properties", {}).copy()
 
-    return flattened_intersected_zones
+        # Include property value from wfs_response.
+        properties[filter_property_key] = wfs_shapes[j][0]
 
+        # Create geojson feature.
+        feature = {
+            "type": "Feature",
+            "geometry": mapping(geom),
+            "properties": properties,
+        }
 
-def get_filtered_features(zones_filepath: FilePath, key: str, value: str) -> FilePath:
-    """Creates a geojson file with features matching properties key and value"""
-    output_filename = FilePath(
-        "{zones}.{key}.{value}".format(zones=zones_filepath, key=key, value=value)
-    )
+        intersected_zones.append({"geom": geom, "feature": feature})
 
-    geojson_data = _read_zones(zones_filepath)
+    return intersected_zones
 
-    filtered_features: list[GeoJSONFeature] = [
-        f
-        for f in geojson_data["features"]
-        if key in f["properties"].keys() and str(f["properties"][key]) == value
-    ]
 
-    if len(filtered_features) == 0:
-        message = f"Property '{key}' = '{value}' not found"
-        logger.info(message)
-        raise HTTPException(status_code=404, detail=message)
+@lru_cache(maxsize=256)
+def _file_digest(filepath: FilePath, mtime_ns: int, size: int) -> str:
+    """Content hash of a file, remembered while its mtime and size match."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    features_filtered = {**geojson_data, "features": filtered_features}
-    with open(output_filename, "w") as outfile:
-        dump(features_filtered, outfile)
 
-    return output_filename
+def _content_digest(filepath: FilePath) -> str:
+    stat = os.stat(filepath)
+    return _file_digest(filepath, stat.st_mtime_ns, stat.st_size)
 
 
 def get_intersected_wfs_polygons(
     wfs_response: WfsResponse, zones_filepath: FilePath
 ) -> FilePath:
-    """Returns the filepath of the intersected wfs featurecollection and boundaries (zones) file."""
-    zones_geojson: GeoJSON = get_json_file(zones_filepath)
-    wfs_geojson: GeoJSON = get_json_file(wfs_response["path"])
+    """Returns the filepath of the intersected wfs featurecollection and boundaries (zones) file.
 
-    intersected_polygons = _get_intersected_polygons(
-        zones_geojson, wfs_geojson, wfs_response["filter_property_key"]
+    Results are cached by the content of both files, so the geometry step
+    runs once per zones and wfs response, whichever raster stats are for.
+    """
+    filter_property_key = wfs_response["filter_property_key"]
+    output_filename = _get_cached_filepath(
+        prefix=WFS_INTERSECTION_PREFIX,
+        cache_lookup=":".join(
+            [
+                _content_digest(zones_filepath),
+                _content_digest(wfs_response["path"]),
+                filter_property_key,
+            ]
+        ),
+        hash_lookup=True,
+        extension="json",
     )
+    if is_file_valid(output_filename):
+        return output_filename
 
-    intersected_polygon_features = {
-        "type": "FeatureCollection",
-        "features": [f.get("feature") for f in intersected_polygons],
-    }
+    # Concurrent requests for the same intersection wait for the first one.
+    with _download_lock(output_filename):
+        if is_file_valid(output_filename):
+            return output_filename
 
-    output_filename = FilePath("{zones}.intersection".format(zones=zones_filepath))
+        zones_geojson: GeoJSON = get_json_file(zones_filepath)
+        wfs_geojson: GeoJSON = get_json_file(wfs_response["path"])
 
-    with open(output_filename, "w") as outfile:
-        dump(intersected_polygon_features, outfile)
+        intersected_polygons = _get_intersected_polygons(
+            zones_geojson, wfs_geojson, filter_property_key
+        )
+
+        intersected_polygon_features = {
+            "type": "FeatureCollection",
+            "features": [f.get("feature") for f in intersected_polygons],
+        }
+
+        tmp_filename = f"{output_filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "w") as outfile:
+            dump(intersected_polygon_features, outfile)
+        os.replace(tmp_filename, output_filename)
 
     return output_filename
 
@@ -395,6 +558,235 @@ def _extract_layer_identifier(filepath: FilePath, max_length: int = 100) -> str:
     return filename[:max_length]
 
 
+def _mask_geotiff(
+    geotiff: FilePath, mask_geotiff: FilePath, mask_calc_expr: Optional[str]
+) -> FilePath | MaskedRaster:
+    """Apply mask_calc_expr to the geotiff and mask, in-process.
+
+    Returns a cached masked GeoTIFF when one exists, otherwise a lazily
+    evaluated MaskedRaster, persisted to the cache first when
+    MASKED_RASTER_PERSIST is set.
+    """
+    # Extract readable layer identifiers
+    geotiff_layer = _extract_layer_identifier(geotiff)
+
+    # Combine all inputs to create a unique cache key
+    cache_key = f"{geotiff}_{mask_geotiff}_{mask_calc_expr or 'no_calc'}"
+    cache_hash = _hash_value(cache_key)
+
+    slugified_calc = "no_calc"
+    if mask_calc_expr is not None:
+        slugified_calc = mask_calc_expr
+        for symbol, operator in VALID_OPERATORS.items():
+            slugified_calc = slugified_calc.replace(symbol, operator.__name__)
+
+        # Limit to 20 chars to prevent long filenames
+        slugified_calc = "".join(x for x in slugified_calc if x.isalnum())[:20]
+
+    masked_pop_geotiff: FilePath = os.path.join(
+        caching.CACHE_DIRECTORY,
+        f"raster_masked_{geotiff_layer}_{slugified_calc}_{cache_hash}.tif",
+    )
+    if is_file_valid(masked_pop_geotiff):
+        return masked_pop_geotiff
+
+    # rasters on different grids are reprojected onto the mask on the fly
+    try:
+        masked_raster = MaskedRaster(geotiff, mask_geotiff, calc_expr=mask_calc_expr)
+    except InvalidCalcExprError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+
+    if not MASKED_RASTER_PERSIST:
+        return masked_raster
+    with masked_raster:
+        write_raster(masked_raster, masked_pop_geotiff)
+    write_manifest(masked_pop_geotiff)
+    return masked_pop_geotiff
+
+
+# Marks properties missing from a GeoJSON feature, left out of its results.
+_MISSING: Final = object()
+
+
+class _ZoneFeatures(Sequence[GeoJSONFeature]):
+    """GeoJSON features of columnar zones, built when indexed."""
+
+    def __init__(self, zones: "_StatsZones"):
+        self._zones = zones
+
+    def __len__(self) -> int:
+        return len(self._zones)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        return self._zones.feature(index)
+
+
+@dataclass
+class _StatsZones:
+    """Zones read once per stats request, as a table of properties.
+
+    Property columns are object arrays aligned by zone index with the
+    geometries, which the stats engine uses, so that stats are joined to zone
+    properties by index and zones are never read twice.
+    """
+
+    properties: dict[str, np.ndarray]
+    key: str
+    # parsed geometries of GeoParquet zones
+    geometries: Optional[np.ndarray] = None
+    # features of GeoJSON zones, as read
+    geojson_features: Optional[list[GeoJSONFeature]] = None
+    # zone label rasters per raster grid, shared by rasters on the same grid
+    labels: dict[str, ZoneLabels] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        if self.geojson_features is not None:
+            return len(self.geojson_features)
+        return len(self.geometries)  # type: ignore
+
+    @property
+    def features(self) -> Sequence[GeoJSONFeature]:
+        if self.geojson_features is not None:
+            return self.geojson_features
+        return _ZoneFeatures(self)
+
+    def row(self, index: int) -> dict[str, Any]:
+        """Properties of one zone."""
+        return {
+            name: column[index]
+            for name, column in self.properties.items()
+            if column[index] is not _MISSING
+        }
+
+    def feature(self, index: int) -> GeoJSONFeature:
+        if self.geojson_features is not None:
+            return self.geojson_features[index]
+        geometry = self.geometries[index]  # type: ignore
+        return {
+            "type": "Feature",
+            "properties": self.row(index),
+            "geometry": mapping(geometry) if geometry is not None else None,
+        }
+
+    def filter(self, key: str, value: str) -> "_StatsZones":
+        """Zones whose key property, as a string, equals value."""
+        column = self.properties.get(key)
+        mask = (
+            column.astype(str) == value
+            if column is not None
+            else np.zeros(len(self), dtype=bool)
+        )
+        if not mask.any():
+            message = f"Property '{key}' = '{value}' not found"
+            logger.info(message)
+            raise HTTPException(status_code=404, detail=message)
+
+        return _StatsZones(
+            properties={name: column[mask] for name, column in self.properties.items()},
+            key=_hash_value(f"{self.key}.{key}.{value}"),
+            geometries=None if self.geometries is None else self.geometries[mask],
+            geojson_features=(
+                None
+                if self.geojson_features is None
+                else [self.geojson_features[i] for i in np.flatnonzero(mask)]
+            ),
+        )
+
+    @classmethod
+    def read(
+        cls,
+        stats_input: FilePath,
+        admin_level: Optional[int] = None,
+        simplify_tolerance: Optional[float] = None,
+        iso3_filter: Optional[str] = None,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+    ) -> "_StatsZones":
+        """Read zones; GeoParquet zones are limited to those intersecting bbox."""
+        if ".parquet" in stats_input.lower():
+            columns = _query_parquet_zones(
+                stats_input,
+                admin_level=admin_level,
+                bbox=bbox,
+                simplify_tolerance=simplify_tolerance,
+                iso3_filter=iso3_filter,
+                bbox_predicate="intersects",
+            )
+            # Label rasters only depend on the geometries and their order.
+            wkb_digest = hashlib.md5(b"".join(columns["geometry"].tolist()))
+            properties, geometries = _zones_table(columns)
+            return cls(
+                properties=properties,
+                key=wkb_digest.hexdigest()[:9],
+                geometries=geometries,
+            )
+
+        with open(stats_input, "r") as stats_input_fp:
+            geojson = stats_input_fp.read()
+        features = loads(geojson).get("features", [])
+        feature_properties = [f.get("properties") or {} for f in features]
+        names = dict.fromkeys(name for p in feature_properties for name in p)
+        return cls(
+            properties={
+                name: _object_array(p.get(name, _MISSING) for p in feature_properties)
+                for name in names
+            },
+            key=_hash_value(geojson),
+            geojson_features=features,
+        )
+
+
+@timed
+def _zonal_stats(
+    zones: _StatsZones,
+    geotiff: FilePath | MaskedRaster,
+    stats: list[str] | str,
+    prefix: Optional[str],
+    geojson_out: bool,
+    add_stats: Optional[dict],
+) -> list[dict[str, Any]]:
+    """Run zonal stats with the label raster engine, falling back to rasterstats."""
+    if ZONAL_STATS_ENGINE == "label_raster":
+        try:
+            return compute_zonal_stats(
+                zones.features,
+                geotiff,
+                stats=stats,
+                prefix=prefix,
+                geojson_out=geojson_out,
+                add_stats=add_stats,
+                zones_key=zones.key,
+                zone_labels_cache=zones.labels,
+                geometries=zones.geometries,
+            )
+        except UnsupportedZonesError as error:
+            logger.info("Falling back to rasterstats: %s", error)
+
+    # Features rather than a path: fiona 1.10.1 is not happy with a file path
+    # anymore: https://github.com/Toblerity/Fiona/issues/1455
+    features = list(zones.features)
+    if isinstance(geotiff, MaskedRaster):
+        return zonal_stats(
+            features,
+            geotiff.read(1),
+            affine=geotiff.transform,
+            nodata=geotiff.nodata,
+            stats=stats,
+            prefix=prefix,
+            geojson_out=geojson_out,
+            add_stats=add_stats,
+        )
+    return zonal_stats(
+        features,
+        geotiff,
+        stats=stats,
+        prefix=prefix,
+        geojson_out=geojson_out,
+        add_stats=add_stats,
+    )
+
+
 @timed
 def calculate_stats(
     zones_filepath: FilePath,  # list or FilePath??
@@ -415,95 +807,204 @@ def calculate_stats(
     iso3_filter: Optional[str] = None,
 ) -> list[dict[str, Any]]:
     """Calculate stats."""
-
-    # Add mask option for flood exposure analysis
-    if mask_geotiff:
-        # Extract readable layer identifiers
-        geotiff_layer = _extract_layer_identifier(geotiff)
-        mask_layer = _extract_layer_identifier(mask_geotiff)
-
-        # Combine all inputs to create a unique cache key
-        cache_key = f"{geotiff}_{mask_geotiff}_{mask_calc_expr or 'no_calc'}"
-        cache_hash = _hash_value(cache_key)
-
-        slugified_calc = "no_calc"
-        if mask_calc_expr is not None:
-            slugified_calc = mask_calc_expr
-            for symbol, operator in VALID_OPERATORS.items():
-                slugified_calc = slugified_calc.replace(symbol, operator.__name__)
-
-            # Limit to 20 chars to prevent long filenames
-            slugified_calc = "".join(
-                [x if x.isalnum() else "" for x in (slugified_calc)]
-            )[:20]
-
-        masked_pop_geotiff: FilePath = os.path.join(
-            caching.CACHE_DIRECTORY,
-            f"raster_masked_{geotiff_layer}_{slugified_calc}_{cache_hash}.tif",
+    return next(
+        calculate_stats_series(
+            zones_filepath,
+            [geotiff],
+            group_by=group_by,
+            stats=stats,
+            prefix=prefix,
+            geojson_out=geojson_out,
+            wfs_response=wfs_response,
+            intersect_comparison=intersect_comparison,
+            mask_geotiff=mask_geotiff,
+            mask_calc_expr=mask_calc_expr,
+            filter_by=filter_by,
+            admin_level=admin_level,
+            simplify_tolerance=simplify_tolerance,
+            iso3_filter=iso3_filter,
         )
+    )
 
-        if not is_file_valid(masked_pop_geotiff):
-            # tentatively remove the reprojection step now that we are consolidating our requests
-            # through STAC and receive actual image files.
-            try:
-                gdal_calc(
-                    input_file_path=geotiff,
-                    mask_file_path=mask_geotiff,
-                    output_file_path=masked_pop_geotiff,
-                    calc_expr=mask_calc_expr,
-                )
-            # catch errors in gdal_calc, try a reproj
-            except Exception:
-                logger.warning(
-                    "gdal_calc failed, trying to reproject geotiff and retry..."
-                )
-                reproj_cache_key = f"{geotiff}_reproj_on_{mask_geotiff}"
-                reproj_hash = _hash_value(reproj_cache_key)
-                reproj_pop_geotiff: FilePath = os.path.join(
-                    caching.CACHE_DIRECTORY,
-                    f"raster_reproj_{geotiff_layer}_on_{mask_layer}_{reproj_hash}.tif",
-                )
-                if not is_file_valid(reproj_pop_geotiff):
-                    reproj_match(
-                        geotiff,
-                        mask_geotiff,
-                        reproj_pop_geotiff,
-                        resampling_mode=Resampling.sum,
-                    )
-                gdal_calc(
-                    input_file_path=reproj_pop_geotiff,
-                    mask_file_path=mask_geotiff,
-                    output_file_path=masked_pop_geotiff,
-                    calc_expr=mask_calc_expr,
-                )
 
-        geotiff = masked_pop_geotiff
+@timed
+def calculate_cached_stats(
+    zones_filepath: FilePath,
+    geotiff: FilePath,
+    stats,
+    prefix: str,
+    group_by: GroupBy,
+    geojson_out,
+    wfs_response: Optional[WfsResponse],
+    intersect_comparison,
+    mask_geotiff,
+    mask_calc_expr: Optional[str] = None,
+    filter_by: Optional[tuple[str, str]] = None,
+    admin_level: Optional[int] = None,
+    simplify_tolerance: Optional[float] = None,
+    iso3_filter: Optional[str] = None,
+):
+    """Calculate stats, reusing results cached on disk by any worker.
 
-    if group_by:
-        zones_filepath = _group_zones(
+    Module level and picklable, to run in the processes of the stats pool.
+    """
+    key = result_key(
+        "stats",
+        file_fingerprint(zones_filepath),
+        file_fingerprint(geotiff),
+        stats,
+        prefix,
+        group_by,
+        geojson_out,
+        (
+            {**wfs_response, "path": file_fingerprint(wfs_response["path"])}
+            if wfs_response is not None
+            else None
+        ),
+        intersect_comparison,
+        file_fingerprint(mask_geotiff),
+        mask_calc_expr,
+        filter_by,
+        admin_level,
+        simplify_tolerance,
+        iso3_filter,
+    )
+    return stats_result_cache.get_or_compute(
+        key,
+        lambda: calculate_stats(
             zones_filepath,
-            group_by,
+            geotiff,
+            stats=stats,
+            prefix=prefix,
+            group_by=group_by,
+            geojson_out=geojson_out,
+            wfs_response=wfs_response,
+            intersect_comparison=intersect_comparison,
+            mask_geotiff=mask_geotiff,
+            mask_calc_expr=mask_calc_expr,
+            filter_by=filter_by,
+            admin_level=admin_level,
+            simplify_tolerance=simplify_tolerance,
+            iso3_filter=iso3_filter,
+        ),
+    )
+
+
+def calculate_stats_series(
+    zones_filepath: FilePath,
+    geotiffs: Iterable[FilePath],
+    group_by: Optional[GroupBy] = None,
+    stats: Optional[list[str] | str] = None,
+    prefix: Optional[str] = "stats_",
+    geojson_out: bool = False,
+    wfs_response: Optional[WfsResponse] = None,
+    intersect_comparison: Optional[tuple] = None,
+    mask_geotiff: Optional[str] = None,
+    mask_calc_expr: Optional[str] = None,
+    filter_by: Optional[tuple[str, str]] = None,
+    admin_level: Optional[int] = None,
+    simplify_tolerance: Optional[float] = None,
+    iso3_filter: Optional[str] = None,
+) -> Iterator[list[dict[str, Any]]]:
+    """Calculate stats for each geotiff over the same zones, lazily.
+
+    Zones are grouped, intersected, read and filtered once, and zone label
+    rasters are shared by all geotiffs on the same grid. GeoParquet zones out
+    of the geotiffs' bounds are not read, as they have no stats. Yields one
+    result per geotiff, in order, as calculate_stats would return it.
+    """
+    simplify_tolerance = snap_tolerance(simplify_tolerance)
+    geotiffs = list(geotiffs)
+    if group_by:
+        with span("group"):
+            zones_filepath = group_zones(
+                zones_filepath,
+                group_by,
+                admin_level,
+                simplify_tolerance,
+                iso3_filter,
+            )
+
+    with span("zones"):
+        stats_input = zones_filepath
+        if wfs_response is not None:
+            stats_input = get_intersected_wfs_polygons(wfs_response, zones_filepath)
+            # TODO - remove this prefix to make homogeneize stats output
+            # Frontend from this PR (546) needs to be deployed first.
+            prefix = None
+
+        zones = _StatsZones.read(
+            stats_input,
             admin_level,
             simplify_tolerance,
             iso3_filter,
+            bbox=_rasters_bbox(geotiffs),
+        )
+        if filter_by is not None:
+            zones = zones.filter(*filter_by)
+
+    for geotiff in geotiffs:
+        yield _calculate_raster_stats(
+            zones,
+            geotiff,
+            stats=stats,
+            prefix=prefix,
+            geojson_out=geojson_out,
+            intersect_comparison=intersect_comparison,
+            mask_geotiff=mask_geotiff,
+            mask_calc_expr=mask_calc_expr,
         )
 
-    stats_input = (
-        zones_filepath
-        if filter_by is None
-        else get_filtered_features(zones_filepath, filter_by[0], filter_by[1])
-    )
 
-    if wfs_response is not None:
-        stats_input = get_intersected_wfs_polygons(wfs_response, zones_filepath)
-        # TODO - remove this prefix to make homogeneize stats output
-        # Frontend from this PR (546) needs to be deployed first.
-        prefix = None
+def _rasters_bbox(
+    geotiffs: Sequence[FilePath],
+) -> Optional[tuple[float, float, float, float]]:
+    """Bounds of the union of geotiffs in EPSG:4326, the CRS of GeoParquet zones."""
+    bounds = []
+    for geotiff in geotiffs:
+        with rasterio.open(geotiff) as src:
+            if src.crs is None:
+                return None
+            bounds.append(transform_bounds(src.crs, "EPSG:4326", *src.bounds))
+    if not bounds:
+        return None
+    minx, miny, maxx, maxy = zip(*bounds)
+    return min(minx), min(miny), max(maxx), max(maxy)
+
+
+@timed
+def calculate_stats_batch(
+    zones_filepath: FilePath, geotiffs: list[FilePath], **kwargs: Any
+) -> list[list[dict[str, Any]]]:
+    """Results of calculate_stats_series as a list, to run in the stats pool."""
+    return list(calculate_stats_series(zones_filepath, geotiffs, **kwargs))
+
+
+def _is_nan(value: Any) -> bool:
+    return isinstance(value, (float, np.floating)) and bool(np.isnan(value))
+
+
+def _calculate_raster_stats(
+    zones: _StatsZones,
+    geotiff: FilePath,
+    stats: Optional[list[str] | str],
+    prefix: Optional[str],
+    geojson_out: bool,
+    intersect_comparison: Optional[tuple],
+    mask_geotiff: Optional[str],
+    mask_calc_expr: Optional[str],
+) -> list[dict[str, Any]]:
+    """Calculate and clean up the stats of one geotiff over prepared zones."""
+    # Add mask option for flood exposure analysis
+    raster: FilePath | MaskedRaster = geotiff
+    if mask_geotiff:
+        with span("mask"):
+            raster = _mask_geotiff(geotiff, mask_geotiff, mask_calc_expr)
 
     # Add function to calculate overlap percentage.
     add_stats = None
     if intersect_comparison is not None:
-        pixel_area = calculate_pixel_area(geotiff)
+        pixel_area = calculate_pixel_area(raster)
 
         def intersect_pixels(masked) -> float:
             # Get total number of elements matching our operator in the boundary.
@@ -524,14 +1025,11 @@ def calculate_stats(
         }
 
     try:
-        # preload the file contents for fiona 1.10.1 as it does not seem happy
-        # with a file path anymore: https://github.com/Toblerity/Fiona/issues/1455
-        with open(stats_input, "r") as stats_input_fp:
-            stats_input_str = stats_input_fp.read()
-
-            stats_results = zonal_stats(
-                stats_input_str,
-                geotiff,
+        # the masked raster keeps both inputs open until stats are computed
+        with raster if isinstance(raster, MaskedRaster) else nullcontext():
+            stats_results = _zonal_stats(
+                zones,
+                raster,
                 stats=stats if stats is not None else DEFAULT_STATS,
                 prefix=prefix,
                 geojson_out=geojson_out,
@@ -550,12 +1048,12 @@ def calculate_stats(
     # cleanup data and remove nan values
     # add intersect stats if requested
     clean_results = []
-    for result in stats_results:
+    for index, result in enumerate(stats_results):
         stats_properties: dict = result if not geojson_out else result["properties"]
 
         # clean results
         clean_stats_properties = {
-            k: 0 if str(v).lower() == "nan" else v for k, v in stats_properties.items()
+            k: 0 if _is_nan(v) else v for k, v in stats_properties.items()
         }
 
         # calculate intersect_percentage
@@ -582,24 +1080,10 @@ def calculate_stats(
         # by setting a limit at 0.005 (0.5%).
         if intersect_comparison is not None and intersect_percentage < 0.005:
             continue
+        # join zone properties by index, as filtered results are left out
         if not geojson_out:
-            clean_results.append(clean_stats_properties)
+            clean_results.append({**zones.row(index), **clean_stats_properties})
         else:
             clean_results.append({**result, "properties": clean_stats_properties})
 
-    stats_results = clean_results
-
-    if not geojson_out:
-        feature_properties = _extract_features_properties(
-            zones_filepath, admin_level, simplify_tolerance, iso3_filter
-        )
-
-        if filter_by is not None:
-            key, value = filter_by
-            feature_properties = [p for p in feature_properties if str(p[key]) == value]
-
-        stats_results = [
-            {**properties, **stat}
-            for stat, properties in zip(stats_results, feature_properties)
-        ]
-    return stats_results
+    return clean_results
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Profile the startup of the API: module import times and first healthcheck.
+
+Reports, from fresh interpreters:
+
+* the modules taking the longest to import with ``import prism_app.main``
+  (cumulative ``-X importtime``), top level imports of main first;
+* the time from starting uvicorn to the first successful ``GET /``, the
+  target to keep low for deploys and worker recycles.
+
+From ``api/``::
+
+    poetry run python scripts/profile_startup.py
+    poetry run python scripts/profile_startup.py --top 40 --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _api_root() -> Path:
+    return Path(__file__).resolve().parent.parent
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(_api_root())
+    # Importing main needs the admin to be configured or disabled.
+    env.setdefault("PRISM_ADMIN_AUTH_DISABLED", "true")
+    return env
+
+
+def import_times() -> list[tuple[int, int, str]]:
+    """(depth, cumulative microseconds, module) of import prism_app.main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import prism_app.main"],
+        cwd=_api_root(),
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            _, cumulative, indent, module = match.groups()
+            times.append((len(indent) // 2, int(cumulative), module))
+    return times
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_healthcheck(timeout: float = 120) -> float:
+    """Seconds from starting uvicorn to the first successful GET /."""
+    port = _free_port()
+    errors = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "prism_app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=_api_root(),
+        env=_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=errors,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                errors.seek(0)
+                raise RuntimeError(
+                    "uvicorn exited before answering:\n" + errors.read().decode()
+                )
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"No healthcheck answer after {timeout} s.")
+    finally:
+        server.terminate()
+        server.wait()
+        errors.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--top", type=int, default=25, help="Modules to list")
+    p.add_argument("--runs", type=int, default=3, help="Healthcheck measurements")
+    args = p.parse_args(argv)
+
+    times = import_times()
+    total = next(us for depth, us, module in times if module == "prism_app.main")
+    print(f"import prism_app.main: {total / 1000:.0f} ms\n")
+
+    print("Imports of main:")
+    direct = sorted(
+        ((us, module) for depth, us, module in times if depth == 1), reverse=True
+    )
+    for us, module in direct[: args.top]:
+        print(f"{us / 1000:>8.0f} ms  {module}")
+
+    print("\nSlowest modules, all levels:")
+    for depth, us, module in sorted(times, key=lambda t: t[1], reverse=True)[
+        : args.top
+    ]:
+        print(f"{us / 1000:>8.0f} ms  {'  ' * depth}{module}")
+
+    healthchecks = [time_to_healthcheck() for _ in range(args.runs)]
+    print(
+        f"\nTime to first healthcheck: median {statistics.median(healthchecks):.2f} s,"
+        f" min {min(healthchecks):.2f} s over {args.runs} runs"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
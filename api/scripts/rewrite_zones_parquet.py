@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Rewrite boundary GeoParquet files for bbox and row group pruning.
+
+The output has:
+
+* a ``bbox`` covering column (struct of xmin, ymin, xmax, ymax per zone, as in
+  GeoParquet 1.1), which ``zonal_stats._query_parquet_zones`` filters on
+  instead of deserializing every geometry;
+* rows sorted along a Hilbert curve over the dataset extent, so that nearby
+  zones share row groups and row group statistics of ``bbox`` are tight;
+* row groups of ``--row-group-size`` zones, small enough to be skipped
+  independently and large enough to keep metadata overhead low;
+* optionally, hive partitions (e.g. ``iso3``/``admin_level``) so that these
+  filters skip whole files.
+
+Paths may be local or ``s3://`` URIs (using the vector store credentials).
+From ``api/``::
+
+    poetry run python scripts/rewrite_zones_parquet.py boundaries.parquet out.parquet
+    poetry run python scripts/rewrite_zones_parquet.py 's3://bucket/admin/**/*.parquet' \\
+        s3://bucket/admin_sorted --partition-by iso3 admin_level
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def _api_root_on_path() -> Path:
+    root = Path(__file__).resolve().parent.parent
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    return root
+
+
+def rewrite_query(
+    source: str,
+    destination: str,
+    row_group_size: int,
+    partition_by: list[str],
+    has_bbox_column: bool,
+) -> str:
+    """COPY statement writing source sorted, with a bbox column, to destination."""
+    excluded = "geometry, bbox" if has_bbox_column else "geometry"
+    options = [
+        "FORMAT PARQUET",
+        "COMPRESSION zstd",
+        f"ROW_GROUP_SIZE {row_group_size}",
+    ]
+    if partition_by:
+        options.append(f"PARTITION_BY ({', '.join(partition_by)})")
+        options.append("OVERWRITE_OR_IGNORE")
+    return f"""
+        COPY (
+            WITH zones AS (
+                SELECT * FROM read_parquet('{source}', hive_partitioning=true)
+            ),
+            extent AS (
+                SELECT ST_Extent(ST_Extent_Agg(geometry)) AS box FROM zones
+            )
+            SELECT
+                * EXCLUDE ({excluded}),
+                geometry,
+                struct_pack(
+                    xmin := ST_XMin(geometry),
+                    ymin := ST_YMin(geometry),
+                    xmax := ST_XMax(geometry),
+                    ymax := ST_YMax(geometry)
+                ) AS bbox
+            FROM zones
+            ORDER BY ST_Hilbert(geometry, (SELECT box FROM extent))
+        ) TO '{destination}' ({", ".join(options)})
+    """
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    p.add_argument("source", help="GeoParquet file, glob or hive dataset to read")
+    p.add_argument("destination", help="Output file, or directory if partitioned")
+    p.add_argument(
+        "--row-group-size",
+        type=int,
+        default=1000,
+        help="Zones per row group (default: %(default)s)",
+    )
+    p.add_argument(
+        "--partition-by",
+        nargs="+",
+        default=[],
+        metavar="COLUMN",
+        help="Write hive partitions on these columns, e.g. iso3 admin_level",
+    )
+    args = p.parse_args(argv)
+
+    _api_root_on_path()
+    # The S3 secret is always created; credentials are only used for s3:// paths.
+    for name in ("ACCESS_KEY_ID", "SECRET_ACCESS_KEY", "DEFAULT_REGION"):
+        os.environ.setdefault(f"VECTOR_STORE_{name}", "unused")
+    from prism_app.duckdb_utils import duckdb_pool
+    from prism_app.zonal_stats import _has_bbox_column
+
+    start = time.perf_counter()
+    with duckdb_pool.cursor() as cursor:
+        cursor.execute(
+            rewrite_query(
+                args.source,
+                args.destination,
+                args.row_group_size,
+                args.partition_by,
+                _has_bbox_column(args.source),
+            )
+        )
+        if not args.partition_by:
+            rows, row_groups = cursor.execute(
+                "SELECT SUM(row_group_num_rows), COUNT(*) FROM"
+                f" (SELECT DISTINCT row_group_id, row_group_num_rows"
+                f" FROM parquet_metadata('{args.destination}'))"
+            ).fetchone()
+            print(f"{args.destination}: {rows} zones in {row_groups} row groups")
+    print(f"Rewritten in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())